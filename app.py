@@ -1,6 +1,5 @@
 import json
 import random
-import sqlite3
 import time
 from contextlib import contextmanager
 from pathlib import Path
@@ -8,35 +7,30 @@ from pathlib import Path
 import streamlit as st
 from dotenv import load_dotenv
 from langchain_core.language_models.chat_models import BaseChatModel
-from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.messages import AIMessage, HumanMessage
 
 from manuai.agent import ask, ask_stream, create_history
 from manuai.config import Config
-from manuai.models import create_llm
-from manuai.optimizations import (DynamicComplexityRouter,
+from manuai.database_optimizer import pooled_cursor
+from manuai.models import get_llm, get_model_registry
+from manuai.optimizations import (get_complexity_router,
                                   optimize_query_execution)
+from manuai.performance_config import get_performance_config
 from manuai.performance_dashboard import render_performance_dashboard
+from manuai.schema_catalog import get_schema_catalog
 from manuai.smart_optimizer import get_query_optimizer
+from manuai.table_statistics import get_table_statistics
 from manuai.tools import set_current_database, with_sql_cursor
 
 load_dotenv()
 
 
 @contextmanager
-def with_multi_db_cursor(db_path: str):
+def with_multi_db_cursor(db_path: str, readonly: bool = True):
     """Context manager for database connections with multiple database support."""
-    conn = sqlite3.connect(db_path)
-    try:
-        # Enable optimizations
-        conn.execute("PRAGMA journal_mode=WAL")
-        conn.execute("PRAGMA synchronous=NORMAL")
-        conn.execute("PRAGMA cache_size=10000")
-        conn.execute("PRAGMA temp_store=MEMORY")
-        
-        cursor = conn.cursor()
+    # Connections come from the shared per-database pool used by the tools
+    with pooled_cursor(db_path, readonly=readonly) as cursor:
         yield cursor
-    finally:
-        conn.close()
 
 
 LOADING_MESSAGES = [
@@ -74,15 +68,22 @@ def get_model(query: str = None) -> BaseChatModel:
     """
     if not query:
         # Default model if no query provided
-        return create_llm(Config.MODEL)
+        return get_llm(Config.MODEL)
 
-    # Initialize the complexity router
-    complexity_router = DynamicComplexityRouter()
+    # Shared complexity router
+    complexity_router = get_complexity_router()
 
     # Determine the appropriate model based on query complexity
     return complexity_router.get_appropriate_model(query)
 
 
+@st.cache_resource
+def warm_up_models():
+    """Pre-load the simple and complex models once per server process."""
+    if get_performance_config().llm.warm_up_models:
+        get_model_registry().warm_up()
+
+
 def load_css(css_file):
     with open(css_file, "r") as f:
         st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
@@ -93,15 +94,21 @@ st.set_page_config(
     page_icon="🧙‍♂️",
 )
 
+warm_up_models()
+
 # Apply CSS styling
 try:
     load_css("assets/style.css")
 except FileNotFoundError:
     st.write("CSS file not found, using default styling")
 
-# Initialize session state for chat history
+# Initialize session state for chat history. The messages are the conversation exactly as the
+# model saw it (tagged turn messages and tool exchanges), so every turn's prompt extends the last;
+# the chat shows only the user's prompts and the answers.
 if "messages" not in st.session_state:
     st.session_state.messages = create_history()
+if "chat" not in st.session_state:
+    st.session_state.chat = []
 
 # Header and description
 st.header("ManuAI")
@@ -152,38 +159,33 @@ with fine_tuning_tab:
                 
                 if tables_to_tune:
                     results = []
+                    # One schema snapshot for the run; the indexes created below only touch their own table
+                    catalog = get_schema_catalog(str(db_path))
                     for table in tables_to_tune:
                         # Process one table at a time
-                        with with_multi_db_cursor(str(db_path)) as cursor:
-                            cursor.execute(f"PRAGMA table_info('{table}')")
-                            columns = cursor.fetchall()
-                            
-                            cursor.execute(f"SELECT COUNT(*) FROM {table}")
-                            row_count = cursor.fetchone()[0]
-                            
-                            # Create indexes on foreign keys
-                            cursor.execute(f"PRAGMA foreign_key_list('{table}')")
-                            foreign_keys = cursor.fetchall()
-                            
-                            cursor.execute(f"PRAGMA index_list('{table}')")
-                            indexes = cursor.fetchall()
+                        schema = catalog.table(table)
+                        if schema is None:
+                            st.warning(f"Table '{table}' no longer exists")
+                            continue
+                        columns = schema.columns
+                        row_count = get_table_statistics().row_count(table, str(db_path)).count
                         
                         improvements = []
-                        # Create missing indexes
-                        for fk in foreign_keys:
-                            if len(fk) > 3 and fk[3] is not None:
-                                fk_column = fk[3]
+                        # Create missing indexes on foreign keys
+                        for fk in schema.foreign_keys:
+                            if fk.column is not None:
+                                fk_column = fk.column
                                 index_name = f"idx_{table}_{fk_column}".lower()
                                 
                                 try:
-                                    with with_multi_db_cursor(str(db_path)) as cursor:
+                                    with with_multi_db_cursor(str(db_path), readonly=False) as cursor:
                                         cursor.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table}({fk_column})")
                                         improvements.append(f"Added index on foreign key column '{fk_column}'")
                                 except Exception as e:
                                     st.warning(f"Could not create index on {fk_column}: {str(e)}")
                         
                         # Analyze table for query planning
-                        with with_multi_db_cursor(str(db_path)) as cursor:
+                        with with_multi_db_cursor(str(db_path), readonly=False) as cursor:
                             cursor.execute(f"ANALYZE {table}")
                             improvements.append("Analyzed table for improved query planning")
                         
@@ -301,35 +303,23 @@ with main_tab:
     # Display DB tables
     with st.expander("Database Tables"):
         try:
-            with with_multi_db_cursor(str(selected_db_path)) as cursor:
-                # Get list of tables
-                cursor.execute(
-                    "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
-                )
-                tables = [row[0] for row in cursor.fetchall()]
-
-                st.write("### Available Tables")
-                for table in tables:
-                    cursor.execute(f"SELECT COUNT(*) FROM {table}")
-                    count = cursor.fetchone()[0]
-                    st.write(f"- {table} ({count} rows)")
+            # Estimated counts ("~") until the background exact counts are in
+            row_counts = get_table_statistics().row_counts(db_path=str(selected_db_path))
+            st.write("### Available Tables")
+            st.markdown("\n".join(f"- {table} ({count} rows)" for table, count in row_counts.items()))
         except Exception as e:
             st.error(f"Error accessing database: {str(e)}")
             st.write("Please ensure the database file exists and is accessible.")
 
     # Chat interface
-    for message in st.session_state.messages:
-        if type(message) is SystemMessage:
-            continue
-        is_user = type(message) is HumanMessage
-        avatar = "😇" if is_user else "😇"
-        with st.chat_message("user" if is_user else "ai", avatar=avatar):
-            st.markdown(message.content)
+    for role, content in st.session_state.chat:
+        with st.chat_message(role, avatar="😇"):
+            st.markdown(content)
 
     # Get user input
     if prompt := st.chat_input("Type your message..."):
         with st.chat_message("user", avatar="😊"):
-            st.session_state.messages.append(HumanMessage(prompt))
+            st.session_state.chat.append(("user", prompt))
             st.markdown(prompt)
         with st.chat_message("ai", avatar="😇"):
             message_placeholder = st.empty()
@@ -347,7 +337,7 @@ with main_tab:
                     for suggestion in suggestions:
                         st.info(suggestion)
 
-            # Optimize query execution using our pipeline
+            # Optimize query execution using our pipeline. The agent adds the prompt as the turn message
             optimized_query, model, optimized_history, model_params = optimize_query_execution(
                 prompt, st.session_state.messages
             )
@@ -355,9 +345,13 @@ with main_tab:
             # Stream the response
             response_text = ""
             streaming_started = False
+            transcript = []
             
             try:
-                for chunk in ask_stream(optimized_query, optimized_history, model, max_iterations=10):
+                for chunk in ask_stream(
+                    optimized_query, optimized_history, model, max_iterations=10, model_params=model_params,
+                    transcript=transcript,
+                ):
                     # Handle control signals
                     if chunk == "🔄 STREAMING_START":
                         # Hide loading message when actual streaming starts
@@ -386,8 +380,13 @@ with main_tab:
                 
                 # Fallback to non-streaming if streaming fails
                 st.warning("Streaming failed, using fallback response...")
-                response_text = ask(optimized_query, optimized_history, model, max_iterations=10)
+                transcript.clear()
+                response_text = ask(
+                    optimized_query, optimized_history, model, max_iterations=10, model_params=model_params,
+                    transcript=transcript,
+                )
                 message_placeholder.markdown(response_text)
 
-        # Add response to chat history
-        st.session_state.messages.append(AIMessage(response_text))
+        # Add the turn, as the model saw it, to the chat history
+        st.session_state.messages.extend(transcript or [HumanMessage(prompt), AIMessage(response_text)])
+        st.session_state.chat.append(("ai", response_text))
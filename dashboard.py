@@ -37,24 +37,26 @@ st.markdown(
 )
 
 
-def load_performance_data():
-    """Load performance data from the logs directory."""
-    logs_dir = Path("logs")
-    performance_file = logs_dir / "model_performance.json"
+@st.cache_resource
+def get_performance_monitor():
+    """Monitor kept across reruns, so each rerun only parses newly appended events."""
+    from manuai.optimizations import PerformanceMonitor
 
-    if not performance_file.exists():
-        return None
+    return PerformanceMonitor(log_file=str(Path("logs") / "model_performance.jsonl"))
 
-    try:
-        with open(performance_file, "r") as f:
-            data = json.load(f)
-        return data
-    except (json.JSONDecodeError, FileNotFoundError):
+
+def load_performance_data():
+    """Load performance data from the logs directory."""
+    data = get_performance_monitor().get_events()
+    if not data["selections"] and not data["feedback"]:
         return None
+    return data
 
 
 # Load performance data
 performance_data = load_performance_data()
+# Online aggregates (counts, means, P² quantiles) kept by the monitor as events arrive
+performance_summary = get_performance_monitor().get_summary()
 
 if performance_data is None:
     st.warning("No performance data found. Run some queries with ManuAI to generate data.")
@@ -106,9 +108,10 @@ with tab1:
         st.subheader("🎯 Model Selection Distribution")
         
         # Add summary metrics
-        total_queries = len(selections_df)
-        unique_models = selections_df["selected_model"].nunique()
-        avg_complexity = selections_df["complexity"].mean()
+        model_summaries = performance_summary["models"]
+        total_queries = performance_summary["complexity"]["count"]
+        unique_models = sum(1 for summary in model_summaries.values() if summary["complexity"]["count"])
+        avg_complexity = performance_summary["complexity"]["mean"]
         
         col1, col2, col3 = st.columns(3)
         with col1:
@@ -135,7 +138,13 @@ with tab1:
         
         st.markdown("---")
         
-        model_counts = selections_df["selected_model"].value_counts()
+        model_counts = pd.Series(
+            {
+                model: summary["complexity"]["count"]
+                for model, summary in model_summaries.items()
+                if summary["complexity"]["count"]
+            }
+        ).sort_values(ascending=False)
 
         col1, col2 = st.columns(2)
 
@@ -172,16 +181,25 @@ with tab1:
         else:
             st.info("Not enough time series data to plot model selection over time.")
 
-        # Complexity distribution by model
+        # Complexity distribution by model (from the streaming quantile sketches)
         st.subheader("🎲 Complexity Score Distribution by Model")
 
-        fig, ax = plt.subplots(figsize=(12, 6))
-        sns.histplot(
-            data=selections_df, x="complexity", hue="selected_model", kde=True, bins=20, ax=ax
+        quantile_df = pd.DataFrame(
+            {
+                model: {
+                    label: summary["complexity"][label]
+                    for label in ("p10", "p25", "p50", "p75", "p90")
+                }
+                for model, summary in model_summaries.items()
+                if summary["complexity"]["count"]
+            }
         )
-        ax.set_xlabel("Complexity Score")
-        ax.set_ylabel("Frequency")
-        ax.set_title("Distribution of Complexity Scores by Selected Model")
+        fig, ax = plt.subplots(figsize=(12, 6))
+        quantile_df.plot(kind="line", marker="o", ax=ax)
+        ax.set_xlabel("Quantile")
+        ax.set_ylabel("Complexity Score")
+        ax.set_title("Complexity Score Quantiles by Selected Model")
+        ax.legend(title="Model")
         st.pyplot(fig)
 
         # Display recent selections
@@ -254,60 +272,44 @@ with tab2:
         # Link feedback to model selections
         st.subheader("Ratings by Model")
 
-        # Attempt to join feedback with selections
-        if "selections" in performance_data and performance_data["selections"]:
-            selections_df = pd.DataFrame(performance_data["selections"])
-
-            # Create a mapping from query to model
-            query_to_model = {
-                row["query"]: row["selected_model"] for _, row in selections_df.iterrows()
+        # Ratings are attributed to models as feedback arrives (see PerformanceMonitor)
+        model_ratings = pd.DataFrame(
+            {
+                model: {
+                    "Average Rating": summary["ratings"]["mean"],
+                    "Number of Ratings": summary["ratings"]["count"],
+                    "Standard Deviation": summary["ratings"]["std_dev"],
+                }
+                for model, summary in performance_summary["models"].items()
+                if summary["ratings"]["count"]
             }
-
-            # Add model information to feedback
-            feedback_df["model"] = feedback_df["query"].map(query_to_model)
-
-            # Filter out rows with no model information
-            feedback_with_model = feedback_df.dropna(subset=["model"])
-
-            if not feedback_with_model.empty:
-                # Calculate average rating by model
-                model_ratings = feedback_with_model.groupby("model")["rating"].agg(
-                    ["mean", "count", "std"]
-                )
-                model_ratings = model_ratings.rename(
-                    columns={
-                        "mean": "Average Rating",
-                        "count": "Number of Ratings",
-                        "std": "Standard Deviation",
-                    }
-                )
-
-                col1, col2 = st.columns(2)
-
-                with col1:
-                    st.dataframe(model_ratings.round(2), use_container_width=True)
-
-                with col2:
-                    if len(model_ratings) > 1:
-                        fig, ax = plt.subplots(figsize=(8, 6))
-                        model_ratings["Average Rating"].plot(
-                            kind="bar",
-                            ax=ax,
-                            yerr=model_ratings["Standard Deviation"],
-                            capsize=10,
-                            color=["#4C72B0", "#55A868"],
-                        )
-                        ax.set_xlabel("Model")
-                        ax.set_ylabel("Average Rating")
-                        ax.set_title("Average Rating by Model")
-                        ax.set_ylim(0, 5.5)
-                        st.pyplot(fig)
-                    else:
-                        st.info("Need ratings for multiple models to compare.")
-            else:
-                st.info("No feedback data could be linked to model selections.")
+        ).T
+
+        if not model_ratings.empty:
+            col1, col2 = st.columns(2)
+
+            with col1:
+                st.dataframe(model_ratings.round(2), use_container_width=True)
+
+            with col2:
+                if len(model_ratings) > 1:
+                    fig, ax = plt.subplots(figsize=(8, 6))
+                    model_ratings["Average Rating"].plot(
+                        kind="bar",
+                        ax=ax,
+                        yerr=model_ratings["Standard Deviation"],
+                        capsize=10,
+                        color=["#4C72B0", "#55A868"],
+                    )
+                    ax.set_xlabel("Model")
+                    ax.set_ylabel("Average Rating")
+                    ax.set_title("Average Rating by Model")
+                    ax.set_ylim(0, 5.5)
+                    st.pyplot(fig)
+                else:
+                    st.info("Need ratings for multiple models to compare.")
         else:
-            st.info("No model selection data available to link with feedback.")
+            st.info("No feedback data could be linked to model selections.")
 
         # Display recent feedback
         st.subheader("Recent User Feedback")
@@ -337,18 +339,25 @@ with tab3:
         # Convert timestamps to datetime
         selections_df["timestamp"] = pd.to_datetime(selections_df["timestamp"])
 
-        # Complexity distribution
+        # Complexity distribution (from the streaming quantile sketch)
         st.subheader("Complexity Score Distribution")
 
+        complexity_summary = performance_summary["complexity"]
+        quantiles = pd.Series(
+            {label: complexity_summary[label] for label in ("p10", "p25", "p50", "p75", "p90")}
+        )
         fig, ax = plt.subplots(figsize=(12, 6))
-        sns.histplot(data=selections_df, x="complexity", kde=True, bins=20, ax=ax)
-        ax.set_xlabel("Complexity Score")
-        ax.set_ylabel("Frequency")
-        ax.set_title("Distribution of Query Complexity Scores")
+        quantiles.plot(kind="bar", ax=ax, color="#4C72B0")
+        ax.set_xlabel("Quantile")
+        ax.set_ylabel("Complexity Score")
+        ax.set_title(
+            f"Query Complexity Quantiles (mean {complexity_summary['mean']:.3f}, "
+            f"std {complexity_summary['std_dev']:.3f}, n={complexity_summary['count']})"
+        )
 
-        # Add vertical line for typical threshold
+        # Add horizontal line for typical threshold
         threshold = 0.25  # Default threshold
-        ax.axvline(x=threshold, color="r", linestyle="--", label=f"Typical Threshold: {threshold}")
+        ax.axhline(y=threshold, color="r", linestyle="--", label=f"Typical Threshold: {threshold}")
         ax.legend()
 
         st.pyplot(fig)
@@ -16,7 +16,9 @@ sys.path.insert(0, str(Path(__file__).parent))
 
 from manuai.config import Config
 from manuai.logging import log, log_panel
-from manuai.tools import with_sql_cursor
+from manuai.schema_catalog import get_schema_catalog
+from manuai.table_statistics import get_table_statistics
+from manuai.tools import get_current_database, with_sql_cursor
 
 
 def parse_args():
@@ -134,14 +136,12 @@ def fine_tune_database(tables=None):
     
     start_time = time.time()
     
+    # One schema snapshot for the run; the indexes created below only touch their own table
+    catalog = get_schema_catalog(get_current_database())
+
     # Get all tables if not specified
     if tables is None:
-        tables = []
-        with with_sql_cursor() as cursor:
-            cursor.execute(
-                "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
-            )
-            tables = [row[0] for row in cursor.fetchall()]
+        tables = list(catalog.table_names)
     
     total_tables = len(tables)
     log_panel(
@@ -156,41 +156,30 @@ def fine_tune_database(tables=None):
     for i, table in enumerate(tables, 1):
         log(f"Fine-tuning table {i}/{total_tables}: {table}")
         try:
-            # Get column information
-            columns = []
-            row_count = 0
-            foreign_keys = []
+            # Get column, foreign key and index information from the schema catalog
+            schema = catalog.table(table)
+            if schema is None:
+                raise ValueError(f"no such table: {table}")
+            columns = schema.columns
+            foreign_keys = schema.foreign_keys
+            indexes = schema.indexes
             
-            with with_sql_cursor() as cursor:
-                cursor.execute(f"PRAGMA table_info('{table}')")
-                columns = cursor.fetchall()
-                
-                # Get row count
-                cursor.execute(f"SELECT COUNT(*) FROM {table}")
-                row_count = cursor.fetchone()[0]
-                
-                # Get foreign keys
-                cursor.execute(f"PRAGMA foreign_key_list('{table}')")
-                foreign_keys = cursor.fetchall()
-                
-                # Check existing indexes
-                cursor.execute(f"PRAGMA index_list('{table}')")
-                indexes = cursor.fetchall()
+            # Get row count (estimated from sqlite_stat1 or MAX(rowid), no full scan)
+            row_count = get_table_statistics().row_count(table, get_current_database(), count_in_background=False).count
             
             improvements = []
             
             # Create missing indexes
             for fk in foreign_keys:
-                fk_column = fk[3]  # Column name in the current table
+                fk_column = fk.column  # Column name in the current table
                 if fk_column is not None:  # Make sure column name is not None
                     has_index = any(
-                        (index_info[2].lower() if isinstance(index_info[2], str) else "") == 
-                        f"idx_{table}_{fk_column}".lower() 
-                        for index_info in indexes
+                        index.name.lower() == f"idx_{table}_{fk_column}".lower()
+                        for index in indexes
                     )
                     
                     if not has_index:
-                        with with_sql_cursor() as cursor:
+                        with with_sql_cursor(readonly=False) as cursor:
                             try:
                                 cursor.execute(f"CREATE INDEX idx_{table}_{fk_column} ON {table}({fk_column})")
                                 improvements.append(f"Added index on foreign key column '{fk_column}'")
@@ -198,7 +187,7 @@ def fine_tune_database(tables=None):
                                 log(f"  Warning: Could not create index on {fk_column}: {str(e)}")
             
             # Analyze table for query planning
-            with with_sql_cursor() as cursor:
+            with with_sql_cursor(readonly=False) as cursor:
                 cursor.execute(f"ANALYZE {table}")
                 improvements.append("Analyzed table for improved query planning")
             
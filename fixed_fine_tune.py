@@ -78,7 +78,7 @@ def fine_tune_database():
                                for index_info in indexes)
                 
                 if not has_index:
-                    with with_sql_cursor() as cursor:
+                    with with_sql_cursor(readonly=False) as cursor:
                         try:
                             cursor.execute(f"CREATE INDEX idx_{table}_{fk_column} ON {table}({fk_column})")
                             improvements.append(f"Added index on foreign key column '{fk_column}'")
@@ -86,7 +86,7 @@ def fine_tune_database():
                             log(f"  Warning: Could not create index on {fk_column}: {str(e)}")
             
             # Analyze table for query planning
-            with with_sql_cursor() as cursor:
+            with with_sql_cursor(readonly=False) as cursor:
                 cursor.execute(f"ANALYZE {table}")
                 improvements.append("Analyzed table for improved query planning")
             
@@ -1,14 +1,28 @@
 import time
 from datetime import datetime
-from typing import List
+from typing import Any, Dict, List, Optional
 
 from langchain_core.language_models.chat_models import BaseChatModel
-from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.messages import (AIMessage, BaseMessage, HumanMessage,
+                                     SystemMessage, message_chunk_to_message)
 
+from manuai.answer_cache import database_state, get_answer_cache
+from manuai.context_window import CONTINUE_PROMPT, get_context_manager
 from manuai.logging import green_border_style, log_panel
-from manuai.tools import call_tool, get_available_tools
-
-SYSTEM_PROMPT = f"""
+from manuai.metrics import get_metrics
+from manuai.models import generation_options
+from manuai.optimizations import record_response_length
+from manuai.performance_config import get_performance_config
+from manuai.plan_cache import get_plan_cache, result_digest, schema_state
+from manuai.tools import call_tools, get_available_tools, get_current_database
+
+# Times a model turn that hit its output cap (num_predict) is continued
+MAX_CONTINUATIONS = 2
+
+# Static for the life of the process: with the tool schemas and the history it forms a
+# prompt prefix that is byte-identical across turns, so Ollama can reuse its KV cache.
+# Anything that changes per turn (date, query classification) goes into the turn message.
+SYSTEM_PROMPT = """
 You are ManuAI, an advanced AI assistant with dual capabilities: a business intelligence expert for database questions and a friendly conversation partner for casual chat.
 
 🚨 CRITICAL INSTRUCTION: For casual greetings and simple conversations (like "hi", "hello", "how are you"), respond directly WITHOUT calling any tools or functions. For ANY question about data, database, or business information, you MUST use the appropriate database tools.
@@ -58,8 +72,10 @@ You can answer sophisticated business questions including:
 - Include data summaries and key takeaways when appropriate
 
 🛠️ YOUR TOOLS (USE ONLY FOR BUSINESS/DATABASE QUESTIONS):
-- list_tables: Get all table names in database
-- describe_table: Get real table schema information
+- search_schema: Find the tables relevant to a question, with their columns and foreign keys (use this first)
+- list_tables: Get all table names in database (only when you need the complete list)
+- describe_tables: Get the schemas of several tables in one call (columns, keys, references, row counts)
+- describe_table: Get real table schema information for a single table
 - sample_table: Get real sample rows from table
 - execute_sql: Execute SQL queries and return ACTUAL database results
 - get_db_stats: Get database performance statistics
@@ -102,8 +118,11 @@ You can answer sophisticated business questions including:
 User: "What's our total revenue?"
 You: [Use analyze_business_question_tool] → Provide actual revenue with business context, trends, and insights
 
+User: "Which customers placed the most orders?"
+You: [Use search_schema with the question, then execute_sql using the returned columns and foreign keys] → Present the ranked customers with insights
+
 User: "tell me about the database"
-You: [Use list_tables first, then describe key tables] → Show actual database structure with explanations
+You: [Use list_tables first, then describe_tables for the key tables in one call] → Show actual database structure with explanations
 
 User: "what type of data is in the database?"
 You: [Use list_tables and sample_table] → Show real data types, examples, and business context
@@ -128,10 +147,10 @@ You: "I'm here ready to help you explore your database or have a friendly chat!"
 🔥 ENHANCED BUSINESS INTELLIGENCE WORKFLOW:
 
 🗂️ DATABASE EXPLORATION QUESTIONS:
-"tell me about the database" → Use list_tables first, then describe_table for key tables
+"tell me about the database" → Use list_tables first, then describe_tables for key tables
 "what data do we have?" → Use list_tables + sample_table to show data examples
 "what type of data is in the database?" → Use describe_table to show schemas and data types
-"show me the database structure" → Use list_tables + describe_table for multiple tables
+"show me the database structure" → Use list_tables + describe_tables for multiple tables
 
 📊 BUSINESS ANALYSIS QUESTIONS:
 "what's our revenue?" → Use analyze_business_question_tool for comprehensive insights
@@ -149,13 +168,24 @@ You: "I'm here ready to help you explore your database or have a friendly chat!"
 
 🎯 TOOL SELECTION LOGIC:
 1. Database exploration → list_tables (always start here for "about database" questions)
-2. Data structure/types → describe_table (for schema information)
+2. Data structure/types → describe_tables (for schema information, several tables per call)
 3. Data examples → sample_table (for actual data samples)
 4. Business insights → analyze_business_question_tool (for business questions)
 5. Performance info → get_db_stats (for database performance)
 6. Custom queries → execute_sql (for specific data requests)
 
-Today is {datetime.now().strftime("%Y-%m-%d")}
+🏷️ QUERY TYPE TAGS:
+Every user message ends with a [Query type: ...] tag.
+- DATABASE: You MUST use the appropriate database tools to provide real data:
+  1. Use database tools (sample_table, list_tables, describe_table, etc.) to get actual data from the database
+  2. Format the response professionally with proper structure and explanations
+  3. Provide business context and insights about the data
+  4. Use tables, headers, and bullet points for clear presentation
+  5. Explain what each column/field represents
+  6. Highlight key patterns or insights in the data
+  7. Make the response comprehensive and actionable for business users
+  DO NOT provide any made-up or example data. Only return real database results with proper formatting and context.
+- CASUAL: Respond conversationally without using any database tools or functions.
 
 REMEMBER: 
 - Questions about "database" or "data" = USE TOOLS
@@ -234,11 +264,174 @@ def create_history() -> List[BaseMessage]:
     return [SystemMessage(content=SYSTEM_PROMPT)]
 
 
+def build_turn_message(query: str, query_type: str, classification_reasoning: str) -> HumanMessage:
+    """Build the message for a new query.
+
+    The query is tagged with its classification and today's date here instead
+    of in the system prompt, so the prompt prefix stays the same across turns.
+    """
+    return HumanMessage(
+        content=f"{query}\n\n[Query type: {query_type.upper()} ({classification_reasoning}). "
+        f"Today is {datetime.now().strftime('%Y-%m-%d')}]"
+    )
+
+
+def _output_tokens(message: BaseMessage) -> int:
+    usage = getattr(message, "usage_metadata", None)
+    if usage and usage.get("output_tokens"):
+        return usage["output_tokens"]
+    # Rough estimate for models that report no usage
+    return len(str(message.content)) // 4
+
+
+def _hit_output_cap(message: BaseMessage) -> bool:
+    return message.response_metadata.get("done_reason") == "length"
+
+
+def _merge_continuations(messages: List[BaseMessage], turn_start: int, partials: List[str]) -> AIMessage:
+    """Replace a turn continued after the num_predict cap with one AIMessage.
+
+    The continue prompts are only needed while the turn is generated; the
+    merged message is what the turn would have been without the cap.
+    """
+    response = messages[-1]
+    merged = AIMessage(
+        content="".join(partials),
+        tool_calls=response.tool_calls,
+        response_metadata=response.response_metadata,
+    )
+    del messages[turn_start:]
+    messages.append(merged)
+    return merged
+
+
+def _record_prompt_evaluated(message: BaseMessage, messages: List[BaseMessage], model: Optional[str]):
+    # Ollama reports only the prompt tokens it evaluated, not those served from the KV cache
+    usage = getattr(message, "usage_metadata", None)
+    if usage and usage.get("input_tokens") is not None:
+        get_metrics().increment("prompt_tokens_evaluated", usage["input_tokens"])
+        get_context_manager().record_evaluated(messages, usage["input_tokens"], model=model)
+
+
+def _cached_answer(query: str, history: List[BaseMessage]) -> tuple:
+    """Look a question up in the answer cache.
+
+    Returns:
+        tuple: (cached answer or None, database state to store a new answer under)
+    """
+    if not get_performance_config().llm.enable_response_caching:
+        return None, None
+    try:
+        state = database_state(get_current_database())
+    except Exception as e:
+        log_panel(title="Answer Cache", content=f"Database unavailable, cache skipped: {e}", border_style="yellow")
+        return None, None
+    answer = get_answer_cache().get(query, history, *state)
+    if answer is not None:
+        log_panel(title="Answer Cache", content="Answered from the cache (database unchanged)", border_style="blue")
+    return answer, state
+
+
+def _store_answer(query: str, history: List[BaseMessage], answer: str, state: Optional[tuple]):
+    """Cache an answer unless the database changed while it was being produced."""
+    if state is None:
+        return
+    try:
+        if database_state(get_current_database()) != state:
+            return
+    except Exception:
+        return
+    get_answer_cache().set(query, history, answer, *state)
+
+
+def _cached_plan(query: str, history: List[BaseMessage]) -> tuple:
+    """Look a question up in the plan cache.
+
+    Returns:
+        tuple: (recorded ToolPlan or None, schema state to record a new plan under)
+    """
+    if not get_performance_config().llm.enable_plan_cache:
+        return None, None
+    try:
+        schema = schema_state(get_current_database())
+    except Exception:
+        return None, None
+    return get_plan_cache().get(query, history, *schema), schema
+
+
+def _replay_plan(plan) -> tuple:
+    """Re-run the tool calls of a recorded plan without the model.
+
+    The SQL is fixed, so every call runs concurrently in one batch.
+
+    Returns:
+        tuple: (trace of (tool calls, results) per recorded turn, whether every result is unchanged)
+    """
+    calls = [call for step in plan.steps for call in step]
+    results = call_tools(calls)
+    trace, start = [], 0
+    for step in plan.steps:
+        trace.append((step, results[start:start + len(step)]))
+        start += len(step)
+    unchanged = [result_digest(result.content) for result in results] == plan.digests
+    log_panel(
+        title="Plan Replay",
+        content=f"Replayed {len(calls)} recorded tool calls | Results unchanged: {unchanged}",
+        border_style="magenta"
+    )
+    if unchanged:
+        get_plan_cache().record_unchanged_replay()
+    return trace, unchanged
+
+
+def _record_plan(query: str, history: List[BaseMessage], schema: Optional[tuple], trace: list, answer: str):
+    if schema is not None and trace:
+        get_plan_cache().record(query, history, *schema, trace, answer)
+
+
+def _record_transcript(transcript: Optional[List[BaseMessage]], messages: List[BaseMessage], answer: str):
+    """Append the messages of a turn, exactly as the model saw them, to the caller's transcript.
+
+    Keeping the tagged turn message and the tool exchanges in the conversation
+    history means the next turn's prompt starts with this one's, so the prompt
+    prefix (and Ollama's KV cache) carries over.
+    """
+    if transcript is None:
+        return
+    turn = list(messages)
+    if not turn or not isinstance(turn[-1], AIMessage) or turn[-1].tool_calls:
+        turn.append(AIMessage(content=answer))
+    transcript.extend(turn)
+
+
 def ask(
-    query: str, history: List[BaseMessage], llm: BaseChatModel, max_iterations: int = 10
+    query: str,
+    history: List[BaseMessage],
+    llm: BaseChatModel,
+    max_iterations: int = 10,
+    model_params: Optional[Dict[str, Any]] = None,
+    transcript: Optional[List[BaseMessage]] = None,
 ) -> str:
+    """Answer a query, calling tools until the model gives a final answer.
+
+    ``model_params`` (num_predict, top_p, temperature from optimize_query_execution)
+    are bound to every model call. A turn that hits the num_predict cap is
+    continued instead of being cut off, and the answer length is recorded so
+    caps are learned per query class. Answers to repeated questions about an
+    unchanged database come from the answer cache; otherwise a recorded tool
+    plan for the question is replayed and the model only phrases its results.
+    The messages of the turn are appended to ``transcript`` (if given), to be
+    kept as conversation history.
+    """
     log_panel(title="User Request", content=f"Query: {query}", border_style=green_border_style)
 
+    cached_answer, database = _cached_answer(query, history)
+    if cached_answer is not None:
+        # Same tagged turn message as a model-answered turn, so the history prefix stays stable
+        turn_message = build_turn_message(query, *classify_query_type(query))
+        _record_transcript(transcript, [turn_message], cached_answer)
+        return cached_answer
+
     # Classify query type for better tool usage
     query_type, classification_reasoning = classify_query_type(query)
     log_panel(
@@ -250,45 +443,73 @@ def ask(
     # Track performance
     start_time = time.time()
     tool_calls_made = 0
+    continuations = 0
+    turn_tokens = 0
+    max_turn_tokens = 0
+    truncated = False
+    exhausted = False
 
     # Always bind tools, but guide the model on when to use them
     tools = get_available_tools()
-    llm_with_tools = llm.bind_tools(tools)
+    llm_with_tools = llm.bind_tools(tools, **generation_options(llm, model_params))
+
+    # Every call is fitted to the model's prompt token budget; counts are cached per message
+    context = get_context_manager()
+    model_name = getattr(llm, "model", None)
 
     n_iterations = 0
     messages = history.copy()
     
-    # Add enhanced context to help the model understand query classification
-    if query_type == "database":
-        enhanced_query = f"""
-Query: {query}
-
-[SYSTEM DIRECTIVE: This is a DATABASE query. You MUST use the appropriate database tools to provide real data. 
-Classification: {classification_reasoning}
-REQUIRED ACTIONS: 
-1. Use database tools (sample_table, list_tables, describe_table, etc.) to get actual data from the database
-2. Format the response professionally with proper structure and explanations
-3. Provide business context and insights about the data
-4. Use tables, headers, and bullet points for clear presentation
-5. Explain what each column/field represents
-6. Highlight key patterns or insights in the data
-7. Make the response comprehensive and actionable for business users
-DO NOT provide any made-up or example data. Only return real database results with proper formatting and context.]
-"""
-    else:
-        enhanced_query = f"""
-Query: {query}
-
-[SYSTEM CONTEXT: This is a CASUAL conversation query. 
-{classification_reasoning}
-REQUIRED ACTION: Respond conversationally without using any database tools or functions.]
-"""
-    
-    messages.append(HumanMessage(content=enhanced_query))
-
+    # Only new content is appended: the classification tag and date travel with the query
+    messages.append(build_turn_message(query, query_type, classification_reasoning))
+
+    # A recorded plan replays its tool calls; the model only phrases the fresh results
+    plan, schema = _cached_plan(query, history)
+    trace = []
+    if plan is not None:
+        trace, unchanged = _replay_plan(plan)
+        if unchanged:
+            _store_answer(query, history, plan.answer, database)
+            _record_transcript(transcript, messages[len(history):], plan.answer)
+            return plan.answer
+        for calls, results in trace:
+            messages.append(AIMessage(content="", tool_calls=calls))
+            messages.extend(results)
+
+    partials = []
     while n_iterations < max_iterations:
-        response = llm_with_tools.invoke(messages)
+        if not continuations:
+            turn_start, partials = len(messages), []
+        response = llm_with_tools.invoke(context.prepare(messages, model=model_name, keep_from=len(history)))
         messages.append(response)
+        partials.append(str(response.content))
+
+        _record_prompt_evaluated(response, messages, model_name)
+        turn_tokens += _output_tokens(response)
+        capped = model_params and _hit_output_cap(response)
+        if capped and response.invalid_tool_calls and not response.tool_calls:
+            # Cut off inside a tool call: its arguments are incomplete, so ask again
+            truncated = True
+            del messages[turn_start:]
+            continuations = turn_tokens = 0
+            n_iterations += 1
+            continue
+        if capped and not response.tool_calls and continuations < MAX_CONTINUATIONS:
+            # Cut off by num_predict: let the model finish instead of returning half an answer
+            truncated = True
+            continuations += 1
+            messages.append(HumanMessage(content=CONTINUE_PROMPT))
+            continue
+        if capped and not response.tool_calls:
+            # Still going after every continuation: a runaway turn, not a length to learn from
+            exhausted = True
+        else:
+            max_turn_tokens = max(max_turn_tokens, turn_tokens)
+        if continuations:
+            # The answer is the turn plus its continuations, without the continue prompts
+            response = _merge_continuations(messages, turn_start, partials)
+        continuations = turn_tokens = 0
+
         if not response.tool_calls:
             # Log performance metrics
             total_time = time.time() - start_time
@@ -301,9 +522,15 @@ REQUIRED ACTION: Respond conversationally without using any database tools or fu
             # Log response type for debugging
             log_panel(
                 title="Response Summary",
-                content=f"Query type: {query_type.upper()} | Tools used: {tool_calls_made > 0} | Response length: {len(response.content)} chars",
+                content=f"Query type: {query_type.upper()} | Tools used: {tool_calls_made > 0} | Response length: {len(response.content)} chars | Output tokens: {max_turn_tokens}",
                 border_style="green"
             )
+            if model_params and not exhausted:
+                record_response_length(query, max_turn_tokens, truncated)
+            if not exhausted:
+                _store_answer(query, history, response.content, database)
+                _record_plan(query, history, schema, trace, response.content)
+            _record_transcript(transcript, messages[len(history):], response.content)
             return response.content
         
         for tool_call in response.tool_calls:
@@ -313,8 +540,9 @@ REQUIRED ACTION: Respond conversationally without using any database tools or fu
                 content=f"Tool: {tool_call['name']}\nArgs: {tool_call['args']}",
                 border_style="magenta"
             )
-            response = call_tool(tool_call)
-            messages.append(response)
+        results = call_tools(response.tool_calls)
+        trace.append((response.tool_calls, results))
+        messages.extend(results)
         n_iterations += 1
 
     # Log timeout scenario
@@ -331,13 +559,27 @@ REQUIRED ACTION: Respond conversationally without using any database tools or fu
 
 
 def ask_stream(
-    query: str, history: List[BaseMessage], llm: BaseChatModel, max_iterations: int = 10
+    query: str,
+    history: List[BaseMessage],
+    llm: BaseChatModel,
+    max_iterations: int = 10,
+    model_params: Optional[Dict[str, Any]] = None,
+    transcript: Optional[List[BaseMessage]] = None,
 ):
     """
     Streaming version of ask function that yields response chunks as they arrive.
     """
     log_panel(title="User Request", content=f"Query: {query}", border_style=green_border_style)
 
+    cached_answer, database = _cached_answer(query, history)
+    if cached_answer is not None:
+        # Same tagged turn message as a model-answered turn, so the history prefix stays stable
+        turn_message = build_turn_message(query, *classify_query_type(query))
+        _record_transcript(transcript, [turn_message], cached_answer)
+        yield "🔄 STREAMING_START"
+        yield cached_answer
+        return
+
     # Classify query type for better tool usage
     query_type, classification_reasoning = classify_query_type(query)
     log_panel(
@@ -349,63 +591,98 @@ def ask_stream(
     # Track performance
     start_time = time.time()
     tool_calls_made = 0
+    continuations = 0
+    turn_tokens = 0
+    max_turn_tokens = 0
+    truncated = False
+    exhausted = False
 
     # Always bind tools, but guide the model on when to use them
     tools = get_available_tools()
-    llm_with_tools = llm.bind_tools(tools)
+    llm_with_tools = llm.bind_tools(tools, **generation_options(llm, model_params))
+
+    # Every call is fitted to the model's prompt token budget; counts are cached per message
+    context = get_context_manager()
+    model_name = getattr(llm, "model", None)
 
     n_iterations = 0
     messages = history.copy()
     
-    # Add enhanced context to help the model understand query classification
-    if query_type == "database":
-        enhanced_query = f"""
-Query: {query}
-
-[SYSTEM DIRECTIVE: This is a DATABASE query. You MUST use the appropriate database tools to provide real data. 
-Classification: {classification_reasoning}
-REQUIRED ACTIONS: 
-1. Use database tools (sample_table, list_tables, describe_table, etc.) to get actual data from the database
-2. Format the response professionally with proper structure and explanations
-3. Provide business context and insights about the data
-4. Use tables, headers, and bullet points for clear presentation
-5. Explain what each column/field represents
-6. Highlight key patterns or insights in the data
-7. Make the response comprehensive and actionable for business users
-DO NOT provide any made-up or example data. Only return real database results with proper formatting and context.]
-"""
-    else:
-        enhanced_query = f"""
-Query: {query}
-
-[SYSTEM CONTEXT: This is a CASUAL conversation query. 
-{classification_reasoning}
-REQUIRED ACTION: Respond conversationally without using any database tools or functions.]
-"""
-    
-    messages.append(HumanMessage(content=enhanced_query))
+    # Only new content is appended: the classification tag and date travel with the query
+    messages.append(build_turn_message(query, query_type, classification_reasoning))
+
+    # A recorded plan replays its tool calls; the model only phrases the fresh results
+    plan, schema = _cached_plan(query, history)
+    trace = []
+    if plan is not None:
+        trace, unchanged = _replay_plan(plan)
+        if unchanged:
+            _store_answer(query, history, plan.answer, database)
+            _record_transcript(transcript, messages[len(history):], plan.answer)
+            yield "🔄 STREAMING_START"
+            yield plan.answer
+            return
+        for calls, results in trace:
+            messages.append(AIMessage(content="", tool_calls=calls))
+            messages.extend(results)
 
     # DON'T signal streaming start here - let loading continue during tool calls
+    streaming_started = False
+    answer_parts = []
 
     while n_iterations < max_iterations:
-        # First, check if we need to use tools by getting a non-streaming response
-        response = llm_with_tools.invoke(messages)
+        if not continuations:
+            # Only the final tool-free turn (with its continuations) is the answer;
+            # text streamed before a tool call is a preamble
+            turn_start, answer_parts = len(messages), []
+        # Stream every model turn exactly once. Chunks are merged as they arrive so tool
+        # calls are detected from the stream itself instead of a separate invoke() pass.
+        response = None
+        prompt = context.prepare(messages, model=model_name, keep_from=len(history))
+        call_start = time.perf_counter()
+        for chunk in llm_with_tools.stream(prompt):
+            if response is None:
+                get_metrics().record_first_token(model_name or "default", time.perf_counter() - call_start)
+            response = chunk if response is None else response + chunk
+            if response.tool_call_chunks or not isinstance(chunk.content, str) or not chunk.content:
+                continue
+            if not streaming_started:
+                # Signal that response streaming is about to begin (THIS is when loading should disappear)
+                yield "🔄 STREAMING_START"
+                streaming_started = True
+            answer_parts.append(chunk.content)
+            yield chunk.content
+
+        response = message_chunk_to_message(response) if response is not None else AIMessage(content="")
         messages.append(response)
-        
+
+        _record_prompt_evaluated(response, messages, model_name)
+        turn_tokens += _output_tokens(response)
+        capped = model_params and _hit_output_cap(response)
+        if capped and response.invalid_tool_calls and not response.tool_calls:
+            # Cut off inside a tool call: its arguments are incomplete, so ask again
+            truncated = True
+            del messages[turn_start:]
+            continuations = turn_tokens = 0
+            n_iterations += 1
+            continue
+        if capped and not response.tool_calls and continuations < MAX_CONTINUATIONS:
+            # Cut off by num_predict: the continuation streams on from where it stopped
+            truncated = True
+            continuations += 1
+            messages.append(HumanMessage(content=CONTINUE_PROMPT))
+            continue
+        if capped and not response.tool_calls:
+            # Still going after every continuation: a runaway turn, not a length to learn from
+            exhausted = True
+        else:
+            max_turn_tokens = max(max_turn_tokens, turn_tokens)
+        if continuations:
+            # Keep the turn and its continuations as one message, without the continue prompts
+            response = _merge_continuations(messages, turn_start, answer_parts)
+        continuations = turn_tokens = 0
+
         if not response.tool_calls:
-            # No tool calls needed, now stream the final response
-            # Signal that response streaming is about to begin (THIS is when loading should disappear)
-            yield "🔄 STREAMING_START"
-            
-            # We need to regenerate the final response with streaming
-            # Remove the last non-streaming response
-            streaming_messages = messages[:-1]
-            
-            # Stream the response
-            for chunk in llm_with_tools.stream(streaming_messages):
-                if hasattr(chunk, 'content') and chunk.content:
-                    yield chunk.content
-            
             # Log performance metrics
             total_time = time.time() - start_time
             log_panel(
@@ -417,12 +694,20 @@ REQUIRED ACTION: Respond conversationally without using any database tools or fu
             # Log response type for debugging
             log_panel(
                 title="Response Summary",
-                content=f"Query type: {query_type.upper()} | Tools used: {tool_calls_made > 0}",
+                content=f"Query type: {query_type.upper()} | Tools used: {tool_calls_made > 0} | Output tokens: {max_turn_tokens}",
                 border_style="green"
             )
+            if model_params and not exhausted:
+                record_response_length(query, max_turn_tokens, truncated)
+            answer = "".join(answer_parts)
+            if not exhausted:
+                _store_answer(query, history, answer, database)
+                _record_plan(query, history, schema, trace, answer)
+            _record_transcript(transcript, messages[len(history):], answer)
             return
         
-        # Handle tool calls (non-streaming) - loading continues during this phase
+        # Handle tool calls (non-streaming) - loading continues during this phase.
+        # All calls of one turn run concurrently; results keep the tool_call_id order.
         for tool_call in response.tool_calls:
             tool_calls_made += 1
             log_panel(
@@ -430,8 +715,9 @@ REQUIRED ACTION: Respond conversationally without using any database tools or fu
                 content=f"Tool: {tool_call['name']}\nArgs: {tool_call['args']}",
                 border_style="magenta"
             )
-            tool_response = call_tool(tool_call)
-            messages.append(tool_response)
+        results = call_tools(response.tool_calls)
+        trace.append((response.tool_calls, results))
+        messages.extend(results)
         n_iterations += 1
 
     # Log timeout scenario
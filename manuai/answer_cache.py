@@ -0,0 +1,322 @@
+"""
+Answer cache for ManuAI.
+
+This module provides:
+1. Question normalization (case, punctuation, filler words, plural endings)
+2. Exact and near-duplicate lookup of earlier answers through an inverted word index
+3. Invalidation of every answer for a database as soon as its data version changes
+"""
+
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage
+
+from manuai.database_optimizer import (DatabaseVersion, database_file_signature,
+                                       database_identity, get_pool)
+from manuai.performance_config import get_performance_config
+
+# Words that do not change what a question asks for
+FILLER_WORDS = frozenset(
+    "an the please kindly just show me list give tell display get find what whats which are is was were "
+    "can could would will you we us our my to see want need know let of do does have has there".split()
+)
+
+# Questions that refer back to the conversation; their answer depends on earlier turns
+_FOLLOW_UP_PATTERN = re.compile(
+    r"^(and|but|also|so|then|what about|how about)\b"
+    r"|\b(it|its|those|these|them|they|same|previous|above|again|instead|else)\b"
+)
+
+# Questions whose answer depends on today's date
+_RELATIVE_DATE_PATTERN = re.compile(
+    r"\b(today|yesterday|tomorrow|now|current|currently|recent|recently|latest|ytd|"
+    r"(this|last|next|past) (day|week|month|quarter|year))\b"
+)
+
+# Prefixes that negate a word ("delivered" -> "undelivered"); such pairs never match
+_NEGATION_PREFIXES = ("un", "in", "im", "non", "dis", "ir")
+
+_WORD_PATTERN = re.compile(r"[a-z]+|\d+(?:\.\d+)?")
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase a question and collapse punctuation and whitespace."""
+    return " ".join(_WORD_PATTERN.findall(question.lower().replace("'", "")))
+
+
+def stem_word(word: str) -> str:
+    """Strip plural endings ("customers" -> "customer", "categories" -> "category")."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("ses", "xes", "ches", "shes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _trigrams(word: str) -> Set[str]:
+    padded = f" {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _word_similarity(a: str, b: str) -> float:
+    if a == b:
+        return 1.0
+    if a.isdigit() or b.isdigit() or _is_negation(a, b):
+        return 0.0
+    grams_a, grams_b = _trigrams(a), _trigrams(b)
+    return len(grams_a & grams_b) / math.sqrt(len(grams_a) * len(grams_b))
+
+
+def _is_negation(a: str, b: str) -> bool:
+    shorter, longer = sorted((a, b), key=len)
+    return any(longer == prefix + shorter for prefix in _NEGATION_PREFIXES)
+
+
+def question_terms(text: str) -> Tuple[str, ...]:
+    """Stemmed content words of a normalized question, in order."""
+    return tuple(stem_word(word) for word in text.split() if word not in FILLER_WORDS)
+
+
+class QuestionSignature(NamedTuple):
+    """Normalized forms of a question used for lookup."""
+
+    text: str  # normalized question (exact matches)
+    terms: Tuple[str, ...]  # stemmed content words in order (filler and plural insensitive matches)
+    numbers: Tuple[str, ...]  # numbers must match exactly ("top 5" is not "top 10")
+
+
+def question_signature(question: str) -> QuestionSignature:
+    """Build the lookup signature of a question."""
+    text = normalize_question(question)
+    terms = question_terms(text)
+    numbers = tuple(term for term in terms if not term.isalpha())
+    return QuestionSignature(text, terms, numbers)
+
+
+def is_follow_up(question: str, history: List[BaseMessage]) -> bool:
+    """Whether a question refers back to earlier turns of the conversation."""
+    if not any(isinstance(message, HumanMessage) for message in history):
+        return False
+    return bool(_FOLLOW_UP_PATTERN.search(normalize_question(question)))
+
+
+class AnswerCache:
+    """Cache of final agent answers keyed by question, database and data version.
+
+    A lookup first tries the normalized question text, then the sequence of
+    stemmed content words, then questions whose words match position by
+    position with a word trigram similarity of at least ``similarity`` (for
+    spelling variants) and whose numbers are equal. A word never matches its
+    negated form ("delivered" and "undelivered"), and single letters ("product
+    A") are kept as content words. So "Show me the top 5 customers by revenue"
+    finds an answer cached for "top 5 customer by revenue?", but not one for
+    "top 10 customers by revenue", "top 5 customers by profit" or "revenue by
+    top 5 customers".
+
+    Entries carry the ``DatabaseVersion`` they were answered at. The first
+    lookup or store that sees a newer version of a database drops all of its
+    entries. ``ttl`` additionally expires entries by age.
+    """
+
+    def __init__(self, max_size: int = 500, ttl: Optional[int] = 900, similarity: float = 0.8):
+        """Initialize the answer cache.
+
+        Args:
+            max_size: Maximum number of cached answers
+            ttl: Time-to-live in seconds for cached answers (None to keep until invalidated)
+            similarity: Minimum word similarity for a near-duplicate match
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.similarity = similarity
+        self.cache: OrderedDict = OrderedDict()  # (identity, text, day) -> entry
+        self._by_terms: Dict[tuple, tuple] = {}  # (identity, terms, numbers, day) -> key
+        self._by_word: Dict[tuple, Set[tuple]] = {}  # (identity, term) -> keys
+        self._versions: Dict[str, DatabaseVersion] = {}
+        self.lock = threading.RLock()
+        self._stats = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "skipped": 0, "invalidations": 0}
+
+    @classmethod
+    def from_config(cls) -> "AnswerCache":
+        """Build an answer cache from LLMOptimizationConfig."""
+        llm_config = get_performance_config().llm
+        return cls(
+            max_size=llm_config.response_cache_size,
+            ttl=llm_config.response_cache_ttl,
+            similarity=llm_config.response_cache_similarity,
+        )
+
+    def _remove(self, key: tuple):
+        identity = key[0]
+        _, _, signature, _ = self.cache.pop(key)
+        self._by_terms.pop((identity, signature.terms, signature.numbers, key[2]), None)
+        for term in set(signature.terms):
+            keys = self._by_word.get((identity, term))
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_word[(identity, term)]
+
+    def _check_version(self, identity: str, version: DatabaseVersion):
+        """Drop every entry of a database answered at another data version."""
+        if self._versions.get(identity, version) != version:
+            stale = [key for key in self.cache if key[0] == identity]
+            for key in stale:
+                self._remove(key)
+            self._stats["invalidations"] += len(stale)
+        self._versions[identity] = version
+
+    def _find(self, identity: str, signature: QuestionSignature, day: str) -> Tuple[Optional[tuple], str]:
+        key = (identity, signature.text, day)
+        if key in self.cache:
+            return key, "exact"
+        key = self._by_terms.get((identity, signature.terms, signature.numbers, day))
+        if key is not None:
+            return key, "similar"
+        if not signature.terms:
+            return None, ""
+
+        # Candidates share at least one word; each must match every word at the same position
+        candidates = set()
+        for term in set(signature.terms):
+            candidates |= self._by_word.get((identity, term), set())
+        for key in candidates:
+            other = self.cache[key][2]
+            if key[2] != day or other.numbers != signature.numbers or len(other.terms) != len(signature.terms):
+                continue
+            if _terms_match(signature.terms, other.terms, self.similarity):
+                return key, "similar"
+        return None, ""
+
+    def get(
+        self,
+        question: str,
+        history: List[BaseMessage],
+        db_identity: str,
+        version: DatabaseVersion,
+    ) -> Optional[str]:
+        """Get the cached answer to a question, or None.
+
+        Args:
+            question: User's natural language question
+            history: Conversation before the question
+            db_identity: Identity of the database the question is asked about
+            version: Current version of that database
+
+        Returns:
+            Optional[str]: Cached answer or None
+        """
+        if is_follow_up(question, history):
+            with self.lock:
+                self._stats["skipped"] += 1
+            return None
+        signature = question_signature(question)
+        day = question_day(signature.text)
+
+        with self.lock:
+            self._check_version(db_identity, version)
+            key, match = self._find(db_identity, signature, day)
+            if key is not None:
+                timestamp, answer, _, _ = self.cache[key]
+                if self.ttl is None or time.time() - timestamp <= self.ttl:
+                    self.cache.move_to_end(key)
+                    self._stats[f"{match}_hits"] += 1
+                    return answer
+                self._remove(key)
+            self._stats["misses"] += 1
+            return None
+
+    def set(
+        self,
+        question: str,
+        history: List[BaseMessage],
+        answer: str,
+        db_identity: str,
+        version: DatabaseVersion,
+    ) -> None:
+        """Cache the answer to a question.
+
+        Args:
+            question: User's natural language question
+            history: Conversation before the question
+            answer: Final answer given to the user
+            db_identity: Identity of the database the question was asked about
+            version: Version of that database when the question was answered
+        """
+        if not answer.strip() or is_follow_up(question, history):
+            return
+        signature = question_signature(question)
+        day = question_day(signature.text)
+        key = (db_identity, signature.text, day)
+
+        with self.lock:
+            self._check_version(db_identity, version)
+            if key in self.cache:
+                self._remove(key)
+            self.cache[key] = (time.time(), answer, signature, version)
+            self._by_terms[(db_identity, signature.terms, signature.numbers, day)] = key
+            for term in set(signature.terms):
+                self._by_word.setdefault((db_identity, term), set()).add(key)
+
+            # Trim cache if needed
+            while len(self.cache) > self.max_size:
+                self._remove(next(iter(self.cache)))
+
+    def clear(self):
+        """Drop every cached answer."""
+        with self.lock:
+            self.cache.clear()
+            self._by_terms.clear()
+            self._by_word.clear()
+            self._versions.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get answer cache statistics."""
+        with self.lock:
+            hits = self._stats["exact_hits"] + self._stats["similar_hits"]
+            lookups = hits + self._stats["misses"]
+            return {
+                "entries": len(self.cache),
+                "max_size": self.max_size,
+                "hits": hits,
+                **self._stats,
+                "hit_ratio": f"{hits / lookups * 100 if lookups else 0:.1f}%",
+            }
+
+
+def question_day(text: str) -> str:
+    """Day a normalized question is tied to: today for relative dates ("this month"), else ""."""
+    return date.today().isoformat() if _RELATIVE_DATE_PATTERN.search(text) else ""
+
+
+def _terms_match(terms: Tuple[str, ...], other: Tuple[str, ...], similarity: float) -> bool:
+    return all(_word_similarity(term, candidate) >= similarity for term, candidate in zip(terms, other))
+
+
+def database_state(db_path: Optional[str] = None) -> Tuple[str, DatabaseVersion]:
+    """Identity and current version of a database, as used for answer cache keys."""
+    pool = get_pool(db_path, readonly=True)
+    return database_identity(pool.db_path), DatabaseVersion(pool.data_version(), database_file_signature(pool.db_path))
+
+
+# Global answer cache
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """Get global answer cache."""
+    global _answer_cache
+    if _answer_cache is None:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                _answer_cache = AnswerCache.from_config()
+    return _answer_cache
@@ -12,6 +12,15 @@ from datetime import datetime, timedelta
 from typing import Any, Dict, List, Optional, Tuple
 
 from manuai.database_optimizer import cached_query, get_optimizer
+from manuai.schema_catalog import get_schema_catalog
+
+_TABLE_PATTERN = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)", re.IGNORECASE)
+
+
+def _tables_exist(query: str) -> bool:
+    """Whether every table a query reads exists in the default database's schema catalog."""
+    catalog = get_schema_catalog()
+    return all(catalog.has_table(table) for table in _TABLE_PATTERN.findall(query))
 
 
 @dataclass
@@ -215,6 +224,8 @@ class BusinessIntelligenceEngine:
         
         for query in pattern_info["queries"]:
             try:
+                if not _tables_exist(query):
+                    continue
                 results = cached_query(query)
                 if results:
                     metric = self._convert_query_result_to_metric(
@@ -418,6 +429,8 @@ class BusinessIntelligenceEngine:
             
             for query, name, category in queries:
                 try:
+                    if not _tables_exist(query):
+                        continue
                     result = cached_query(query)
                     if result:
                         metrics.append(BusinessMetric(
@@ -455,6 +468,8 @@ class BusinessIntelligenceEngine:
             
             for query, metric_name in key_queries:
                 try:
+                    if not _tables_exist(query):
+                        continue
                     result = cached_query(query)
                     if result and result[0][0] is not None:
                         value = result[0][0]
@@ -0,0 +1,439 @@
+"""
+Prompt context management for ManuAI.
+
+This module provides:
+1. Token counting with a BPE tokenizer (tiktoken) when available, cached per message
+2. A hard prompt token budget per model, calibrated against the prompt token
+   counts Ollama reports
+3. Budget enforcement that elides old tool results first and then drops the
+   oldest turns, always keeping tool calls and their results together
+4. Sticky cuts per conversation, so the prompt prefix stays identical between
+   calls and Ollama can reuse its KV cache
+"""
+
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import (AIMessage, BaseMessage, HumanMessage,
+                                     SystemMessage, ToolMessage)
+
+from manuai.metrics import get_metrics
+from manuai.performance_config import get_performance_config
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+# Pre-tokenization split used by Llama 3 / cl100k-style BPE tokenizers: contractions,
+# letter runs, 1-3 digit runs, punctuation runs and whitespace
+_PRETOKEN_PATTERN = re.compile(
+    r"'(?:[sdmt]|ll|ve|re)|[^\r\n\w]?[^\W\d_]+|\d{1,3}| ?(?:[^\s\w]|_)+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+",
+    re.IGNORECASE,
+)
+
+# Tokens the chat template adds around every message (role header and end-of-turn marker)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Budget calibration: appended tokens a call needs to count as a sample, and the weight of each sample
+CALIBRATION_MIN_TOKENS = 64
+CALIBRATION_WEIGHT = 0.1
+
+ELIDED_NOTE = "[... older tool result elided ({tokens} tokens); call the tool again if you need it ...]"
+TRUNCATED_NOTE = "[... tool result truncated to fit the context budget ...]"
+
+# Sent when a model turn hit its output cap (num_predict); belongs to the turn it continues
+CONTINUE_PROMPT = "Continue exactly where you stopped. Do not repeat anything you already wrote."
+
+
+def starts_turn(message: BaseMessage) -> bool:
+    """Whether a message opens a new user turn (continue prompts do not)."""
+    return isinstance(message, HumanMessage) and message.content != CONTINUE_PROMPT
+
+
+class TokenCounter:
+    """Counts tokens of texts and chat messages.
+
+    Uses tiktoken's ``cl100k_base`` BPE, which is close to the Llama 3
+    vocabulary, when tiktoken is installed and its encoding can be loaded.
+    Otherwise the count is estimated from the BPE pre-tokenization split, with
+    long pieces counted as several tokens. Neither is the served model's own
+    tokenizer; ``ContextWindowManager`` corrects for that per model.
+
+    Message counts are cached by message identity. History messages are the
+    same (never mutated) objects every turn, so each one is tokenized once.
+    """
+
+    MAX_CACHED_MESSAGES = 10000
+
+    def __init__(self, encoding: Optional[str] = "cl100k_base"):
+        """Initialize the token counter.
+
+        Args:
+            encoding: tiktoken encoding name (None to always estimate)
+        """
+        self.encoding = None
+        if tiktoken is not None and encoding:
+            try:
+                self.encoding = tiktoken.get_encoding(encoding)
+            except Exception:
+                # Encoding files are downloaded on first use and may be unavailable offline
+                self.encoding = None
+        self._cache: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def exact(self) -> bool:
+        """Whether counts come from a BPE tokenizer rather than the estimate."""
+        return self.encoding is not None
+
+    def count(self, text: str) -> int:
+        """Count the tokens of a text."""
+        if not text:
+            return 0
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return sum(1 + (len(piece) - 1) // 8 for piece in _PRETOKEN_PATTERN.findall(text))
+
+    def count_message(self, message: BaseMessage) -> int:
+        """Count the tokens of a message, including tool calls and template overhead."""
+        key = id(message)
+        with self.lock:
+            cached = self._cache.get(key)
+            # The cache holds the message itself, so its id cannot be reused while cached
+            if cached is not None and cached[0] is message:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+
+        content = message.content if isinstance(message.content, str) else json.dumps(message.content, default=str)
+        tokens = MESSAGE_OVERHEAD_TOKENS + self.count(content)
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            tokens += self.count(tool_call["name"]) + self.count(json.dumps(tool_call["args"], default=str))
+
+        with self.lock:
+            self.misses += 1
+            self._cache[key] = (message, tokens)
+            if len(self._cache) > self.MAX_CACHED_MESSAGES:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def count_messages(self, messages: List[BaseMessage]) -> int:
+        """Count the tokens of a list of messages."""
+        return sum(self.count_message(message) for message in messages)
+
+
+def _same_message(a: BaseMessage, b: BaseMessage) -> bool:
+    return (
+        type(a) is type(b)
+        and a.content == b.content
+        and getattr(a, "tool_calls", None) == getattr(b, "tool_calls", None)
+        and getattr(a, "tool_call_id", None) == getattr(b, "tool_call_id", None)
+    )
+
+
+class _ConversationPlan:
+    """Budget cuts made in one conversation (kept alive by reference) and its last prompt."""
+
+    def __init__(self):
+        self.elided: Dict[int, BaseMessage] = {}
+        self.dropped: Dict[int, BaseMessage] = {}
+        self.last_prompt: List[BaseMessage] = []
+        self.appended: Optional[int] = None  # counted tokens the last call appended to the one before
+
+
+class ContextWindowManager:
+    """Fits a conversation into a model's prompt token budget.
+
+    When the messages exceed the budget, in order:
+    1. Tool results older than the latest tool-call round are elided to their
+       first and last line (CSV header and row-count summary), oldest first
+    2. The oldest earlier turns (a human message and everything up to the next
+       one) are dropped whole, so tool calls never lose their results
+    3. The latest round's tool results are truncated to what still fits
+
+    System messages and the current exchange are never dropped. Elisions and
+    drops are remembered per conversation and reapplied on later calls.
+
+    Counts come from ``TokenCounter``, not the served model's tokenizer. Each
+    model's budget is therefore scaled by the ratio of the prompt tokens Ollama
+    reports evaluating (``prompt_eval_count``) to the counted tokens, sampled
+    on calls that only appended to the previous prompt (Ollama serves the rest
+    from its KV cache) and averaged over calls.
+    """
+
+    MAX_CONVERSATIONS = 256
+
+    def __init__(self, counter: Optional[TokenCounter] = None):
+        """Initialize the context window manager.
+
+        Args:
+            counter: Token counter (a new TokenCounter by default)
+        """
+        self.counter = counter or TokenCounter()
+        self.lock = threading.Lock()
+        # Elided copy of each tool result, so it is built (and counted) only once
+        self._elided: OrderedDict = OrderedDict()
+        # Sticky cuts and last prompt per conversation
+        self._plans: OrderedDict = OrderedDict()
+        # Model tokens per counted token, per model
+        self._scales: Dict[str, float] = {}
+
+    def budget_for(self, model: Optional[str] = None) -> int:
+        """Prompt token budget for a model in counted tokens (LLMOptimizationConfig.prompt_token_budget
+        by default), scaled by the model's calibration."""
+        llm_config = get_performance_config().llm
+        budget = (llm_config.model_prompt_budgets or {}).get(model, llm_config.prompt_token_budget)
+        return int(budget / self.token_scale(model))
+
+    def token_scale(self, model: Optional[str] = None) -> float:
+        """Model tokens per counted token, as calibrated so far (1.0 before any sample)."""
+        with self.lock:
+            return self._scales.get(model or "default", 1.0)
+
+    def record_evaluated(self, messages: List[BaseMessage], evaluated: int, model: Optional[str] = None):
+        """Calibrate a model's token scale with the prompt tokens the server reported for the last call.
+
+        Args:
+            messages: Conversation of the call, as passed to ``prepare``
+            evaluated: Prompt tokens the server evaluated (Ollama's ``prompt_eval_count``)
+            model: Model name
+        """
+        plan = self._plan(messages)
+        appended, plan.appended = plan.appended, None
+        if appended is None or appended < CALIBRATION_MIN_TOKENS or evaluated <= 0:
+            return
+        # Clamped: the server may reuse more or less of its cache than the message-level prefix
+        ratio = min(max(evaluated / appended, 0.5), 2.0)
+        key = model or "default"
+        with self.lock:
+            scale = self._scales.get(key, 1.0)
+            self._scales[key] = scale + CALIBRATION_WEIGHT * (ratio - scale)
+        get_metrics().increment("context_calibration_samples")
+
+    def elide_tool_result(self, message: ToolMessage) -> ToolMessage:
+        """Replace a tool result with its first and last line and a note."""
+        key = id(message)
+        with self.lock:
+            cached = self._elided.get(key)
+            if cached is not None and cached[0] is message:
+                return cached[1]
+
+        keep = get_performance_config().llm.elided_tool_result_chars
+        lines = str(message.content).splitlines()
+        note = ELIDED_NOTE.format(tokens=self.counter.count_message(message))
+        parts = [lines[0][:keep]] if lines else []
+        parts.append(note)
+        if len(lines) > 1:
+            parts.append(lines[-1][:keep])
+        elided = ToolMessage(content="\n".join(parts), tool_call_id=message.tool_call_id, name=message.name)
+
+        with self.lock:
+            self._elided[key] = (message, elided)
+            if len(self._elided) > TokenCounter.MAX_CACHED_MESSAGES:
+                self._elided.popitem(last=False)
+        return elided
+
+    def _truncate_tool_result(self, message: ToolMessage, max_tokens: int) -> ToolMessage:
+        content = str(message.content)
+        content_tokens = self.counter.count_message(message) - MESSAGE_OVERHEAD_TOKENS
+        keep_tokens = max_tokens - MESSAGE_OVERHEAD_TOKENS - self.counter.count(TRUNCATED_NOTE) - 1
+        keep_chars = max(int(len(content) * keep_tokens / max(content_tokens, 1)), 0)
+        # Token density is not uniform, so shave off more until the cut really fits
+        while keep_chars > 0 and self.counter.count(content[:keep_chars]) > keep_tokens:
+            keep_chars = int(keep_chars * 0.95)
+        return ToolMessage(
+            content=content[:keep_chars] + "\n" + TRUNCATED_NOTE,
+            tool_call_id=message.tool_call_id,
+            name=message.name,
+        )
+
+    def _plan(self, messages: List[BaseMessage]) -> "_ConversationPlan":
+        """Plan of the conversation, identified by its first (system) message object."""
+        first = messages[0] if messages else None
+        key = id(first)
+        with self.lock:
+            entry = self._plans.get(key)
+            if entry is None or entry[0] is not first:
+                entry = self._plans[key] = (first, _ConversationPlan())
+                if len(self._plans) > self.MAX_CONVERSATIONS:
+                    self._plans.popitem(last=False)
+            self._plans.move_to_end(key)
+            return entry[1]
+
+    def fit(
+        self,
+        messages: List[BaseMessage],
+        model: Optional[str] = None,
+        budget: Optional[int] = None,
+        keep_from: Optional[int] = None,
+    ) -> List[BaseMessage]:
+        """Return the messages to send so that the prompt fits the token budget.
+
+        Cuts are sticky per conversation: messages elided or dropped by an
+        earlier call stay that way, and turns are dropped down to
+        ``prompt_trim_target`` of the budget. Later calls then only append, so
+        the prompt prefix does not shift on every turn.
+
+        Args:
+            messages: Full conversation, oldest first
+            model: Model name, used to look up its budget
+            budget: Prompt token budget (overrides the model's)
+            keep_from: Index where the current exchange starts; it is never dropped
+                (defaults to the last user turn)
+
+        Returns:
+            List of messages within the budget where possible
+        """
+        if budget is None:
+            budget = self.budget_for(model)
+        if keep_from is None:
+            keep_from = max(
+                (i for i, message in enumerate(messages) if starts_turn(message)), default=0
+            )
+        keep_message = messages[keep_from] if keep_from < len(messages) else None
+
+        # Reapply earlier cuts
+        plan = self._plan(messages)
+        originals = [message for message in messages if id(message) not in plan.dropped]
+        messages = [
+            self.elide_tool_result(message) if id(message) in plan.elided else message
+            for message in originals
+        ]
+        counts = [self.counter.count_message(message) for message in messages]
+        total = sum(counts)
+        if total <= budget:
+            return messages
+
+        metrics = get_metrics()
+        target = int(budget * get_performance_config().llm.prompt_trim_target)
+        keep_from = next((i for i, message in enumerate(originals) if message is keep_message), len(originals))
+
+        # The latest tool-call round: results the model has not answered yet
+        latest_round = set()
+        for i in range(len(messages) - 1, -1, -1):
+            if isinstance(messages[i], ToolMessage):
+                latest_round.add(i)
+            elif isinstance(messages[i], AIMessage) and messages[i].tool_calls:
+                break
+            else:
+                latest_round.clear()
+                break
+
+        # 1. Elide older tool results, oldest first. This only changes the prompt from
+        #    the elided message on, so it goes no further than the budget.
+        for i, message in enumerate(messages):
+            if total <= budget:
+                break
+            if isinstance(message, ToolMessage) and i not in latest_round and message is originals[i]:
+                elided = self.elide_tool_result(message)
+                elided_count = self.counter.count_message(elided)
+                if elided_count < counts[i]:
+                    total -= counts[i] - elided_count
+                    messages[i], counts[i] = elided, elided_count
+                    plan.elided[id(message)] = message
+                    metrics.increment("context_tool_results_elided")
+
+        # 2. Drop the oldest earlier turns whole. This changes the prompt right after the
+        #    system prompt, so it goes down to the trim target to leave room for later turns.
+        turns: List[List[int]] = []
+        for i, message in enumerate(messages[:keep_from]):
+            if isinstance(message, SystemMessage):
+                continue
+            if starts_turn(message) or not turns:
+                turns.append([])
+            turns[-1].append(i)
+        dropped = set()
+        for turn in turns if total > budget else []:
+            if total <= target:
+                break
+            for i in turn:
+                dropped.add(i)
+                plan.dropped[id(originals[i])] = originals[i]
+            total -= sum(counts[i] for i in turn)
+            metrics.increment("context_messages_dropped", len(turn))
+
+        # 3. Truncate the latest tool results to what is left (not sticky: the round changes every call)
+        if total > budget and latest_round:
+            round_tokens = sum(counts[i] for i in latest_round)
+            available = max(budget - (total - round_tokens), 0)
+            for i in sorted(latest_round):
+                share = available * counts[i] // round_tokens
+                if share < counts[i]:
+                    messages[i] = self._truncate_tool_result(messages[i], share)
+                    metrics.increment("context_tool_results_truncated")
+
+        return [message for i, message in enumerate(messages) if i not in dropped]
+
+    def prepare(
+        self,
+        messages: List[BaseMessage],
+        model: Optional[str] = None,
+        keep_from: Optional[int] = None,
+    ) -> List[BaseMessage]:
+        """Fit the messages of a model call and record how much of the prompt prefix is reused.
+
+        The reused prefix is the run of leading messages identical to the
+        previous call of the same conversation, which is what the server can
+        serve from its KV cache.
+
+        Args:
+            messages: Full conversation, oldest first
+            model: Model name, used to look up its budget
+            keep_from: Index where the current exchange starts
+
+        Returns:
+            List of messages to send
+        """
+        prompt = self.fit(messages, model=model, keep_from=keep_from)
+        plan = self._plan(messages)
+
+        reused = reused_messages = 0
+        for previous, message in zip(plan.last_prompt, prompt):
+            if previous is not message and not _same_message(previous, message):
+                break
+            reused += self.counter.count_message(message)
+            reused_messages += 1
+
+        # A call that only appends is a calibration sample. A leading AI message is the model's
+        # own output of the last call, which the server already holds in its cache.
+        plan.appended = None
+        if plan.last_prompt and reused_messages == len(plan.last_prompt):
+            appended = prompt[reused_messages:]
+            if appended and isinstance(appended[0], AIMessage):
+                appended = appended[1:]
+            plan.appended = self.counter.count_messages(appended)
+        plan.last_prompt = prompt
+        get_metrics().record_prompt(model or "default", self.counter.count_messages(prompt), reused)
+        return prompt
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Token count cache statistics."""
+        with self.counter.lock:
+            return {
+                "cached_messages": len(self.counter._cache),
+                "cache_hits": self.counter.hits,
+                "cache_misses": self.counter.misses,
+                "exact_tokenizer": self.counter.exact,
+                "token_scales": {model: round(scale, 3) for model, scale in self._scales.items()},
+            }
+
+
+# Global context window manager
+_context_manager = None
+_context_manager_lock = threading.Lock()
+
+
+def get_context_manager() -> ContextWindowManager:
+    """Get global context window manager."""
+    global _context_manager
+    if _context_manager is None:
+        with _context_manager_lock:
+            if _context_manager is None:
+                _context_manager = ContextWindowManager()
+    return _context_manager
@@ -4,295 +4,1069 @@ Database optimization module for faster LLM-database interactions.
 This module provides:
 1. Connection pooling for database performance
 2. Query result caching
-3. Schema caching to avoid repeated PRAGMA calls
+3. Schema lookups served from the persistent schema catalog
 4. Smart query optimization hints
 """
 
+import fnmatch
 import hashlib
 import json
+import marshal
+import os
+import re
 import sqlite3
+import sys
 import threading
 import time
-from collections import OrderedDict
+from collections import OrderedDict, deque
 from contextlib import contextmanager
 from functools import wraps
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from urllib.request import pathname2url
 
 from manuai.config import Config
+from manuai.metrics import get_metrics
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no pooled connection becomes available before the timeout."""
+
+
+class WaitTimeHistogram:
+    """Fixed-bucket histogram of pool checkout wait times in milliseconds."""
+
+    BUCKETS_MS = (0.1, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, wait_ms: float):
+        index = 0
+        while index < len(self.BUCKETS_MS) and wait_ms > self.BUCKETS_MS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.total += 1
+        self.sum_ms += wait_ms
+        self.max_ms = max(self.max_ms, wait_ms)
+
+    def to_dict(self) -> Dict[str, Any]:
+        labels = [f"<={bound}ms" for bound in self.BUCKETS_MS] + [f">{self.BUCKETS_MS[-1]}ms"]
+        return {
+            "buckets": dict(zip(labels, self.counts)),
+            "avg_ms": round(self.sum_ms / self.total, 3) if self.total else 0.0,
+            "max_ms": round(self.max_ms, 3),
+        }
 
 
 class DatabasePool:
-    """Connection pool for SQLite database to improve performance."""
+    """Connection pool for a single SQLite database file.
+
+    PRAGMAs are applied once when a connection is created, so pooled connections keep
+    their page cache between checkouts. Idle connections are kept in LRU order and the
+    least recently used ones are closed once more than ``max_idle`` are idle.
+
+    Checkout blocks on a condition variable instead of polling, so waiting threads never
+    hold the lock that ``return_connection`` needs. Waiters are served in FIFO order.
+
+    Read-only pools open ``file:...?mode=ro`` URIs with memory-mapped I/O, so SQLite
+    itself rejects writes and repeated scans are served from the mmap. Databases
+    matching ``immutable_databases`` are additionally opened with ``immutable=1``.
+    """
     
-    def __init__(self, max_connections: int = 10, timeout: float = 30.0):
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        max_connections: int = 10,
+        timeout: float = 30.0,
+        max_idle: int = 4,
+        readonly: bool = False,
+    ):
+        self.db_path = str(db_path or Config.Path.DATABASE_PATH)
+        self.readonly = readonly
         self.max_connections = max_connections
         self.timeout = timeout
-        self.pool = []
+        self.max_idle = max_idle
+        self.pool = deque()  # idle connections, least recently used on the left
         self.in_use = set()
         self.lock = threading.RLock()
+        self.available = threading.Condition(self.lock)
+        self.waiters = deque()  # FIFO queue of waiting checkouts
         self.created_connections = 0
+        self.closed = False
+        self.wait_times = WaitTimeHistogram()
+        self._sentinel = None  # dedicated connection that observes data_version
+        self._sentinel_lock = threading.Lock()
+        self._stats = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "reused": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "health_check_failures": 0,
+        }
+    
+    def _create_connection(self) -> sqlite3.Connection:
+        """Open a new connection and apply the configured PRAGMAs once."""
+        from manuai.performance_config import get_performance_config
+
+        db_config = get_performance_config().database
+        if self.readonly:
+            conn = sqlite3.connect(
+                readonly_uri(self.db_path, db_config.immutable_databases),
+                uri=True,
+                timeout=self.timeout,
+                check_same_thread=False,
+            )
+            conn.execute(f"PRAGMA mmap_size={db_config.mmap_size}")
+        else:
+            conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+            conn.execute(f"PRAGMA journal_mode={db_config.journal_mode}")
+            conn.execute(f"PRAGMA synchronous={db_config.synchronous}")
+        conn.execute(f"PRAGMA cache_size={db_config.cache_size}")
+        conn.execute(f"PRAGMA temp_store={db_config.temp_store}")
+        self._stats["connections_created"] += 1
+        return conn
+    
+    def _close_connection(self, conn: sqlite3.Connection):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        self.created_connections -= 1
+        self._stats["connections_closed"] += 1
+
+    def _is_healthy(self, conn: sqlite3.Connection) -> bool:
+        """Cheap liveness check run on every checkout of an idle connection."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            self._stats["health_check_failures"] += 1
+            return False
+
+    def _try_acquire(self) -> Optional[sqlite3.Connection]:
+        """Take an idle connection or open a new one. Caller must hold the lock."""
+        # Reuse the most recently returned connection (warmest page cache)
+        while self.pool:
+            conn = self.pool.pop()
+            if self._is_healthy(conn):
+                self._stats["reused"] += 1
+                return conn
+            self._close_connection(conn)
+
+        # Create new connection if under limit
+        if self.created_connections < self.max_connections:
+            conn = self._create_connection()
+            self.created_connections += 1
+            return conn
+        return None
         
-    def get_connection(self) -> sqlite3.Connection:
+    def get_connection(self, timeout: Optional[float] = None) -> sqlite3.Connection:
         """Get a database connection from the pool."""
-        with self.lock:
-            # Try to get an existing connection
-            if self.pool:
-                conn = self.pool.pop()
-                self.in_use.add(conn)
-                return conn
-            
-            # Create new connection if under limit
-            if self.created_connections < self.max_connections:
-                conn = sqlite3.connect(
-                    Config.Path.DATABASE_PATH,
-                    timeout=self.timeout,
-                    check_same_thread=False
-                )
-                # Enable optimizations
-                conn.execute("PRAGMA journal_mode=WAL")
-                conn.execute("PRAGMA synchronous=NORMAL")
-                conn.execute("PRAGMA cache_size=10000")
-                conn.execute("PRAGMA temp_store=MEMORY")
-                
-                self.created_connections += 1
-                self.in_use.add(conn)
-                return conn
-            
-            # Wait for a connection to be available
-            start_time = time.time()
-            while time.time() - start_time < self.timeout:
-                if self.pool:
-                    conn = self.pool.pop()
-                    self.in_use.add(conn)
-                    return conn
-                time.sleep(0.01)
-            
-            raise Exception("Database connection pool exhausted")
+        timeout = self.timeout if timeout is None else timeout
+        start_time = time.monotonic()
+
+        with self.available:
+            self._stats["checkouts"] += 1
+
+            # Fast path: only when nobody is queued, so waiters are not overtaken
+            conn = None if self.waiters else self._try_acquire()
+            if conn is None:
+                self._stats["waits"] += 1
+                ticket = object()
+                self.waiters.append(ticket)
+                try:
+                    deadline = start_time + timeout
+                    while True:
+                        if self.waiters[0] is ticket:
+                            conn = self._try_acquire()
+                            if conn is not None:
+                                break
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._stats["timeouts"] += 1
+                            raise PoolExhaustedError("Database connection pool exhausted")
+                        self.available.wait(remaining)
+                finally:
+                    self.waiters.remove(ticket)
+                    # Wake the next waiter in line
+                    self.available.notify_all()
+
+            self.in_use.add(conn)
+            self.wait_times.record((time.monotonic() - start_time) * 1000)
+            return conn
     
     def return_connection(self, conn: sqlite3.Connection):
         """Return a connection to the pool."""
-        with self.lock:
-            if conn in self.in_use:
-                self.in_use.remove(conn)
-                self.pool.append(conn)
+        with self.available:
+            if conn not in self.in_use:
+                return
+            self.in_use.remove(conn)
+            if self.closed:
+                self._close_connection(conn)
+                self.available.notify_all()
+                return
+            self.pool.append(conn)
+
+            # Cap idle connections, closing the least recently used ones first
+            while len(self.pool) > self.max_idle:
+                self._close_connection(self.pool.popleft())
+            self.available.notify_all()
     
+    def data_version(self) -> int:
+        """Current ``PRAGMA data_version`` as seen by a dedicated sentinel connection.
+
+        data_version only changes when *another* connection commits, and the sentinel
+        never writes, so any commit to the file (from this or another process) shows up.
+        """
+        with self._sentinel_lock:
+            if self._sentinel is None:
+                self._sentinel = self._create_connection()
+            return self._sentinel.execute("PRAGMA data_version").fetchone()[0]
+
+    def schema_version(self) -> int:
+        """Current ``PRAGMA schema_version``; it changes whenever the schema does."""
+        with self._sentinel_lock:
+            if self._sentinel is None:
+                self._sentinel = self._create_connection()
+            return self._sentinel.execute("PRAGMA schema_version").fetchone()[0]
+
     def close_all(self):
-        """Close all connections in the pool."""
+        """Close idle connections and retire the pool; checked-out ones close when returned.
+
+        Connections other threads hold are never closed under them, so their
+        running statements finish normally.
+        """
+        self.close_idle()
+
+    def close_idle(self):
+        """Close idle connections and retire the pool once in-use ones come back."""
+        with self._sentinel_lock:
+            if self._sentinel is not None:
+                self._sentinel.close()
+                self._sentinel = None
+        with self.available:
+            self.closed = True
+            while self.pool:
+                self._close_connection(self.pool.popleft())
+            self.available.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get statistics for this pool."""
+        with self.lock:
+            checkouts = self._stats["checkouts"]
+            reuse_rate = (self._stats["reused"] / checkouts * 100) if checkouts > 0 else 0
+            return {
+                **self._stats,
+                "db_path": self.db_path,
+                "readonly": self.readonly,
+                "idle": len(self.pool),
+                "in_use": len(self.in_use),
+                "waiting": len(self.waiters),
+                "reuse_rate": f"{reuse_rate:.1f}%",
+                "wait_time": self.wait_times.to_dict(),
+            }
+
+
+def readonly_uri(db_path: str, immutable_patterns=()) -> str:
+    """Build a ``file:`` URI that opens ``db_path`` read-only.
+
+    ``immutable=1`` is added when the file name matches one of ``immutable_patterns``;
+    SQLite then skips all locking and change detection for that file.
+    """
+    path = os.path.abspath(db_path)
+    uri = f"file:{pathname2url(path)}?mode=ro"
+    if any(fnmatch.fnmatch(os.path.basename(path), pattern) for pattern in immutable_patterns):
+        uri += "&immutable=1"
+    return uri
+
+
+class ConnectionPoolRegistry:
+    """Process-wide registry of connection pools keyed by database path and mode.
+
+    The tools, the Streamlit app, fine-tuning and the dashboards all share these
+    pools, so switching between databases keeps warm connections. The number of
+    pools is capped and the least recently used pool is retired first.
+    """
+
+    def __init__(self, max_pools: int = 8):
+        self.max_pools = max_pools
+        self.pools: "OrderedDict[Tuple[str, bool], DatabasePool]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_pool(self, db_path: Optional[str] = None, readonly: bool = False) -> DatabasePool:
+        """Get (or create) the read-write or read-only pool for a database file."""
+        from manuai.performance_config import get_performance_config
+
+        path = os.path.abspath(str(db_path or Config.Path.DATABASE_PATH))
+        key = (path, readonly)
         with self.lock:
-            for conn in self.pool:
-                conn.close()
-            for conn in self.in_use:
-                conn.close()
-            self.pool.clear()
-            self.in_use.clear()
-            self.created_connections = 0
+            pool = self.pools.get(key)
+            if pool is not None:
+                self.pools.move_to_end(key)
+                return pool
+
+            db_config = get_performance_config().database
+            pool = DatabasePool(
+                path,
+                max_connections=db_config.max_connections,
+                timeout=db_config.connection_timeout,
+                readonly=readonly,
+            )
+            self.pools[key] = pool
+
+            if len(self.pools) > self.max_pools:
+                _, evicted = self.pools.popitem(last=False)
+                evicted.close_idle()
+            return pool
+
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Get per-pool statistics keyed by database path and mode."""
+        with self.lock:
+            pools = list(self.pools.items())
+        return {
+            f"{path} ({'ro' if readonly else 'rw'})": pool.get_stats()
+            for (path, readonly), pool in pools
+        }
+
+    def close_all(self):
+        """Close every pooled connection."""
+        with self.lock:
+            for pool in self.pools.values():
+                pool.close_all()
+            self.pools.clear()
+
+
+# Calls whose result changes without the data changing; such statements are never cached
+_NONDETERMINISTIC_PATTERN = re.compile(
+    r"\b(?:random|randomblob|changes|total_changes|last_insert_rowid)\s*\("
+    r"|\bcurrent_(?:timestamp|date|time)\b"
+    r"|'now'"
+    r"|\b(?:date|time|datetime|julianday|unixepoch)\s*\(\s*\)",
+    re.IGNORECASE,
+)
+
+
+def is_cacheable_query(query: str) -> bool:
+    """Whether a statement's result may be cached until the data changes.
+
+    Only reads qualify, and only deterministic ones: ``random()``,
+    ``date('now')`` or ``CURRENT_TIMESTAMP`` give a different answer on the
+    next call although ``PRAGMA data_version`` did not move.
+    """
+    return bool(re.match(r"\s*(SELECT|WITH)\b", query, re.IGNORECASE)) and not _NONDETERMINISTIC_PATTERN.search(query)
+
+
+def normalize_sql(query: str) -> str:
+    """Normalize SQL text for cache keys.
+
+    Whitespace runs outside string literals collapse to one space and trailing
+    semicolons are dropped; literals and identifier case are left untouched.
+    """
+    parts = re.split(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""", query.strip())
+    normalized = "".join(
+        part if index % 2 else re.sub(r"\s+", " ", part) for index, part in enumerate(parts)
+    )
+    return normalized.strip().rstrip(";").strip()
+
+
+def database_identity(db_path: str) -> str:
+    """Identify a database file by absolute path, device and inode.
+
+    A regenerated or replaced file gets a new identity even at the same path.
+    """
+    path = os.path.abspath(db_path)
+    try:
+        stat = os.stat(path)
+        return f"{path}:{stat.st_dev}:{stat.st_ino}"
+    except OSError:
+        return path
+
+
+class DatabaseVersion(NamedTuple):
+    """Version of a database file as seen by the query cache.
+
+    ``data_version`` is cheap and exact within this process. ``file_signature``
+    (mtime and size of the database and its WAL) is comparable across process
+    restarts and is what the on-disk spill store checks.
+    """
+
+    data_version: int
+    file_signature: str
+
+
+def database_file_signature(db_path: str) -> str:
+    """Signature of the database file and its WAL that changes on every commit."""
+    parts = []
+    for path in (db_path, f"{db_path}-wal"):
+        try:
+            stat = os.stat(path)
+            parts.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+        except OSError:
+            parts.append("-")
+    return "/".join(parts)
+
+
+def estimate_result_size(result: List[Tuple]) -> int:
+    """Estimate the in-memory footprint of a result set in bytes."""
+    size = sys.getsizeof(result)
+    for row in result:
+        size += sys.getsizeof(row)
+        for value in row:
+            size += sys.getsizeof(value)
+    return size
+
+
+class ResultSpillStore:
+    """On-disk SQLite store for large cached results.
+
+    Entries survive process restarts and are validated against the database file
+    signature, since ``data_version`` values are only meaningful per connection.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024):
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, file_signature TEXT, created REAL, "
+                "last_access REAL, size INTEGER, payload BLOB)"
+            )
+        return self._conn
+
+    def get(self, key: str, file_signature: str) -> Optional[List[Tuple]]:
+        with self.lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT file_signature, payload FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[0] != file_signature:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            try:
+                result = marshal.loads(row[1])
+            except (EOFError, ValueError, TypeError):
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                conn.commit()
+                return None
+            conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+            return result
+
+    def set(self, key: str, file_signature: str, result: List[Tuple], size: int) -> bool:
+        try:
+            payload = marshal.dumps(result)
+        except ValueError:
+            return False  # values marshal cannot serialize stay uncached
+        with self.lock:
+            conn = self._connection()
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                (key, file_signature, now, now, size, payload),
+            )
+            # Trim least recently accessed entries beyond the byte budget
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            while total > self.max_bytes:
+                oldest = conn.execute(
+                    "SELECT key, size FROM results ORDER BY last_access LIMIT 1"
+                ).fetchone()
+                if oldest is None:
+                    break
+                conn.execute("DELETE FROM results WHERE key = ?", (oldest[0],))
+                total -= oldest[1]
+            conn.commit()
+            return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            count, size = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+            ).fetchone()
+            return {"path": self.path, "entries": count, "bytes": size}
+
+    def clear(self):
+        with self.lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM results")
+            conn.commit()
 
 
 class QueryResultCache:
-    """Cache for database query results to avoid repeated execution."""
+    """Cache for database query results to avoid repeated execution.
+
+    Entries are keyed by (database identity, normalized SQL, parameters) and carry
+    the database version they were read at. A lookup with a different version drops
+    the entry, so results stay valid indefinitely on static databases and are
+    invalidated right after a write. ``ttl`` optionally adds age-based expiry.
+
+    Memory is bounded by an estimated byte budget as well as an entry count; least
+    recently used entries are evicted first. Results larger than
+    ``spill_threshold_bytes`` go to the optional on-disk ``spill_store`` instead.
+    """
     
-    def __init__(self, max_size: int = 1000, ttl: int = 300):
+    def __init__(
+        self,
+        max_size: int = 1000,
+        ttl: Optional[int] = None,
+        max_bytes: int = 64 * 1024 * 1024,
+        spill_threshold_bytes: int = 1024 * 1024,
+        spill_store: Optional[ResultSpillStore] = None,
+    ):
         self.cache = OrderedDict()
         self.max_size = max_size
         self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.spill_threshold_bytes = spill_threshold_bytes
+        self.spill_store = spill_store
+        self.total_bytes = 0
         self.lock = threading.RLock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "spilled": 0,
+        }
     
-    def _generate_key(self, query: str) -> str:
+    def _generate_key(self, query: str, db_identity: str = "", params: Tuple = ()) -> str:
         """Generate cache key for query."""
-        return hashlib.sha256(query.encode()).hexdigest()
+        material = json.dumps([db_identity, normalize_sql(query), list(params)], default=repr)
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def _remove(self, key: str):
+        _, _, _, size = self.cache.pop(key)
+        self.total_bytes -= size
     
-    def get(self, query: str) -> Optional[List[Tuple]]:
+    def get(
+        self, query: str, db_identity: str = "", params: Tuple = (), version: Any = None
+    ) -> Optional[List[Tuple]]:
         """Get cached result for query."""
-        key = self._generate_key(query)
+        key = self._generate_key(query, db_identity, params)
         
         with self.lock:
-            if key not in self.cache:
-                return None
-            
-            timestamp, result = self.cache[key]
-            
-            # Check if expired
-            if time.time() - timestamp > self.ttl:
-                del self.cache[key]
-                return None
-            
-            # Move to end (most recently used)
-            self.cache.move_to_end(key)
-            return result
+            if key in self.cache:
+                timestamp, cached_version, result, _ = self.cache[key]
+
+                # Drop entries read at an older database version or past their TTL
+                expired = self.ttl is not None and time.time() - timestamp > self.ttl
+                if not expired and cached_version == version:
+                    # Move to end (most recently used)
+                    self.cache.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return result
+                self._remove(key)
+                self._stats["invalidations"] += 1
+
+        if self.spill_store is not None and isinstance(version, DatabaseVersion):
+            result = self.spill_store.get(key, version.file_signature)
+            if result is not None:
+                with self.lock:
+                    self._stats["disk_hits"] += 1
+                return result
+
+        with self.lock:
+            self._stats["misses"] += 1
+        return None
     
-    def set(self, query: str, result: List[Tuple]):
+    def set(
+        self,
+        query: str,
+        result: List[Tuple],
+        db_identity: str = "",
+        params: Tuple = (),
+        version: Any = None,
+    ):
         """Cache query result."""
-        key = self._generate_key(query)
+        key = self._generate_key(query, db_identity, params)
+        size = estimate_result_size(result)
+
+        # Large results go to disk so they neither crowd out small ones nor get lost
+        if size > self.spill_threshold_bytes or size > self.max_bytes:
+            if self.spill_store is not None and isinstance(version, DatabaseVersion):
+                if self.spill_store.set(key, version.file_signature, result, size):
+                    with self.lock:
+                        self._stats["spilled"] += 1
+            return
         
         with self.lock:
-            self.cache[key] = (time.time(), result)
-            self.cache.move_to_end(key)
+            if key in self.cache:
+                self._remove(key)
+            self.cache[key] = (time.time(), version, result, size)
+            self.total_bytes += size
             
-            # Trim if needed
-            if len(self.cache) > self.max_size:
-                self.cache.popitem(last=False)
+            # Evict least recently used entries until both budgets are met
+            while len(self.cache) > self.max_size or self.total_bytes > self.max_bytes:
+                oldest = next(iter(self.cache))
+                self._remove(oldest)
+                self._stats["evictions"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get memory use and hit ratios of the cache."""
+        with self.lock:
+            lookups = self._stats["memory_hits"] + self._stats["disk_hits"] + self._stats["misses"]
+            hits = self._stats["memory_hits"] + self._stats["disk_hits"]
+            stats = {
+                **self._stats,
+                "entries": len(self.cache),
+                "memory_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "memory_utilization": f"{self.total_bytes / self.max_bytes * 100:.1f}%",
+                "hit_ratio": f"{hits / lookups * 100:.1f}%" if lookups else "0.0%",
+            }
+        if self.spill_store is not None:
+            stats["disk"] = self.spill_store.get_stats()
+        return stats
     
     def clear(self):
         """Clear all cached results."""
         with self.lock:
             self.cache.clear()
+            self.total_bytes = 0
+        if self.spill_store is not None:
+            self.spill_store.clear()
 
 
-class SchemaCache:
-    """Cache for database schema information."""
-    
-    def __init__(self, ttl: int = 3600):
-        self.cache = {}
-        self.ttl = ttl
-        self.lock = threading.RLock()
-    
-    def get_table_schema(self, table_name: str) -> Optional[List[Tuple]]:
-        """Get cached table schema."""
-        with self.lock:
-            if table_name not in self.cache:
-                return None
-            
-            timestamp, schema = self.cache[table_name]
-            
-            if time.time() - timestamp > self.ttl:
-                del self.cache[table_name]
-                return None
-            
-            return schema
-    
-    def set_table_schema(self, table_name: str, schema: List[Tuple]):
-        """Cache table schema."""
-        with self.lock:
-            self.cache[table_name] = (time.time(), schema)
-    
-    def get_all_tables(self) -> Optional[List[str]]:
-        """Get cached list of all tables."""
+class QueryBudget:
+    """Wall-time, VM-step, row and size limits for the statements of one tool call.
+
+    The limits are enforced from SQLite's progress handler, which runs every
+    ``check_interval`` virtual machine instructions, so a runaway statement is
+    stopped inside SQLite instead of blocking a worker thread. ``cancel`` may
+    be called from another thread and interrupts the running statement.
+    The wall-time clock runs from creation; work that is queued first calls
+    ``start`` when it begins, so time spent waiting for a worker is not charged.
+    """
+
+    def __init__(
+        self,
+        timeout: Optional[float] = None,
+        max_rows: Optional[int] = None,
+        max_vm_steps: Optional[int] = None,
+        check_interval: int = 1000,
+        max_bytes: Optional[int] = None,
+    ):
+        self.timeout = timeout
+        self.deadline = time.perf_counter() + timeout if timeout is not None else None
+        self.started = threading.Event()
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_vm_steps = max_vm_steps
+        self.check_interval = check_interval
+        self.vm_steps = 0
+        self.abort_reason: Optional[str] = None
+        self.cancelled = False
+        self._connection: Optional[sqlite3.Connection] = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, timeout: Optional[float] = None) -> "QueryBudget":
+        """Build a budget from DatabaseOptimizationConfig.
+
+        Args:
+            timeout: Wall time in seconds (defaults to statement_timeout, then
+                LLMOptimizationConfig.tool_call_timeout)
+        """
+        from manuai.performance_config import get_performance_config
+
+        config = get_performance_config()
+        if timeout is None:
+            timeout = config.database.statement_timeout or config.llm.tool_call_timeout
+        return cls(
+            timeout=timeout,
+            max_rows=config.database.statement_max_rows,
+            max_vm_steps=config.database.statement_max_vm_steps,
+            check_interval=config.database.progress_check_interval,
+            max_bytes=config.database.statement_max_result_bytes,
+        )
+
+    def start(self):
+        """Restart the wall-time clock now, when the work this budget bounds begins."""
+        if self.timeout is not None:
+            self.deadline = time.perf_counter() + self.timeout
+        self.started.set()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the wall-time budget runs out (None without a timeout)."""
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.perf_counter(), 0.0)
+
+    def _progress(self) -> int:
+        self.vm_steps += self.check_interval
+        if self.cancelled:
+            self.abort_reason = "cancelled"
+        elif self.deadline is not None and time.perf_counter() > self.deadline:
+            self.abort_reason = "time budget exceeded"
+        elif self.max_vm_steps is not None and self.vm_steps > self.max_vm_steps:
+            self.abort_reason = f"step budget of {self.max_vm_steps:,} VM instructions exceeded"
+        # A non-zero return makes SQLite abort the statement with "interrupted"
+        return 1 if self.abort_reason else 0
+
+    @contextmanager
+    def attach(self, conn: sqlite3.Connection):
+        """Enforce the budget on statements run on ``conn`` inside the block."""
+        conn.set_progress_handler(self._progress, self.check_interval)
         with self.lock:
-            if "_tables" not in self.cache:
-                return None
-            
-            timestamp, tables = self.cache["_tables"]
-            
-            if time.time() - timestamp > self.ttl:
-                del self.cache["_tables"]
-                return None
-            
-            return tables
-    
-    def set_all_tables(self, tables: List[str]):
-        """Cache list of all tables."""
+            self._connection = conn
+        try:
+            yield
+        finally:
+            with self.lock:
+                self._connection = None
+            conn.set_progress_handler(None, 0)
+
+    def cancel(self):
+        """Abort the running statement (safe to call from any thread)."""
+        self.cancelled = True
         with self.lock:
-            self.cache["_tables"] = (time.time(), tables)
+            if self._connection is not None:
+                self._connection.interrupt()
+
+
+class BoundedResult(NamedTuple):
+    """Rows of a statement run under a QueryBudget.
+
+    ``truncated`` is set when more rows than ``max_rows`` (or more than
+    ``max_bytes`` of row text) were available. ``aborted`` holds the reason
+    when the statement was stopped early; the rows fetched up to that point
+    are kept.
+    """
+
+    rows: List[Tuple]
+    columns: List[str]
+    truncated: bool
+    aborted: Optional[str]
+    elapsed: float
+
+
+def row_text_size(row: Tuple) -> int:
+    """Approximate size of a row rendered as one line of text (in bytes)."""
+    return sum(len(value) if isinstance(value, (str, bytes)) else 8 for value in row) + len(row)
+
+
+def run_bounded_query(
+    cursor: sqlite3.Cursor, query: str, params: Tuple = (), budget: Optional[QueryBudget] = None
+) -> BoundedResult:
+    """Execute ``query`` on ``cursor`` and fetch rows incrementally within ``budget``.
+
+    Rows are pulled with ``fetchmany``, so at most one batch beyond the row and
+    byte budgets is ever materialized.
+    """
+    budget = budget or QueryBudget()
+    if budget.abort_reason:
+        return BoundedResult([], [], False, budget.abort_reason, 0.0)
+
+    rows: List[Tuple] = []
+    columns: List[str] = []
+    truncated = False
+    fetched_bytes = 0
+    start_time = time.perf_counter()
+    with budget.attach(cursor.connection):
+        try:
+            cursor.execute(query, params)
+            columns = [column[0] for column in cursor.description or ()]
+            while not truncated:
+                batch_size = 64
+                if budget.max_rows is not None:
+                    # One extra row tells a complete result from a truncated one
+                    batch_size = min(batch_size, budget.max_rows + 1 - len(rows))
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                for row in batch:
+                    fetched_bytes += row_text_size(row)
+                    if (budget.max_rows is not None and len(rows) >= budget.max_rows) or (
+                        budget.max_bytes is not None and fetched_bytes > budget.max_bytes and rows
+                    ):
+                        truncated = True
+                        break
+                    rows.append(row)
+        except sqlite3.OperationalError as e:
+            if not budget.abort_reason:
+                if "interrupt" not in str(e):
+                    raise
+                budget.abort_reason = "cancelled"
+    return BoundedResult(rows, columns, truncated, budget.abort_reason, time.perf_counter() - start_time)
 
 
 class DatabaseOptimizer:
     """Main database optimizer with connection pooling and caching."""
     
     def __init__(self):
-        self.pool = DatabasePool()
-        self.query_cache = QueryResultCache()
-        self.schema_cache = SchemaCache()
-        self._stats = {
-            "cache_hits": 0,
-            "cache_misses": 0,
-            "queries_executed": 0,
-            "avg_query_time": 0.0
-        }
+        from manuai.index_advisor import get_workload_log
+        from manuai.performance_config import get_performance_config
+
+        db_config = get_performance_config().database
+        spill_store = None
+        if db_config.query_cache_spill_path:
+            spill_store = ResultSpillStore(
+                Config.Path.APP_HOME / db_config.query_cache_spill_path,
+                max_bytes=db_config.query_cache_spill_max_bytes,
+            )
+        self.query_cache = QueryResultCache(
+            max_size=db_config.query_cache_size,
+            ttl=db_config.query_cache_ttl,
+            max_bytes=db_config.query_cache_max_bytes,
+            spill_threshold_bytes=db_config.query_cache_spill_threshold_bytes,
+            spill_store=spill_store,
+        )
+        self.metrics = get_metrics()
+        self.workload = get_workload_log()
+        # Column names of cached results, so cache hits can still print a header
+        self.result_columns: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
     
+    @property
+    def pool(self) -> DatabasePool:
+        """Read-only pool for the default database."""
+        return get_pool(readonly=True)
+
     @contextmanager
-    def get_cursor(self, readonly: bool = True):
+    def get_cursor(self, readonly: bool = True, db_path: Optional[str] = None):
         """Get optimized database cursor with connection pooling."""
-        conn = self.pool.get_connection()
-        try:
-            cursor = conn.cursor()
+        with pooled_cursor(db_path, readonly=readonly) as cursor:
             yield cursor
-            if not readonly:
-                conn.commit()
-        except Exception:
-            if not readonly:
-                conn.rollback()
-            raise
-        finally:
-            cursor.close()
-            self.pool.return_connection(conn)
     
-    def execute_cached_query(self, query: str) -> List[Tuple]:
-        """Execute query with caching."""
+    def execute_cached_query(
+        self, query: str, params: Tuple = (), db_path: Optional[str] = None
+    ) -> List[Tuple]:
+        """Execute a read-only query with caching.
+
+        Results are cached per database file and invalidated as soon as the
+        database's ``PRAGMA data_version`` changes.
+        """
+        pool = get_pool(db_path, readonly=True)
+        identity = database_identity(pool.db_path)
+        version = DatabaseVersion(pool.data_version(), database_file_signature(pool.db_path))
+
         # Try cache first
-        cached_result = self.query_cache.get(query)
+        cached_result = self.query_cache.get(query, identity, params, version)
         if cached_result is not None:
-            self._stats["cache_hits"] += 1
+            self.metrics.increment("cache_hits")
             return cached_result
         
         # Execute query
-        start_time = time.time()
-        with self.get_cursor() as cursor:
-            cursor.execute(query)
+        start_time = time.perf_counter()
+        with self.get_cursor(db_path=db_path) as cursor:
+            cursor.execute(query, params)
             result = cursor.fetchall()
         
-        execution_time = time.time() - start_time
+        execution_time = time.perf_counter() - start_time
         
         # Update stats
-        self._stats["cache_misses"] += 1
-        self._stats["queries_executed"] += 1
-        self._stats["avg_query_time"] = (
-            (self._stats["avg_query_time"] * (self._stats["queries_executed"] - 1) + execution_time) 
-            / self._stats["queries_executed"]
-        )
+        self.metrics.increment("cache_misses")
+        self.metrics.record_query(pool.db_path, execution_time, query)
+        if not params:
+            self.workload.record(pool.db_path, query, execution_time)
         
-        # Cache result (only cache SELECT queries)
-        if query.strip().upper().startswith("SELECT"):
-            self.query_cache.set(query, result)
+        # Cache result (only deterministic reads)
+        if is_cacheable_query(query):
+            self.query_cache.set(query, result, identity, params, version)
         
         return result
     
-    def get_table_schema_cached(self, table_name: str) -> List[Tuple]:
-        """Get table schema with caching."""
-        cached_schema = self.schema_cache.get_table_schema(table_name)
-        if cached_schema is not None:
-            return cached_schema
-        
-        with self.get_cursor() as cursor:
-            cursor.execute(f"PRAGMA table_info('{table_name}')")
-            schema = cursor.fetchall()
-        
-        self.schema_cache.set_table_schema(table_name, schema)
-        return schema
+    def execute_bounded_query(
+        self,
+        query: str,
+        params: Tuple = (),
+        db_path: Optional[str] = None,
+        budget: Optional[QueryBudget] = None,
+    ) -> BoundedResult:
+        """Execute a read-only query under a time, VM-step and row budget.
+
+        Complete results are cached like ``execute_cached_query``; truncated or
+        aborted ones are not.
+        """
+        budget = budget or QueryBudget.from_config()
+        pool = get_pool(db_path, readonly=True)
+        identity = database_identity(pool.db_path)
+        version = DatabaseVersion(pool.data_version(), database_file_signature(pool.db_path))
+
+        cached_result = self.query_cache.get(query, identity, params, version)
+        if cached_result is not None:
+            self.metrics.increment("cache_hits")
+            rows = []
+            size = 0
+            for row in cached_result:
+                size += row_text_size(row)
+                if (budget.max_rows is not None and len(rows) >= budget.max_rows) or (
+                    budget.max_bytes is not None and size > budget.max_bytes and rows
+                ):
+                    break
+                rows.append(row)
+            columns = self._result_columns(query, identity, db_path)
+            return BoundedResult(rows, columns, len(rows) < len(cached_result), None, 0.0)
+
+        with self.get_cursor(db_path=db_path) as cursor:
+            result = run_bounded_query(cursor, query, params, budget)
+        with self.lock:
+            self.result_columns[(identity, normalize_sql(query))] = result.columns
+            self.result_columns.move_to_end((identity, normalize_sql(query)))
+            while len(self.result_columns) > self.query_cache.max_size:
+                self.result_columns.popitem(last=False)
+
+        self.metrics.increment("cache_misses")
+        self.metrics.record_query(pool.db_path, result.elapsed, query)
+        if not params:
+            self.workload.record(pool.db_path, query, result.elapsed)
+        if result.aborted:
+            self.metrics.increment("queries_aborted")
+        elif result.truncated:
+            self.metrics.increment("results_truncated")
+        elif is_cacheable_query(query):
+            self.query_cache.set(query, result.rows, identity, params, version)
+        return result
+
+    def _result_columns(self, query: str, identity: str, db_path: Optional[str]) -> List[str]:
+        """Column names of a cached query, compiled again only if they were not kept."""
+        key = (identity, normalize_sql(query))
+        with self.lock:
+            columns = self.result_columns.get(key)
+        if columns is not None:
+            return columns
+        try:
+            with self.get_cursor(db_path=db_path) as cursor:
+                cursor.execute(f"SELECT * FROM ({normalize_sql(query)}) LIMIT 0")
+                columns = [column[0] for column in cursor.description or ()]
+        except sqlite3.Error:
+            return []
+        with self.lock:
+            self.result_columns[key] = columns
+        return columns
+
+    def get_table_schema_cached(self, table_name: str, db_path: Optional[str] = None) -> List[Tuple]:
+        """Get table schema from the schema catalog, as PRAGMA table_info rows.
+
+        Returns an empty list for an unknown table, like PRAGMA table_info.
+        """
+        from manuai.schema_catalog import get_schema_catalog
+
+        table = get_schema_catalog(db_path).table(table_name)
+        if table is None:
+            return []
+        return [
+            (cid, column.name, column.type, int(column.not_null), column.default, column.primary_key)
+            for cid, column in enumerate(table.columns)
+        ]
     
-    def get_all_tables_cached(self) -> List[str]:
-        """Get all tables with caching."""
-        cached_tables = self.schema_cache.get_all_tables()
-        if cached_tables is not None:
-            return cached_tables
-        
-        with self.get_cursor() as cursor:
-            cursor.execute(
-                "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
-            )
-            tables = [row[0] for row in cursor.fetchall()]
-        
-        self.schema_cache.set_all_tables(tables)
-        return tables
+    def get_all_tables_cached(self, db_path: Optional[str] = None) -> List[str]:
+        """Get all tables from the schema catalog."""
+        from manuai.schema_catalog import get_schema_catalog
+
+        return list(get_schema_catalog(db_path).table_names)
     
     def get_stats(self) -> Dict[str, Any]:
-        """Get performance statistics."""
-        cache_total = self._stats["cache_hits"] + self._stats["cache_misses"]
-        hit_rate = (self._stats["cache_hits"] / cache_total * 100) if cache_total > 0 else 0
+        """Get performance statistics.
+
+        Latencies are in seconds; ``latency`` covers every executed (uncached)
+        query and the ``*_latency`` breakdowns split it per database, per tool
+        and per normalized query fingerprint. ``model_calls`` covers prompt
+        prefix reuse and time to first token of agent model calls.
+        """
+        metrics = self.metrics.snapshot()
+        counters = metrics["counters"]
+        cache_hits = counters.get("cache_hits", 0)
+        cache_total = cache_hits + counters.get("cache_misses", 0)
+        hit_rate = (cache_hits / cache_total * 100) if cache_total > 0 else 0
+        latency = metrics["queries"]
+        prompt_tokens = counters.get("prompt_tokens", 0)
+        prompt_reused = counters.get("prompt_tokens_reused", 0)
         
         return {
-            **self._stats,
+            "cache_hits": cache_hits,
+            "cache_misses": counters.get("cache_misses", 0),
+            "queries_aborted": counters.get("queries_aborted", 0),
+            "results_truncated": counters.get("results_truncated", 0),
+            "queries_executed": latency["count"],
+            "avg_query_time": latency["mean"],
+            "latency": latency,
+            "database_latency": metrics["by_database"],
+            "tool_latency": metrics["by_tool"],
+            "tool_query_latency": metrics["queries_by_tool"],
+            "fingerprint_latency": metrics["by_fingerprint"],
+            "model_calls": {
+                "calls": counters.get("model_calls", 0),
+                "prompt_tokens": prompt_tokens,
+                "prompt_tokens_reused": prompt_reused,
+                "prompt_tokens_evaluated": counters.get("prompt_tokens_evaluated", 0),
+                "prefix_reuse": f"{prompt_reused / prompt_tokens * 100 if prompt_tokens else 0:.1f}%",
+                "time_to_first_token": metrics["time_to_first_token"],
+            },
             "cache_hit_rate": f"{hit_rate:.1f}%",
-            "total_cache_requests": cache_total
+            "total_cache_requests": cache_total,
+            "query_cache": self.query_cache.get_stats(),
+            "pools": get_pool_registry().get_stats(),
         }
     
     def clear_caches(self):
         """Clear all caches."""
+        from manuai.schema_catalog import get_catalog_registry
+
         self.query_cache.clear()
-        self.schema_cache.cache.clear()
-    
-    def __del__(self):
-        """Cleanup on deletion."""
-        self.pool.close_all()
+        get_catalog_registry().clear()
+
+
+# Global connection pool registry
+_pool_registry = None
+_pool_registry_lock = threading.Lock()
+
+
+def get_pool_registry() -> ConnectionPoolRegistry:
+    """Get global connection pool registry."""
+    global _pool_registry
+    if _pool_registry is None:
+        with _pool_registry_lock:
+            if _pool_registry is None:
+                _pool_registry = ConnectionPoolRegistry()
+    return _pool_registry
+
+
+def get_pool(db_path: Optional[str] = None, readonly: bool = False) -> DatabasePool:
+    """Get the shared connection pool for a database (default database if omitted)."""
+    return get_pool_registry().get_pool(db_path, readonly=readonly)
+
+
+@contextmanager
+def pooled_cursor(db_path: Optional[str] = None, readonly: bool = True):
+    """Check out a pooled connection for ``db_path`` and yield a cursor.
+
+    ``readonly`` cursors come from the read-only (``mode=ro``, mmap) pool, so any
+    write is rejected by SQLite. Writes on read-write cursors are committed; any
+    transaction left open is rolled back so the connection goes back clean.
+    """
+    pool = get_pool(db_path, readonly=readonly)
+    conn = pool.get_connection()
+    cursor = None
+    try:
+        cursor = conn.cursor()
+        yield cursor
+        if not readonly and conn.in_transaction:
+            conn.commit()
+    finally:
+        if cursor is not None:
+            cursor.close()
+        if conn.in_transaction:
+            conn.rollback()
+        pool.return_connection(conn)
 
 
 # Global optimizer instance
@@ -315,9 +1089,19 @@ def with_optimized_cursor(readonly: bool = True):
     return get_optimizer().get_cursor(readonly=readonly)
 
 
-def cached_query(query: str) -> List[Tuple]:
+def cached_query(query: str, params: Tuple = (), db_path: Optional[str] = None) -> List[Tuple]:
     """Execute query with caching."""
-    return get_optimizer().execute_cached_query(query)
+    return get_optimizer().execute_cached_query(query, params, db_path=db_path)
+
+
+def bounded_query(
+    query: str,
+    params: Tuple = (),
+    db_path: Optional[str] = None,
+    budget: Optional[QueryBudget] = None,
+) -> BoundedResult:
+    """Execute query with caching under a time and row budget."""
+    return get_optimizer().execute_bounded_query(query, params, db_path=db_path, budget=budget)
 
 
 def performance_stats() -> Dict[str, Any]:
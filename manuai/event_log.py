@@ -0,0 +1,268 @@
+"""
+Append-only event log for ManuAI.
+
+This module provides:
+1. A JSON Lines event log written by a background flusher in batches
+2. Configurable fsync policy, compaction and age-based retention
+3. Incremental readers that only parse events appended since their last read
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+FSYNC_POLICIES = ("always", "interval", "never")
+
+
+class _FileLock:
+    """Advisory lock shared by every process writing the same log (no-op without fcntl)."""
+
+    def __init__(self, path: str):
+        self.path = f"{path}.lock"
+        self.handle = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self.handle = open(self.path, "a")
+            fcntl.flock(self.handle, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.handle is not None:
+            fcntl.flock(self.handle, fcntl.LOCK_UN)
+            self.handle.close()
+            self.handle = None
+
+
+class EventLogReader:
+    """Reads a JSON Lines log incrementally.
+
+    The reader remembers the byte offset it reached; each ``read_new`` call only
+    parses complete lines appended since. When the file was compacted or
+    replaced, ``read_new`` starts over and reports the reset.
+    """
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        self.offset = 0
+        self.file_id: Optional[Tuple[int, int]] = None
+
+    def read_new(self) -> Tuple[List[Dict[str, Any]], bool]:
+        """Return the events appended since the last call and whether the log was reset."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            reset = self.offset > 0
+            self.offset, self.file_id = 0, None
+            return [], reset
+
+        file_id = (stat.st_dev, stat.st_ino)
+        reset = self.file_id is not None and (file_id != self.file_id or stat.st_size < self.offset)
+        if reset or self.file_id is None:
+            self.offset = 0
+        self.file_id = file_id
+        if stat.st_size == self.offset:
+            return [], reset
+
+        events = []
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read()
+        # A trailing line without newline is still being written; pick it up next time
+        complete = data[: data.rfind(b"\n") + 1]
+        self.offset += len(complete)
+        for line in complete.splitlines():
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        return events, reset
+
+
+class EventLog:
+    """Append-only JSON Lines log written by a background flusher.
+
+    ``append`` only queues the event. A daemon thread writes queued events in
+    batches (every ``flush_interval`` seconds or ``batch_size`` events) with one
+    ``write`` in append mode, so concurrent processes never clobber each other.
+    ``fsync`` is ``"always"`` (after every batch), ``"interval"`` (at most every
+    ``fsync_interval`` seconds) or ``"never"``. Compaction rewrites the file
+    without events older than ``retention_days``.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_interval: float = 1.0,
+        batch_size: int = 100,
+        fsync: str = "interval",
+        fsync_interval: float = 5.0,
+        retention_days: Optional[int] = 7,
+        compaction_interval: Optional[float] = 3600.0,
+    ):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, got {fsync!r}")
+        self.path = str(path)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.retention_days = retention_days
+        self.compaction_interval = compaction_interval
+
+        self.pending: List[Dict[str, Any]] = []
+        self.condition = threading.Condition()
+        self.write_lock = threading.Lock()
+        self._file_lock = _FileLock(self.path)
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = False
+        self._last_fsync = time.monotonic()
+        self._last_compaction = time.monotonic()
+        self._stats = {"appended": 0, "flushes": 0, "fsyncs": 0, "compactions": 0, "expired": 0}
+
+    def append(self, event: Dict[str, Any]) -> None:
+        """Queue an event for the background flusher."""
+        with self.condition:
+            self.pending.append(event)
+            self._stats["appended"] += 1
+            if self._flusher is None:
+                self._start_flusher()
+            if len(self.pending) >= self.batch_size:
+                self.condition.notify()
+
+    def _start_flusher(self) -> None:
+        self._flusher = threading.Thread(
+            target=self._run, name="manuai-event-log", daemon=True
+        )
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def _run(self) -> None:
+        while True:
+            with self.condition:
+                if not self._closed and len(self.pending) < self.batch_size:
+                    self.condition.wait(self.flush_interval)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+                if (
+                    self.compaction_interval is not None
+                    and time.monotonic() - self._last_compaction >= self.compaction_interval
+                ):
+                    self.compact()
+            except OSError as e:
+                print(f"Error writing event log {self.path}: {e}")
+
+    def flush(self) -> None:
+        """Write all queued events now."""
+        with self.write_lock:
+            with self.condition:
+                batch, self.pending = self.pending, []
+            if not batch:
+                return
+
+            data = "".join(json.dumps(event, default=str) + "\n" for event in batch)
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with self._file_lock:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(data)
+                    f.flush()
+                    now = time.monotonic()
+                    if self.fsync == "always" or (
+                        self.fsync == "interval" and now - self._last_fsync >= self.fsync_interval
+                    ):
+                        os.fsync(f.fileno())
+                        self._last_fsync = now
+                        self._stats["fsyncs"] += 1
+            self._stats["flushes"] += 1
+
+    def seed(self, events: List[Dict[str, Any]]) -> bool:
+        """Write ``events`` as the initial content of a log that has no events yet.
+
+        Returns:
+            bool: True if the log was written, False if it already held events
+        """
+        with self.write_lock, self._file_lock:
+            if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+                return False
+            temp_path = f"{self.path}.seed"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(event, default=str) + "\n" for event in events)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        return True
+
+    def compact(self, retention_days: Optional[int] = None) -> int:
+        """Rewrite the log without events older than the retention period.
+
+        Args:
+            retention_days: Days of events to keep (defaults to the log's setting)
+
+        Returns:
+            int: Number of events dropped
+        """
+        retention_days = self.retention_days if retention_days is None else retention_days
+        self._last_compaction = time.monotonic()
+        if retention_days is None or not os.path.exists(self.path):
+            return 0
+
+        cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat()
+        with self.write_lock, self._file_lock:
+            kept, dropped = [], 0
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        continue
+                    try:
+                        timestamp = json.loads(line).get("timestamp", "")
+                    except json.JSONDecodeError:
+                        dropped += 1
+                        continue
+                    if timestamp and timestamp < cutoff:
+                        dropped += 1
+                    else:
+                        kept.append(line)
+            if not dropped:
+                return 0
+
+            temp_path = f"{self.path}.compact"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.writelines(kept)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+
+        self._stats["compactions"] += 1
+        self._stats["expired"] += dropped
+        return dropped
+
+    def close(self) -> None:
+        """Stop the flusher and write what is still queued."""
+        with self.condition:
+            if self._closed:
+                return
+            self._closed = True
+            self.condition.notify_all()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+        try:
+            self.flush()
+        except OSError as e:
+            print(f"Error writing event log {self.path}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get writer statistics."""
+        with self.condition:
+            return {**self._stats, "pending": len(self.pending), "fsync": self.fsync}
@@ -0,0 +1,433 @@
+"""
+Index advisor for ManuAI.
+
+This module provides:
+1. A workload log of the SELECTs actually executed (agent tools, BI engine)
+2. Candidate indexes derived from each query's equality, range, join and
+   ORDER BY / GROUP BY columns on the tables ``EXPLAIN QUERY PLAN`` scans
+3. Measurement of every candidate on a scratch copy of the database, ranked
+   by the workload time it saves
+"""
+
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
+
+from manuai.database_optimizer import (QueryBudget, get_pool, pooled_cursor,
+                                       readonly_uri, run_bounded_query)
+from manuai.metrics import query_fingerprint
+from manuai.performance_config import get_performance_config
+from manuai.schema_catalog import (SchemaCatalog, get_schema_catalog,
+                                   quote_identifier)
+
+_SELECT_PATTERN = re.compile(r"\s*(SELECT|WITH)\b", re.IGNORECASE)
+_LITERAL_PATTERN = re.compile(r"'(?:[^']|'')*'")
+_CLAUSE_KEYWORDS = (
+    "ON|WHERE|JOIN|INNER|LEFT|RIGHT|FULL|CROSS|NATURAL|OUTER|GROUP|ORDER|LIMIT|HAVING|UNION|"
+    "USING|WINDOW|EXCEPT|INTERSECT|AS"
+)
+_TABLE_REF_PATTERN = re.compile(
+    rf'\b(?:FROM|JOIN)\s+("[^"]+"|\w+)(?:\s+(?:AS\s+)?(?!(?:{_CLAUSE_KEYWORDS})\b)(\w+))?', re.IGNORECASE
+)
+_COMPARISON_PATTERN = re.compile(
+    r"(?:\b(\w+)\.)?\b(\w+)\s*(==|=|<=|>=|<>|!=|<|>|\bIN\b|\bBETWEEN\b)", re.IGNORECASE
+)
+_JOIN_PATTERN = re.compile(r"\b(\w+)\.(\w+)\s*==?\s*(\w+)\.(\w+)")
+_ORDERING_PATTERN = re.compile(
+    r"\b(?:ORDER|GROUP)\s+BY\s+(.+?)(?=\bLIMIT\b|\bHAVING\b|\bORDER\b|\bWINDOW\b|\)|$)", re.IGNORECASE | re.DOTALL
+)
+_ORDERING_TERM_PATTERN = re.compile(r"^(?:(\w+)\.)?(\w+)(?:\s+(?:ASC|DESC))?$", re.IGNORECASE)
+
+
+class WorkloadQuery(NamedTuple):
+    """A query of the workload log, aggregated by fingerprint."""
+
+    db_path: str
+    sql: str  # latest statement with this fingerprint
+    fingerprint: str
+    executions: int
+    total_seconds: float
+
+
+class WorkloadLog:
+    """Executed SELECT statements per database, aggregated by query fingerprint.
+
+    Only executions count: cached results cost nothing, so an index cannot
+    save time on them. The least recently executed fingerprints are dropped
+    beyond ``max_size``.
+    """
+
+    def __init__(self, max_size: int = 500):
+        """Initialize the workload log.
+
+        Args:
+            max_size: Maximum number of fingerprints kept
+        """
+        self.max_size = max_size
+        self.entries: OrderedDict = OrderedDict()  # (db_path, fingerprint) -> [sql, executions, seconds]
+        self.lock = threading.Lock()
+
+    def record(self, db_path: str, query: str, seconds: float):
+        """Record one execution of a query."""
+        if not _SELECT_PATTERN.match(query):
+            return
+        key = (os.path.abspath(db_path), query_fingerprint(query))
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = [query, 0, 0.0]
+            entry[0] = query
+            entry[1] += 1
+            entry[2] += seconds
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def queries(self, db_path: Optional[str] = None) -> List[WorkloadQuery]:
+        """Logged queries, most total time first (of one database if given)."""
+        path = os.path.abspath(db_path) if db_path is not None else None
+        with self.lock:
+            queries = [
+                WorkloadQuery(key[0], sql, key[1], executions, seconds)
+                for key, (sql, executions, seconds) in self.entries.items()
+                if path is None or key[0] == path
+            ]
+        return sorted(queries, key=lambda query: query.total_seconds, reverse=True)
+
+    def databases(self) -> List[str]:
+        """Databases with logged queries."""
+        with self.lock:
+            return sorted({key[0] for key in self.entries})
+
+    def clear(self):
+        """Drop the logged workload."""
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get workload log statistics."""
+        with self.lock:
+            return {
+                "fingerprints": len(self.entries),
+                "executions": sum(entry[1] for entry in self.entries.values()),
+                "max_size": self.max_size,
+            }
+
+
+class QueryShape(NamedTuple):
+    """Tables and indexable columns of a query."""
+
+    tables: Dict[str, str]  # lowercase name or alias -> table
+    equality: Dict[str, List[str]]  # table -> columns compared with = / IN, or join keys
+    ranges: Dict[str, List[str]]  # table -> columns compared with < > BETWEEN
+    ordering: Dict[str, List[str]]  # table -> ORDER BY / GROUP BY columns
+
+
+def parse_query(query: str, catalog: SchemaCatalog) -> QueryShape:
+    """Find the tables of a query and the columns its predicates, joins and ordering use.
+
+    Column references are matched against the schema catalog, so anything
+    that is not a real column of a table the query reads is ignored.
+    """
+    sql = _LITERAL_PATTERN.sub("?", query)
+    tables: Dict[str, str] = {}
+    for name, alias in _TABLE_REF_PATTERN.findall(sql):
+        table = catalog.resolve(name)
+        if table is not None:
+            tables[table.lower()] = table
+            if alias:
+                tables[alias.lower()] = table
+    columns = {table: {c.name.lower(): c.name for c in catalog.tables[table].columns} for table in set(tables.values())}
+
+    def resolve(qualifier: Optional[str], column: str) -> Optional[Tuple[str, str]]:
+        if qualifier:
+            table = tables.get(qualifier.lower())
+            matches = [table] if table is not None and column.lower() in columns[table] else []
+        else:
+            matches = [table for table in columns if column.lower() in columns[table]]
+        if len(matches) != 1:
+            return None
+        return matches[0], columns[matches[0]][column.lower()]
+
+    equality: Dict[str, List[str]] = {}
+    ranges: Dict[str, List[str]] = {}
+    ordering: Dict[str, List[str]] = {}
+
+    def add(target: Dict[str, List[str]], resolved: Optional[Tuple[str, str]]):
+        if resolved is not None and resolved[1] not in target.setdefault(resolved[0], []):
+            target[resolved[0]].append(resolved[1])
+
+    for left_qualifier, left, right_qualifier, right in _JOIN_PATTERN.findall(sql):
+        add(equality, resolve(left_qualifier, left))
+        add(equality, resolve(right_qualifier, right))
+    for qualifier, column, operator in _COMPARISON_PATTERN.findall(sql):
+        operator = operator.upper()
+        if operator in ("=", "==", "IN"):
+            add(equality, resolve(qualifier, column))
+        elif operator not in ("<>", "!="):
+            add(ranges, resolve(qualifier, column))
+    for clause in _ORDERING_PATTERN.findall(sql):
+        for term in clause.split(","):
+            match = _ORDERING_TERM_PATTERN.match(term.strip())
+            if match:
+                add(ordering, resolve(match.group(1), match.group(2)))
+    return QueryShape(tables, equality, ranges, ordering)
+
+
+def scanned_tables(plan: List[Tuple], shape: QueryShape) -> Set[str]:
+    """Tables an ``EXPLAIN QUERY PLAN`` result reads with a full scan."""
+    scanned = set()
+    for row in plan:
+        detail = str(row[-1])
+        if detail.startswith("SCAN "):
+            table = shape.tables.get(detail.split()[1].strip('"').lower())
+            if table is not None:
+                scanned.add(table)
+    return scanned
+
+
+class IndexCandidate(NamedTuple):
+    """An index that might speed up the workload."""
+
+    table: str
+    columns: Tuple[str, ...]
+
+    @property
+    def name(self) -> str:
+        return re.sub(r"\W", "_", f"idx_{self.table}_{'_'.join(self.columns)}").lower()
+
+    @property
+    def statement(self) -> str:
+        columns = ", ".join(quote_identifier(column) for column in self.columns)
+        return f"CREATE INDEX IF NOT EXISTS {self.name} ON {quote_identifier(self.table)}({columns})"
+
+
+class IndexRecommendation(NamedTuple):
+    """A measured index recommendation."""
+
+    table: str
+    columns: Tuple[str, ...]
+    statement: str
+    time_saved: float  # seconds saved over the logged executions, beyond earlier recommendations
+    speedup: float  # time of the queries using the index before / after it
+    queries: int  # queries the index speeds up
+    build_seconds: float  # time to build the index on the scratch copy
+
+
+def _candidates_for_table(shape: QueryShape, table: str, catalog: SchemaCatalog) -> List[Tuple[str, ...]]:
+    equality = shape.equality.get(table, [])
+    ranges = shape.ranges.get(table, [])
+    ordering = shape.ordering.get(table, [])
+    candidates = [(column,) for column in equality[:4]]
+    if len(equality) > 1:
+        candidates.append(tuple(equality[:3]))
+    candidates.extend((column,) for column in ranges[:2])
+    if equality and ranges:
+        candidates.append(tuple(equality[:2]) + (ranges[0],))
+    if ordering and not equality:
+        candidates.append((ordering[0],))
+
+    schema = catalog.tables[table]
+    primary_key = [column.name for column in schema.columns if column.primary_key]
+    existing = [index.columns for index in schema.indexes]
+    if not schema.without_rowid and len(primary_key) == 1:
+        existing.append((primary_key[0],))  # the rowid alias
+    kept = []
+    for columns in candidates:
+        covered = any(tuple(c.lower() for c in index[:len(columns)]) == tuple(c.lower() for c in columns) for index in existing)
+        if not covered and columns not in kept:
+            kept.append(columns)
+    return kept
+
+
+class IndexAdvisor:
+    """Cost-based index advisor for one database.
+
+    Candidate indexes come from the tables each workload query scans in full
+    and the columns it filters, joins, groups and sorts on. Each candidate is
+    built on a scratch copy of the database, the queries whose plan then uses
+    it are timed again. Recommendations are then picked greedily by the
+    workload time they save, ``executions * (time before - time after)``
+    summed over the queries, counting only what earlier picks did not
+    already save. Candidates are measured one at a time, so interactions
+    between two new indexes are not.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        runs: int = 3,
+        query_timeout: float = 5.0,
+        max_queries: int = 50,
+        max_candidates: int = 20,
+        min_speedup: float = 1.2,
+    ):
+        """Initialize the index advisor.
+
+        Args:
+            db_path: Database path (default database if omitted)
+            runs: Timed runs per query and index; the best run counts
+            query_timeout: Seconds after which a timed query is stopped
+            max_queries: Workload queries considered, most total time first
+            max_candidates: Candidate indexes measured
+            min_speedup: Minimum speedup of the affected queries to recommend an index
+        """
+        self.db_path = get_pool(db_path, readonly=True).db_path
+        self.runs = runs
+        self.query_timeout = query_timeout
+        self.max_queries = max_queries
+        self.max_candidates = max_candidates
+        self.min_speedup = min_speedup
+
+    @classmethod
+    def from_config(cls, db_path: Optional[str] = None) -> "IndexAdvisor":
+        """Build an index advisor from DatabaseOptimizationConfig."""
+        db_config = get_performance_config().database
+        return cls(
+            db_path,
+            runs=db_config.index_advisor_runs,
+            query_timeout=db_config.index_advisor_query_timeout,
+            max_queries=db_config.index_advisor_max_queries,
+            max_candidates=db_config.index_advisor_max_candidates,
+            min_speedup=db_config.index_advisor_min_speedup,
+        )
+
+    def _workload(self, queries: Optional[Sequence[Union[str, WorkloadQuery]]]) -> List[WorkloadQuery]:
+        if queries is None:
+            queries = get_workload_log().queries(self.db_path)
+        workload = [
+            query if isinstance(query, WorkloadQuery)
+            else WorkloadQuery(self.db_path, query, query_fingerprint(query), 1, 0.0)
+            for query in queries
+        ]
+        return [query for query in workload if _SELECT_PATTERN.match(query.sql)][:self.max_queries]
+
+    def candidates(
+        self, queries: Optional[Sequence[Union[str, WorkloadQuery]]] = None
+    ) -> Dict[IndexCandidate, List[WorkloadQuery]]:
+        """Candidate indexes for a workload and the queries each one may help.
+
+        Args:
+            queries: SQL statements or workload queries (the logged workload if omitted)
+
+        Returns:
+            Dict[IndexCandidate, List[WorkloadQuery]]: Candidates, most promising first
+        """
+        catalog = get_schema_catalog(self.db_path)
+        candidates: Dict[IndexCandidate, List[WorkloadQuery]] = {}
+        with pooled_cursor(self.db_path, readonly=True) as cursor:
+            for query in self._workload(queries):
+                try:
+                    plan = cursor.execute(f"EXPLAIN QUERY PLAN {query.sql}").fetchall()
+                except sqlite3.Error:
+                    continue
+                shape = parse_query(query.sql, catalog)
+                for table in scanned_tables(plan, shape):
+                    for columns in _candidates_for_table(shape, table, catalog):
+                        candidates.setdefault(IndexCandidate(table, columns), []).append(query)
+        ranked = sorted(
+            candidates.items(), key=lambda item: sum(q.total_seconds or q.executions for q in item[1]), reverse=True
+        )
+        return dict(ranked[:self.max_candidates])
+
+    def _time(self, conn: sqlite3.Connection, query: str) -> float:
+        best = None
+        for _ in range(self.runs):
+            result = run_bounded_query(conn.cursor(), query, budget=QueryBudget(timeout=self.query_timeout))
+            best = result.elapsed if best is None else min(best, result.elapsed)
+            if result.aborted:
+                break
+        return best or 0.0
+
+    def recommend(
+        self, queries: Optional[Sequence[Union[str, WorkloadQuery]]] = None
+    ) -> List[IndexRecommendation]:
+        """Measure candidate indexes on a scratch copy of the database and rank them.
+
+        Args:
+            queries: SQL statements or workload queries (the logged workload if omitted)
+
+        Returns:
+            List[IndexRecommendation]: Recommendations, most workload time saved first
+        """
+        candidates = self.candidates(queries)
+        if not candidates:
+            return []
+
+        executions = {query.sql: query.executions for queries in candidates.values() for query in queries}
+        measured = []  # (candidate, build seconds, {sql: seconds with the index})
+        with tempfile.TemporaryDirectory() as scratch_dir:
+            source = sqlite3.connect(readonly_uri(self.db_path), uri=True)
+            scratch = sqlite3.connect(os.path.join(scratch_dir, "scratch.db"), isolation_level=None)
+            try:
+                source.backup(scratch)
+                source.close()
+                baseline = {sql: self._time(scratch, sql) for sql in executions}
+                for candidate, candidate_queries in candidates.items():
+                    start = time.perf_counter()
+                    scratch.execute(candidate.statement)
+                    build_seconds = time.perf_counter() - start
+                    timings = {}
+                    for query in candidate_queries:
+                        plan = scratch.execute(f"EXPLAIN QUERY PLAN {query.sql}").fetchall()
+                        if any(candidate.name in str(row[-1]) for row in plan):
+                            timings[query.sql] = self._time(scratch, query.sql)
+                    scratch.execute(f"DROP INDEX {candidate.name}")
+                    if timings:
+                        measured.append((candidate, build_seconds, timings))
+            finally:
+                source.close()
+                scratch.close()
+
+        # Greedy selection: each pick is credited only with the time it saves beyond
+        # the indexes picked before it, so overlapping candidates are not all recommended
+        current = dict(baseline)
+
+        def marginal_saving(timings: Dict[str, float]) -> float:
+            return sum(executions[sql] * max(current[sql] - elapsed, 0.0) for sql, elapsed in timings.items())
+
+        recommendations = []
+        while measured:
+            best = max(measured, key=lambda item: marginal_saving(item[2]))
+            measured.remove(best)
+            candidate, build_seconds, timings = best
+            saved = marginal_saving(timings)
+            if saved <= 0:
+                break
+            before = sum(executions[sql] * current[sql] for sql in timings)
+            after = sum(executions[sql] * min(current[sql], elapsed) for sql, elapsed in timings.items())
+            speedup = before / after if after > 0 else float("inf")
+            if speedup < self.min_speedup:
+                continue
+            for sql, elapsed in timings.items():
+                current[sql] = min(current[sql], elapsed)
+            recommendations.append(IndexRecommendation(
+                candidate.table, candidate.columns, candidate.statement,
+                saved, speedup, sum(elapsed < baseline[sql] for sql, elapsed in timings.items()), build_seconds,
+            ))
+        return recommendations
+
+
+# Global workload log
+_workload_log = None
+_workload_log_lock = threading.Lock()
+
+
+def get_workload_log() -> WorkloadLog:
+    """Get global workload log."""
+    global _workload_log
+    if _workload_log is None:
+        with _workload_log_lock:
+            if _workload_log is None:
+                _workload_log = WorkloadLog(get_performance_config().database.workload_log_size)
+    return _workload_log
+
+
+def recommend_indexes(db_path: Optional[str] = None) -> List[IndexRecommendation]:
+    """Recommend indexes for the logged workload of a database."""
+    return IndexAdvisor.from_config(db_path).recommend()
@@ -0,0 +1,431 @@
+"""
+Metrics subsystem for ManuAI.
+
+This module provides:
+1. HDR-style latency histograms with p50/p95/p99/max
+2. Per-thread metric shards, so recording never takes a lock
+3. Breakdowns per database, per tool and per normalized query fingerprint
+4. Online aggregates (Welford mean/variance, P² quantiles) for event streams
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+# Name of the tool whose work is currently being measured (set by manuai.tools.call_tool)
+current_tool: ContextVar[Optional[str]] = ContextVar("current_tool", default=None)
+
+
+class LatencyHistogram:
+    """Log-linear latency histogram in the style of HdrHistogram.
+
+    Values are recorded in microseconds. Each power of two is split into
+    ``SUB_BUCKETS`` linear buckets, which bounds the relative error of every
+    percentile to about 1/SUB_BUCKETS while recording stays O(1).
+    """
+
+    SUB_BUCKET_BITS = 4
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.total = 0
+        self.sum_us = 0
+        self.max_us = 0
+
+    @classmethod
+    def _bucket_index(cls, value_us: int) -> int:
+        if value_us < cls.SUB_BUCKETS:
+            return value_us
+        shift = value_us.bit_length() - cls.SUB_BUCKET_BITS - 1
+        return ((shift + 1) << cls.SUB_BUCKET_BITS) + ((value_us >> shift) - cls.SUB_BUCKETS)
+
+    @classmethod
+    def _bucket_upper_bound(cls, index: int) -> int:
+        if index < cls.SUB_BUCKETS:
+            return index
+        shift = (index >> cls.SUB_BUCKET_BITS) - 1
+        sub_bucket = (index & (cls.SUB_BUCKETS - 1)) + cls.SUB_BUCKETS
+        return ((sub_bucket + 1) << shift) - 1
+
+    def record(self, seconds: float):
+        value_us = max(int(seconds * 1_000_000), 0)
+        index = self._bucket_index(value_us)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        self.sum_us += value_us
+        if value_us > self.max_us:
+            self.max_us = value_us
+
+    def merge(self, other: "LatencyHistogram"):
+        for index, count in list(other.counts.items()):
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.sum_us += other.sum_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentile(self, percent: float) -> float:
+        """Value (seconds) at or below which ``percent`` of recordings fall."""
+        if self.total == 0:
+            return 0.0
+        rank = max(int(self.total * percent / 100.0 + 0.5), 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._bucket_upper_bound(index), self.max_us) / 1_000_000
+        return self.max_us / 1_000_000
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.total,
+            "mean": (self.sum_us / self.total / 1_000_000) if self.total else 0.0,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "max": self.max_us / 1_000_000,
+            "total": self.sum_us / 1_000_000,
+        }
+
+
+class RunningStats:
+    """Count, mean and variance updated in O(1) per value (Welford's algorithm)."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    @property
+    def variance(self) -> float:
+        """Sample variance (0.0 for fewer than two values)."""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stdev(self) -> float:
+        return self.variance ** 0.5
+
+
+class P2Quantile:
+    """Streaming quantile estimate with five markers (the P² algorithm of Jain & Chlamtac).
+
+    Uses constant memory and O(1) time per value; exact for the first five values.
+    """
+
+    def __init__(self, quantile: float):
+        self.quantile = quantile
+        self.heights: List[float] = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * quantile, 1 + 4 * quantile, 3 + 2 * quantile, 5]
+        self.increments = [0, quantile / 2, quantile, (1 + quantile) / 2, 1]
+
+    def add(self, value: float):
+        heights = self.heights
+        if len(heights) < 5:
+            heights.append(value)
+            heights.sort()
+            return
+
+        # Find the cell the value falls in, extending the extremes if needed
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = next(i for i in range(4) if heights[i] <= value < heights[i + 1])
+
+        for i in range(cell + 1, 5):
+            self.positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # Move the three middle markers towards their desired positions
+        for i in range(1, 4):
+            offset = self.desired[i] - self.positions[i]
+            if (offset >= 1 and self.positions[i + 1] - self.positions[i] > 1) or (
+                offset <= -1 and self.positions[i - 1] - self.positions[i] < -1
+            ):
+                step = 1 if offset > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / (
+                        self.positions[i + step] - self.positions[i]
+                    )
+                heights[i] = height
+                self.positions[i] += step
+
+    def _parabolic(self, i: int, step: int) -> float:
+        q, n = self.heights, self.positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self) -> float:
+        if not self.heights:
+            return 0.0
+        if len(self.heights) < 5:
+            index = min(int(round(self.quantile * (len(self.heights) - 1))), len(self.heights) - 1)
+            return sorted(self.heights)[index]
+        return self.heights[2]
+
+
+class DistributionSketch:
+    """Running count/mean/stdev plus streaming quantiles of one value stream."""
+
+    QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+
+    def __init__(self):
+        self.stats = RunningStats()
+        self.quantiles = {q: P2Quantile(q) for q in self.QUANTILES}
+
+    def add(self, value: float):
+        self.stats.add(value)
+        for estimator in self.quantiles.values():
+            estimator.add(value)
+
+    @property
+    def count(self) -> int:
+        return self.stats.count
+
+    def quantile(self, q: float) -> float:
+        return self.quantiles[q].value()
+
+    def summary(self) -> Dict[str, Any]:
+        summary = {
+            "count": self.stats.count,
+            "mean": self.stats.mean,
+            "std_dev": self.stats.stdev,
+            "min": self.stats.min,
+            "max": self.stats.max,
+        }
+        summary.update({f"p{int(q * 100)}": estimator.value() for q, estimator in self.quantiles.items()})
+        return summary
+
+
+def query_fingerprint(query: str) -> str:
+    """Normalize a SQL statement into a fingerprint shared by queries differing only in literals."""
+    fingerprint = re.sub(r"'(?:[^']|'')*'", "?", query)
+    fingerprint = re.sub(r"\b\d+(?:\.\d+)?\b", "?", fingerprint)
+    fingerprint = re.sub(r"\s+", " ", fingerprint).strip().rstrip(";").strip()
+    fingerprint = re.sub(r"\?(?:\s*,\s*\?)+", "?", fingerprint)
+    return fingerprint.upper()
+
+
+class _MetricsShard:
+    """Counters and histograms written by exactly one thread."""
+
+    def __init__(self, thread: Optional[threading.Thread] = None):
+        self.thread = thread
+        self.counters: Dict[str, int] = {}
+        self.histograms: Dict[tuple, LatencyHistogram] = {}
+        self.fingerprint_histograms = 0
+
+    def histogram(self, key: tuple) -> LatencyHistogram:
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+            if key[0] == "fingerprint":
+                self.fingerprint_histograms += 1
+        return histogram
+
+    def merge(self, other: "_MetricsShard"):
+        for name, value in list(other.counters.items()):
+            self.counters[name] = self.counters.get(name, 0) + value
+        for key, histogram in list(other.histograms.items()):
+            self.histogram(key).merge(histogram)
+
+    def prune_fingerprints(self, live: Dict[str, str]):
+        """Drop the histograms of fingerprints no longer tracked."""
+        for key in [key for key in list(self.histograms) if key[0] == "fingerprint" and key[1] not in live]:
+            del self.histograms[key]
+        self.fingerprint_histograms = sum(1 for key in list(self.histograms) if key[0] == "fingerprint")
+
+
+class MetricsRegistry:
+    """Process-wide metrics with per-thread shards.
+
+    Every thread records into its own shard, so the hot path takes no lock; the
+    lock only guards registering a new shard and tracking a new fingerprint.
+    Readers merge all shards into a snapshot. Shards of finished threads (a
+    Streamlit rerun runs on a new thread) are folded into one retired shard,
+    and only the ``max_fingerprints`` most recently seen query fingerprints
+    are kept.
+    """
+
+    def __init__(self, max_fingerprints: int = 500):
+        """Initialize the metrics registry.
+
+        Args:
+            max_fingerprints: Query fingerprints with their own latency histogram
+        """
+        self.max_fingerprints = max_fingerprints
+        self._local = threading.local()
+        self._shards: List[_MetricsShard] = []
+        self._retired = _MetricsShard()
+        self._lock = threading.Lock()
+        self._fingerprints: OrderedDict = OrderedDict()  # fingerprint id -> fingerprint
+
+    def _shard(self) -> _MetricsShard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _MetricsShard(threading.current_thread())
+            with self._lock:
+                self._retire_finished()
+                self._shards.append(shard)
+        return shard
+
+    def _retire_finished(self):
+        """Fold the shards of finished threads into the retired shard (lock held)."""
+        live = []
+        for shard in self._shards:
+            if shard.thread is not None and not shard.thread.is_alive():
+                self._retired.merge(shard)
+            else:
+                live.append(shard)
+        if len(live) != len(self._shards):
+            self._retired.prune_fingerprints(self._fingerprints)
+            self._shards = live
+
+    def _track_fingerprint(self, fingerprint_id: str, fingerprint: str):
+        try:
+            self._fingerprints.move_to_end(fingerprint_id)
+            return
+        except KeyError:
+            pass
+        with self._lock:
+            self._fingerprints[fingerprint_id] = fingerprint
+            while len(self._fingerprints) > self.max_fingerprints:
+                self._fingerprints.popitem(last=False)
+
+    def increment(self, name: str, amount: int = 1):
+        counters = self._shard().counters
+        counters[name] = counters.get(name, 0) + amount
+
+    def record_query(self, db_path: str, seconds: float, query: str):
+        """Record one executed query under its database, tool and fingerprint."""
+        shard = self._shard()
+        fingerprint = query_fingerprint(query)
+        fingerprint_id = hashlib.sha1(fingerprint.encode()).hexdigest()[:12]
+        self._track_fingerprint(fingerprint_id, fingerprint)
+
+        shard.histogram(("query", "all")).record(seconds)
+        shard.histogram(("database", os.path.basename(str(db_path)))).record(seconds)
+        shard.histogram(("fingerprint", fingerprint_id)).record(seconds)
+        if shard.fingerprint_histograms > 2 * self.max_fingerprints:
+            # Amortized: each shard drops evicted fingerprints itself, so it is never written by two threads
+            shard.prune_fingerprints(self._fingerprints)
+        tool = current_tool.get()
+        if tool:
+            shard.histogram(("query_tool", tool)).record(seconds)
+
+    def record_tool(self, tool: str, seconds: float):
+        """Record the wall time of one tool invocation."""
+        self._shard().histogram(("tool", tool)).record(seconds)
+
+    def record_prompt(self, model: str, tokens: int, reused_tokens: int):
+        """Record the prompt size of one model call and how much of it repeats the previous prompt."""
+        counters = self._shard().counters
+        counters["prompt_tokens"] = counters.get("prompt_tokens", 0) + tokens
+        counters["prompt_tokens_reused"] = counters.get("prompt_tokens_reused", 0) + reused_tokens
+        counters["model_calls"] = counters.get("model_calls", 0) + 1
+
+    def record_first_token(self, model: str, seconds: float):
+        """Record the time from a model call to its first streamed chunk."""
+        self._shard().histogram(("ttft", model)).record(seconds)
+
+    def _merged(self) -> tuple:
+        with self._lock:
+            self._retire_finished()
+            shards = [self._retired, *self._shards]
+        counters: Dict[str, int] = {}
+        histograms: Dict[tuple, LatencyHistogram] = {}
+        for shard in shards:
+            for name, value in list(shard.counters.items()):
+                counters[name] = counters.get(name, 0) + value
+            for key, histogram in list(shard.histograms.items()):
+                histograms.setdefault(key, LatencyHistogram()).merge(histogram)
+        return counters, histograms
+
+    def snapshot(self, top_fingerprints: int = 10) -> Dict[str, Any]:
+        """Merge all shards into counters and latency summaries."""
+        counters, histograms = self._merged()
+
+        def breakdown(kind: str) -> Dict[str, Dict[str, Any]]:
+            return {
+                name: histogram.summary()
+                for (key_kind, name), histogram in histograms.items()
+                if key_kind == kind
+            }
+
+        fingerprints = sorted(
+            (item for item in breakdown("fingerprint").items() if item[0] in self._fingerprints),
+            key=lambda item: item[1]["total"],
+            reverse=True,
+        )
+        return {
+            "counters": counters,
+            "queries": histograms.get(("query", "all"), LatencyHistogram()).summary(),
+            "by_database": breakdown("database"),
+            "by_tool": breakdown("tool"),
+            "queries_by_tool": breakdown("query_tool"),
+            "time_to_first_token": breakdown("ttft"),
+            "by_fingerprint": {
+                self._fingerprints.get(fingerprint_id, fingerprint_id): summary
+                for fingerprint_id, summary in fingerprints[:top_fingerprints]
+            },
+        }
+
+    def reset(self):
+        with self._lock:
+            for shard in [self._retired, *self._shards]:
+                shard.counters.clear()
+                shard.histograms.clear()
+                shard.fingerprint_histograms = 0
+
+
+@contextmanager
+def measure_tool(tool: str) -> Iterator[None]:
+    """Time a tool invocation and tag queries it runs with the tool name."""
+    token = current_tool.set(tool)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        get_metrics().record_tool(tool, time.perf_counter() - start)
+        current_tool.reset(token)
+
+
+# Global metrics registry
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Get global metrics registry."""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                from manuai.performance_config import get_performance_config
+
+                _metrics = MetricsRegistry(get_performance_config().system.metrics_max_fingerprints)
+    return _metrics
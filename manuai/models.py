@@ -1,20 +1,27 @@
 import os
-from typing import Any, Dict, List, Optional
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
+import httpx
+import ollama
 import requests
-from langchain_core.callbacks.manager import CallbackManagerForLLMRun
 from langchain_core.language_models.chat_models import BaseChatModel
-from langchain_core.messages import (AIMessage, BaseMessage, HumanMessage,
-                                     SystemMessage)
+from langchain_core.messages import AIMessage, BaseMessage
 from langchain_core.outputs.llm_result import LLMResult
 from langchain_ollama import ChatOllama
 
-from manuai.config import ModelConfig, ModelProvider
-from manuai.optimizations import TokenOptimizationPipeline
+from manuai.config import Config, ModelConfig, ModelProvider
+from manuai.logging import log
+from manuai.performance_config import get_performance_config
 
 
 class OptimizedChatOllama(ChatOllama):
-    """Optimized Ollama chat model with token and parameter optimization."""
+    """Optimized Ollama chat model with token and parameter optimization.
+
+    The prompt token budget is enforced by the agent loop before every call
+    (see manuai.context_window), where tool results can be elided in pairs.
+    """
 
     def __init__(
         self,
@@ -37,55 +44,35 @@ class OptimizedChatOllama(ChatOllama):
             **kwargs,
         )
 
-    def _call(
-        self,
-        messages: List[BaseMessage],
-        stop: Optional[List[str]] = None,
-        run_manager: Optional[CallbackManagerForLLMRun] = None,
-        **kwargs,
-    ) -> str:
-        """Call the Ollama API with optimization.
 
-        Args:
-            messages: List of chat messages
-            stop: Optional list of stop sequences
-            run_manager: Optional callback manager
+def _ollama_base_url() -> str:
+    return os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
 
-        Returns:
-            Generated text response
-        """
-        # Create token optimizer when needed instead of storing as an instance attribute
-        token_optimizer = TokenOptimizationPipeline()
-
-        # Apply token optimization to the last user message if it exists
-        optimized_messages = list(messages)
-        for i in range(len(optimized_messages) - 1, -1, -1):
-            if isinstance(optimized_messages[i], HumanMessage):
-                original_content = optimized_messages[i].content
-                optimized_content = token_optimizer.refine_query(original_content)
-                optimized_messages[i] = HumanMessage(content=optimized_content)
-                break
-
-        # Prune conversation history if needed
-        if len(optimized_messages) > 10:  # arbitrary threshold
-            system_messages = [m for m in optimized_messages if isinstance(m, SystemMessage)]
-            recent_messages = optimized_messages[-9:]  # Keep last 9 messages
-
-            # Make sure we keep at least one system message if it exists
-            if system_messages and not any(isinstance(m, SystemMessage) for m in recent_messages):
-                optimized_messages = [system_messages[0]] + recent_messages
-            else:
-                optimized_messages = recent_messages
-
-        # Call the parent implementation with optimized messages
-        return super()._call(
-            messages=optimized_messages, stop=stop, run_manager=run_manager, **kwargs
-        )
+
+def _connection_limits() -> httpx.Limits:
+    llm_config = get_performance_config().llm
+    return httpx.Limits(
+        max_connections=llm_config.model_max_connections,
+        max_keepalive_connections=llm_config.model_max_connections,
+        keepalive_expiry=llm_config.model_connection_expiry,
+    )
+
+
+def create_ollama_client(base_url: Optional[str] = None) -> ollama.Client:
+    """Create an Ollama API client with the configured keep-alive connection limits."""
+    return ollama.Client(
+        host=base_url or _ollama_base_url(),
+        timeout=get_performance_config().llm.model_request_timeout,
+        limits=_connection_limits(),
+    )
 
 
 def create_llm(model_config: ModelConfig) -> BaseChatModel:
     """Create a language model based on the model configuration.
 
+    Every call builds a new client with its own HTTP connection pool; use
+    get_llm to share one client per model configuration.
+
     Args:
         model_config: Model configuration
 
@@ -93,10 +80,144 @@ def create_llm(model_config: ModelConfig) -> BaseChatModel:
         BaseChatModel: Configured language model
     """
     if model_config.provider == ModelProvider.OLLAMA:
+        llm_config = get_performance_config().llm
         return OptimizedChatOllama(
             model=model_config.name,
             temperature=model_config.temperature,
-            base_url=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
+            base_url=_ollama_base_url(),
+            keep_alive=llm_config.model_keep_alive,
+            client_kwargs={"limits": _connection_limits()},
         )
     else:
         raise ValueError(f"Unsupported model provider: {model_config.provider}")
+
+
+# ChatOllama fields Ollama reads from a request's "options"
+OLLAMA_OPTION_FIELDS = (
+    "mirostat", "mirostat_eta", "mirostat_tau", "num_ctx", "num_gpu", "num_thread", "num_predict",
+    "repeat_last_n", "repeat_penalty", "temperature", "seed", "stop", "tfs_z", "top_k", "top_p",
+)
+
+
+def generation_options(llm: BaseChatModel, model_params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Keyword arguments that apply per-request generation parameters when binding ``llm``.
+
+    Ollama takes sampling parameters from the request's ``options``, which
+    replace the model's own settings, so those are merged in first.
+
+    Args:
+        llm: Model the parameters are bound to
+        model_params: Parameters from optimize_query_execution (num_predict, top_p, temperature)
+
+    Returns:
+        Dict of keyword arguments for ``bind``/``bind_tools`` (empty if not applicable)
+    """
+    if not model_params or not isinstance(llm, ChatOllama):
+        return {}
+    options = {
+        field: getattr(llm, field)
+        for field in OLLAMA_OPTION_FIELDS
+        if getattr(llm, field, None) is not None
+    }
+    options.update(model_params)
+    return {"options": options}
+
+
+class ModelRegistry:
+    """Builds each model configuration's client once and shares it across sessions.
+
+    Clients keep their HTTP connections alive between requests and ask Ollama to
+    keep the model loaded, so a chat turn pays neither a TCP handshake nor a
+    model load.
+    """
+
+    def __init__(self):
+        self.models: Dict[Tuple, BaseChatModel] = {}
+        self.clients: Dict[str, ollama.Client] = {}  # base URL -> client for warm-up requests
+        self.lock = threading.Lock()
+        self.warmed_up: Dict[str, float] = {}
+
+    @staticmethod
+    def _key(model_config: ModelConfig) -> Tuple:
+        return (model_config.provider, model_config.name, model_config.temperature, _ollama_base_url())
+
+    def get(self, model_config: ModelConfig) -> BaseChatModel:
+        """Get the shared client for a model configuration, building it on first use."""
+        key = self._key(model_config)
+        llm = self.models.get(key)
+        if llm is None:
+            with self.lock:
+                llm = self.models.get(key)
+                if llm is None:
+                    llm = self.models[key] = create_llm(model_config)
+        return llm
+
+    def client(self, base_url: Optional[str] = None) -> ollama.Client:
+        """Get the shared Ollama API client for a server, building it on first use."""
+        base_url = base_url or _ollama_base_url()
+        with self.lock:
+            client = self.clients.get(base_url)
+            if client is None:
+                client = self.clients[base_url] = create_ollama_client(base_url)
+        return client
+
+    def warm_up(self, model_configs: Optional[List[ModelConfig]] = None, background: bool = True):
+        """Load models into Ollama's memory before the first chat turn.
+
+        Sends each model an empty chat request, which makes Ollama load it and
+        keep it resident for ``model_keep_alive``.
+
+        Args:
+            model_configs: Models to load (defaults to Config.MODEL and Config.COMPLEX_MODEL)
+            background: Run in a daemon thread instead of blocking the caller
+
+        Returns:
+            The warm-up thread when running in the background, otherwise None
+        """
+        if model_configs is None:
+            model_configs = [Config.MODEL, Config.COMPLEX_MODEL]
+        if background:
+            thread = threading.Thread(
+                target=self.warm_up, args=(model_configs, False), name="manuai-model-warm-up", daemon=True
+            )
+            thread.start()
+            return thread
+
+        keep_alive = get_performance_config().llm.model_keep_alive
+        for model_config in model_configs:
+            if model_config.provider != ModelProvider.OLLAMA:
+                continue
+            start = time.perf_counter()
+            try:
+                self.client().chat(model=model_config.name, messages=[], keep_alive=keep_alive)
+            except Exception as e:
+                log(f"[yellow]Could not warm up model {model_config.name}: {str(e)}[/yellow]")
+                continue
+            self.warmed_up[model_config.name] = time.perf_counter() - start
+        return None
+
+    def clear(self):
+        """Drop all shared clients; their connections close once no request uses them."""
+        with self.lock:
+            self.models = {}
+            self.clients = {}
+
+
+# Global model registry
+_model_registry = None
+_model_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    """Get global model registry."""
+    global _model_registry
+    if _model_registry is None:
+        with _model_registry_lock:
+            if _model_registry is None:
+                _model_registry = ModelRegistry()
+    return _model_registry
+
+
+def get_llm(model_config: ModelConfig) -> BaseChatModel:
+    """Get the shared language model client for a model configuration."""
+    return get_model_registry().get(model_config)
@@ -12,9 +12,9 @@ import hashlib
 import json
 import os
 import re
-import statistics
 import threading
-from collections import OrderedDict, defaultdict
+import uuid
+from collections import OrderedDict, defaultdict, deque
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
@@ -22,6 +22,9 @@ from typing import Any, Dict, List, Optional, Tuple
 from langchain_core.language_models.chat_models import BaseChatModel
 
 from manuai.config import Config
+from manuai.event_log import EventLog, EventLogReader
+from manuai.logging import log
+from manuai.metrics import DistributionSketch
 
 
 class ComplexityCache:
@@ -110,28 +113,148 @@ class PerformanceMonitor:
     - Tracks response quality metrics
     - Provides historical performance analysis
     - Supports threshold calibration
+
+    Events are appended to a JSON Lines log by a background flusher (see
+    manuai.event_log) instead of rewriting the whole history on every query,
+    and are read back incrementally, so other processes' events show up too.
+    Counts, means, variances and quantiles per model are kept as online
+    aggregates updated as events arrive.
     """
 
-    def __init__(self, log_file: str = "model_performance.json"):
+    # Event type -> metrics list it belongs to
+    EVENT_TYPES = {"selection": "selections", "feedback": "feedback", "response": "responses"}
+
+    # Queries remembered for attributing feedback to the model that answered them
+    MAX_TRACKED_QUERIES = 10000
+
+    # Raw events kept per type for charts; the aggregates cover the whole log
+    MAX_RAW_EVENTS = 5000
+
+    def __init__(self, log_file: str = "logs/model_performance.jsonl"):
         """Initialize the performance monitor.
 
         Args:
-            log_file: Path to the log file for recording performance metrics
+            log_file: Path to the JSON Lines event log. An existing JSON log with the
+                same name (``.json``) is migrated into it once.
         """
-        self.log_file = log_file
-        self.metrics = defaultdict(list)
+        self.log_file = str(log_file)
+        self.metrics = defaultdict(lambda: deque(maxlen=self.MAX_RAW_EVENTS))
         self.lock = threading.RLock()
-
-        # Load existing data if available
-        if os.path.exists(log_file):
-            try:
-                with open(log_file, "r") as f:
-                    data = json.load(f)
-                    for key, values in data.items():
-                        self.metrics[key] = values
-            except (json.JSONDecodeError, FileNotFoundError):
-                # Start with empty metrics if file doesn't exist or is corrupt
-                pass
+        self._reset_aggregates()
+        self._reader = EventLogReader(self.log_file)
+        self._event_log = None
+        # Events recorded here that the reader has not seen in the file yet
+        self._own_pending: Dict[str, Dict[str, Any]] = {}
+
+        self._migrate_json_log()
+        self._refresh()
+
+    @property
+    def event_log(self) -> EventLog:
+        """Background-flushed writer for this monitor's log."""
+        if self._event_log is None:
+            from manuai.performance_config import get_performance_config
+
+            system = get_performance_config().system
+            self._event_log = EventLog(
+                self.log_file,
+                flush_interval=system.metrics_flush_interval,
+                batch_size=system.metrics_flush_batch_size,
+                fsync=system.metrics_fsync,
+                retention_days=system.metrics_retention_days,
+                compaction_interval=system.metrics_compaction_interval,
+            )
+        return self._event_log
+
+    def _migrate_json_log(self) -> None:
+        """Convert a legacy ``model_performance.json`` into the event log once.
+
+        Runs while the event log has no events (it may exist empty) and renames
+        the legacy file to ``.json.migrated`` afterwards.
+        """
+        legacy_file = Path(self.log_file).with_suffix(".json")
+        if not legacy_file.exists() or (os.path.exists(self.log_file) and os.path.getsize(self.log_file) > 0):
+            return
+        try:
+            with open(legacy_file, "r") as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            return
+
+        events = []
+        for event_type, key in self.EVENT_TYPES.items():
+            for record in data.get(key, []):
+                events.append({"type": event_type, "id": uuid.uuid4().hex, **record})
+        events.sort(key=lambda event: event.get("timestamp", ""))
+        if self.event_log.seed(events):
+            self.event_log.compact()
+            os.replace(legacy_file, legacy_file.with_suffix(".json.migrated"))
+            log(f"Migrated {len(events)} events from {legacy_file} to {self.log_file}")
+
+    def _reset_aggregates(self) -> None:
+        self.metrics.clear()
+        self.complexity_sketches = defaultdict(DistributionSketch)
+        self.rating_sketches = defaultdict(DistributionSketch)
+        self.complexity_overall = DistributionSketch()
+        self.ratings_overall = DistributionSketch()
+        # Output tokens per query class, and how often a class hit its cap
+        self.response_sketches = defaultdict(DistributionSketch)
+        self.truncations = defaultdict(int)
+        # Latest model selected per query, used to attribute feedback
+        self.query_models: OrderedDict = OrderedDict()
+
+    def _apply(self, event: Dict[str, Any]) -> None:
+        """Add one event to the bounded raw lists and the online aggregates (O(1))."""
+        event_type = event.get("type")
+        key = self.EVENT_TYPES.get(event_type)
+        if key is None:
+            return
+        self.metrics[key].append(event)
+
+        if event_type == "selection":
+            model = event.get("selected_model", "")
+            complexity = event.get("complexity", 0.0)
+            self.complexity_sketches[model].add(complexity)
+            self.complexity_overall.add(complexity)
+            self.query_models[event.get("query", "")] = model
+            self.query_models.move_to_end(event.get("query", ""))
+            if len(self.query_models) > self.MAX_TRACKED_QUERIES:
+                self.query_models.popitem(last=False)
+        elif event_type == "response":
+            query_class = event.get("query_class", "")
+            self.response_sketches[query_class].add(event.get("output_tokens", 0))
+            if event.get("truncated"):
+                self.truncations[query_class] += 1
+        else:
+            rating = event.get("rating", 0)
+            self.ratings_overall.add(rating)
+            model = self.query_models.get(event.get("query", ""))
+            if model is not None:
+                self.rating_sketches[model].add(rating)
+
+    def _refresh(self) -> None:
+        """Apply events appended to the log since the last read."""
+        with self.lock:
+            events, reset = self._reader.read_new()
+            if reset:
+                # The log was compacted: rebuild from the file plus our unflushed events
+                self._reset_aggregates()
+            for event in events:
+                own = self._own_pending.pop(event.get("id"), None)
+                if own is None or reset:
+                    self._apply(event)
+            if reset:
+                for event in self._own_pending.values():
+                    self._apply(event)
+
+    def _record(self, event_type: str, record: Dict[str, Any]) -> None:
+        event = {"type": event_type, "id": uuid.uuid4().hex, **record}
+        with self.lock:
+            self._apply(event)
+            self._own_pending[event["id"]] = event
+            if len(self._own_pending) > 1000:
+                self._refresh()
+        self.event_log.append(event)
 
     def record_selection(self, query: str, complexity: float, selected_model: str) -> None:
         """Record a model selection decision.
@@ -141,15 +264,15 @@ class PerformanceMonitor:
             complexity: Calculated complexity score
             selected_model: The model that was selected (model name from config)
         """
-        with self.lock:
-            record = {
+        self._record(
+            "selection",
+            {
                 "timestamp": datetime.now().isoformat(),
                 "query": query,
                 "complexity": complexity,
                 "selected_model": selected_model,
-            }
-            self.metrics["selections"].append(record)
-            self._save_metrics()
+            },
+        )
 
     def record_feedback(self, query: str, rating: int, comments: Optional[str] = None) -> None:
         """Record user feedback on response quality.
@@ -159,60 +282,123 @@ class PerformanceMonitor:
             rating: User rating (1-5)
             comments: Optional user comments
         """
-        with self.lock:
-            record = {
+        self._record(
+            "feedback",
+            {
                 "timestamp": datetime.now().isoformat(),
                 "query": query,
                 "rating": max(1, min(5, rating)),  # Ensure rating is between 1-5
                 "comments": comments,
-            }
-            self.metrics["feedback"].append(record)
-            self._save_metrics()
+            },
+        )
+
+    def record_response(self, query: str, query_class: str, output_tokens: int, truncated: bool) -> None:
+        """Record the length of a generated answer.
+
+        Args:
+            query: The original user query
+            query_class: Query class the output cap was chosen for
+            output_tokens: Tokens generated for the longest model turn (continuations included)
+            truncated: Whether a turn hit the output cap and had to be continued
+        """
+        self._record(
+            "response",
+            {
+                "timestamp": datetime.now().isoformat(),
+                "query": query,
+                "query_class": query_class,
+                "output_tokens": output_tokens,
+                "truncated": truncated,
+            },
+        )
+
+    def get_events(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Get recent selections, feedback and responses, including events from other processes.
+
+        Returns:
+            Dict with "selections", "feedback" and "responses" lists (the latest
+            MAX_RAW_EVENTS of each)
+        """
+        self._refresh()
+        with self.lock:
+            return {key: list(self.metrics.get(key, [])) for key in self.EVENT_TYPES.values()}
 
     def get_model_performance_metrics(self) -> Dict[str, Dict[str, float]]:
         """Get performance metrics by model.
 
+        Read from the online aggregates, so the cost does not grow with history.
+
         Returns:
             Dict containing performance metrics for each model
         """
+        self._refresh()
         with self.lock:
-            model_metrics = defaultdict(lambda: {"count": 0, "avg_rating": 0.0, "ratings": []})
+            model_metrics = {}
+            for model, sketch in self.rating_sketches.items():
+                data = {"count": sketch.count, "avg_rating": sketch.stats.mean}
 
-            # Process feedback with corresponding selections
-            selection_map = {}
-            for selection in self.metrics.get("selections", []):
-                selection_map[selection.get("query", "")] = selection
+                # Add additional statistics if we have enough data
+                if sketch.count >= 5:
+                    data["median_rating"] = sketch.quantile(0.5)
+                    data["std_dev"] = sketch.stats.stdev
+                model_metrics[model] = data
 
-            for feedback in self.metrics.get("feedback", []):
-                query = feedback.get("query", "")
-                if query in selection_map:
-                    model = selection_map[query].get("selected_model", "unknown")
-                    rating = feedback.get("rating", 0)
+            return model_metrics
 
-                    model_metrics[model]["count"] += 1
-                    model_metrics[model]["ratings"].append(rating)
+    def get_complexity_summary(self) -> Dict[str, Dict[str, Any]]:
+        """Get count, mean, spread and quantiles of complexity scores by selected model.
 
-            # Calculate averages
-            for model, data in model_metrics.items():
-                if data["ratings"]:
-                    data["avg_rating"] = sum(data["ratings"]) / len(data["ratings"])
+        Returns:
+            Dict mapping model names to DistributionSketch summaries
+        """
+        self._refresh()
+        with self.lock:
+            return {model: sketch.summary() for model, sketch in self.complexity_sketches.items()}
 
-                # Add additional statistics if we have enough data
-                if len(data["ratings"]) >= 5:
-                    data["median_rating"] = statistics.median(data["ratings"])
-                    try:
-                        data["std_dev"] = statistics.stdev(data["ratings"])
-                    except statistics.StatisticsError:
-                        data["std_dev"] = 0.0
+    def get_summary(self) -> Dict[str, Any]:
+        """Get all aggregates for dashboards.
+
+        Returns:
+            Dict with per-model "complexity" and "ratings" summaries plus overall ones
+        """
+        self._refresh()
+        with self.lock:
+            models = set(self.complexity_sketches) | set(self.rating_sketches)
+            return {
+                "models": {
+                    model: {
+                        "complexity": self.complexity_sketches.get(model, DistributionSketch()).summary(),
+                        "ratings": self.rating_sketches.get(model, DistributionSketch()).summary(),
+                    }
+                    for model in sorted(models)
+                },
+                "complexity": self.complexity_overall.summary(),
+                "ratings": self.ratings_overall.summary(),
+            }
+
+    def get_response_length_summary(self) -> Dict[str, Dict[str, Any]]:
+        """Get output-token summaries and truncation counts by query class.
 
-            return dict(model_metrics)
+        Returns:
+            Dict mapping query classes to DistributionSketch summaries plus "truncated"
+        """
+        self._refresh()
+        with self.lock:
+            return {
+                query_class: {**sketch.summary(), "truncated": self.truncations.get(query_class, 0)}
+                for query_class, sketch in self.response_sketches.items()
+            }
 
     def get_complexity_distribution(self) -> Dict[str, List[float]]:
-        """Get the distribution of complexity scores by selected model.
+        """Get the complexity scores of recent selections by selected model.
+
+        Only the latest MAX_RAW_EVENTS selections are kept; use
+        get_complexity_summary for the whole history.
 
         Returns:
             Dict mapping model names to lists of complexity scores
         """
+        self._refresh()
         with self.lock:
             distribution = defaultdict(list)
 
@@ -223,17 +409,6 @@ class PerformanceMonitor:
 
             return dict(distribution)
 
-    def _save_metrics(self) -> None:
-        """Save metrics to the log file."""
-        try:
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(os.path.abspath(self.log_file)), exist_ok=True)
-
-            with open(self.log_file, "w") as f:
-                json.dump(dict(self.metrics), f, indent=2)
-        except (OSError, IOError) as e:
-            print(f"Error saving metrics: {e}")
-
 
 class ThresholdCalibrator:
     """Dynamically calibrates complexity thresholds based on performance data.
@@ -242,17 +417,30 @@ class ThresholdCalibrator:
     - Analyzes historical performance data
     - Suggests optimal threshold adjustments
     - Supports automated or manual calibration
+
+    Calibration reads the monitor's online aggregates (mean ratings and P²
+    complexity quantiles), so it is O(1) and cheap enough to run per request.
     """
 
-    def __init__(self, initial_threshold: float = 0.25, min_samples: int = 20):
+    def __init__(
+        self,
+        initial_threshold: float = 0.25,
+        min_samples: int = 20,
+        simple_model: Optional[str] = None,
+        complex_model: Optional[str] = None,
+    ):
         """Initialize the threshold calibrator.
 
         Args:
             initial_threshold: Starting threshold value
             min_samples: Minimum samples required for calibration
+            simple_model: Name of the model used below the threshold (Config.MODEL)
+            complex_model: Name of the model used above the threshold (Config.COMPLEX_MODEL)
         """
         self.current_threshold = initial_threshold
         self.min_samples = min_samples
+        self.simple_model = simple_model or Config.MODEL.name
+        self.complex_model = complex_model or Config.COMPLEX_MODEL.name
         self.calibration_history = []
 
     def suggest_threshold(self, performance_monitor: PerformanceMonitor) -> float:
@@ -266,23 +454,25 @@ class ThresholdCalibrator:
         """
         # Get performance metrics
         metrics = performance_monitor.get_model_performance_metrics()
-        complexity_dist = performance_monitor.get_complexity_distribution()
+        complexity_summary = performance_monitor.get_complexity_summary()
 
         # Check if we have enough data for meaningful calibration
-        simple_ratings = metrics.get("llama3.1:8b", {}).get("ratings", [])
-        complex_ratings = metrics.get("mistral-nemo:12b", {}).get("ratings", [])
+        simple_metrics = metrics.get(self.simple_model, {})
+        complex_metrics = metrics.get(self.complex_model, {})
+        simple_count = simple_metrics.get("count", 0)
+        complex_count = complex_metrics.get("count", 0)
 
-        if len(simple_ratings) < self.min_samples or len(complex_ratings) < self.min_samples:
+        if simple_count < self.min_samples or complex_count < self.min_samples:
             # Not enough data yet
             return self.current_threshold
 
-        # Calculate average ratings
-        simple_avg = sum(simple_ratings) / len(simple_ratings)
-        complex_avg = sum(complex_ratings) / len(complex_ratings)
+        # Average ratings
+        simple_avg = simple_metrics["avg_rating"]
+        complex_avg = complex_metrics["avg_rating"]
 
         # Get complexity distributions
-        simple_complexities = complexity_dist.get("llama3.1:8b", [])
-        complex_complexities = complexity_dist.get("mistral-nemo:12b", [])
+        simple_complexities = complexity_summary.get(self.simple_model)
+        complex_complexities = complexity_summary.get(self.complex_model)
 
         if not simple_complexities or not complex_complexities:
             return self.current_threshold
@@ -291,55 +481,34 @@ class ThresholdCalibrator:
         # This is a simplified approach - a real implementation might use more sophisticated methods
         if complex_avg > simple_avg:
             # Complex model is performing better, we might want to route more queries to it
-            # by lowering the threshold
-
-            # Find the 75th percentile of simple model complexities
-            simple_complexities.sort()
-            idx = min(int(len(simple_complexities) * 0.75), len(simple_complexities) - 1)
-            suggested = simple_complexities[idx]
-
-            # Ensure we don't make drastic changes
-            max_change = 0.05  # Maximum 5% change at once
-            delta = suggested - self.current_threshold
-            if abs(delta) > max_change:
-                delta = max_change if delta > 0 else -max_change
-
-            new_threshold = self.current_threshold + delta
-
-            # Keep threshold in reasonable bounds
-            new_threshold = max(0.1, min(0.5, new_threshold))
-
+            # by lowering the threshold towards the 75th percentile of simple model complexities
+            suggested = simple_complexities["p75"]
         else:
             # Simple model is performing better, we might want to route more queries to it
-            # by raising the threshold
-
-            # Find the 25th percentile of complex model complexities
-            complex_complexities.sort()
-            idx = min(int(len(complex_complexities) * 0.25), len(complex_complexities) - 1)
-            suggested = complex_complexities[idx]
-
-            # Ensure we don't make drastic changes
-            max_change = 0.05  # Maximum 5% change at once
-            delta = suggested - self.current_threshold
-            if abs(delta) > max_change:
-                delta = max_change if delta > 0 else -max_change
-
-            new_threshold = self.current_threshold + delta
-
-            # Keep threshold in reasonable bounds
-            new_threshold = max(0.1, min(0.5, new_threshold))
-
-        # Record this calibration event
-        self.calibration_history.append(
-            {
-                "timestamp": datetime.now().isoformat(),
-                "old_threshold": self.current_threshold,
-                "new_threshold": new_threshold,
-                "simple_avg_rating": simple_avg,
-                "complex_avg_rating": complex_avg,
-                "sample_sizes": {"simple": len(simple_ratings), "complex": len(complex_ratings)},
-            }
-        )
+            # by raising the threshold towards the 25th percentile of complex model complexities
+            suggested = complex_complexities["p25"]
+
+        # Ensure we don't make drastic changes
+        max_change = 0.05  # Maximum 5% change at once
+        delta = suggested - self.current_threshold
+        if abs(delta) > max_change:
+            delta = max_change if delta > 0 else -max_change
+
+        # Keep threshold in reasonable bounds
+        new_threshold = max(0.1, min(0.5, self.current_threshold + delta))
+
+        # Record calibration events that actually move the threshold
+        if abs(new_threshold - self.current_threshold) > 1e-6:
+            self.calibration_history.append(
+                {
+                    "timestamp": datetime.now().isoformat(),
+                    "old_threshold": self.current_threshold,
+                    "new_threshold": new_threshold,
+                    "simple_avg_rating": simple_avg,
+                    "complex_avg_rating": complex_avg,
+                    "sample_sizes": {"simple": simple_count, "complex": complex_count},
+                }
+            )
 
         self.current_threshold = new_threshold
         return new_threshold
@@ -366,6 +535,173 @@ class ThresholdCalibrator:
         return self.calibration_history.copy()
 
 
+class OutputLengthCalibrator:
+    """Learns per-query-class output caps (``num_predict``) from observed answer lengths.
+
+    Until a class has ``min_samples`` answers the complexity-based default is
+    used. After that the cap is the class's p90 output length times
+    ``headroom``. Answers that hit a cap are continued by the agent and
+    recorded with their full length, so a cap that is too small grows back.
+    """
+
+    def __init__(
+        self,
+        min_samples: int = 10,
+        headroom: float = 1.5,
+        min_tokens: int = 128,
+        max_tokens: int = 4096,
+    ):
+        """Initialize the output length calibrator.
+
+        Args:
+            min_samples: Answers per class required before learned caps are used
+            headroom: Multiplier applied to the class's p90 output length
+            min_tokens: Smallest cap ever suggested
+            max_tokens: Largest cap ever suggested
+        """
+        self.min_samples = min_samples
+        self.headroom = headroom
+        self.min_tokens = min_tokens
+        self.max_tokens = max_tokens
+
+    def suggest_cap(self, performance_monitor: PerformanceMonitor, query_class: str, default: int) -> int:
+        """Suggest ``num_predict`` for a query class.
+
+        Args:
+            performance_monitor: PerformanceMonitor with recorded response lengths
+            query_class: Query class (see DynamicComplexityRouter.query_class)
+            default: Cap to use while the class has too few samples
+
+        Returns:
+            int: Suggested output token cap
+        """
+        performance_monitor._refresh()
+        with performance_monitor.lock:
+            sketch = performance_monitor.response_sketches.get(query_class)
+            if sketch is None or sketch.count < self.min_samples:
+                return default
+            p90 = sketch.quantile(0.9)
+
+        return int(max(self.min_tokens, min(self.max_tokens, p90 * self.headroom)))
+
+
+_SENTENCE_BOUNDARY = re.compile(r"[.!?]")
+
+
+class PatternAutomaton:
+    """Matches a set of case-insensitive regex patterns against a text in one pass.
+
+    Alternatives that are plain literals (most routing keywords) are compiled
+    into an Aho-Corasick automaton, which finds every occurrence of every
+    keyword in a single scan of the text. The few alternatives that need real
+    regex features are compiled once into residual expressions. ``matches``
+    returns the keys of all patterns that ``re.search`` would have matched.
+    """
+
+    _ESCAPED_LITERAL = re.compile(r"\\([()\[\].*+?|{}^$\\])")
+    _REGEX_SYNTAX = re.compile(r"\\[a-zA-Z0-9]|[()\[\].*+?|{}^$]")
+
+    def __init__(self, patterns: Dict[Any, str]):
+        """Build the automaton.
+
+        Args:
+            patterns: Mapping of pattern key to regex pattern
+        """
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.output: List[set] = [set()]
+        residual = defaultdict(list)
+
+        for key, pattern in patterns.items():
+            for alternative in self._split_alternatives(pattern):
+                literal = self._as_literal(alternative)
+                if literal:
+                    self._add_keyword(literal.lower(), key)
+                else:
+                    residual[key].append(alternative)
+
+        self._build_failure_links()
+        self.residual = [
+            (key, re.compile("|".join(alternatives), re.IGNORECASE))
+            for key, alternatives in residual.items()
+        ]
+
+    @staticmethod
+    def _split_alternatives(pattern: str) -> List[str]:
+        """Split a pattern on top-level ``|`` (outside groups and classes)."""
+        alternatives, current, depth, in_class, escaped = [], [], 0, False, False
+        for char in pattern:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif in_class:
+                in_class = char != "]"
+            elif char == "[":
+                in_class = True
+            elif char == "(":
+                depth += 1
+            elif char == ")":
+                depth -= 1
+            elif char == "|" and depth == 0:
+                alternatives.append("".join(current))
+                current = []
+                continue
+            current.append(char)
+        alternatives.append("".join(current))
+        return alternatives
+
+    @classmethod
+    def _as_literal(cls, alternative: str) -> Optional[str]:
+        """Return the literal text an alternative matches, or None if it needs the regex engine."""
+        if cls._REGEX_SYNTAX.search(cls._ESCAPED_LITERAL.sub("", alternative)):
+            return None
+        return cls._ESCAPED_LITERAL.sub(r"\1", alternative)
+
+    def _add_keyword(self, keyword: str, key: Any) -> None:
+        state = 0
+        for char in keyword:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(set())
+            state = next_state
+        self.output[state].add(key)
+
+    def _build_failure_links(self) -> None:
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                if self.fail[next_state] == next_state:
+                    self.fail[next_state] = 0
+                self.output[next_state] |= self.output[self.fail[next_state]]
+
+    def matches(self, text: str) -> set:
+        """Keys of all patterns that occur in ``text``."""
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set()
+        state = 0
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        for key, regex in self.residual:
+            if key not in found and regex.search(text):
+                found.add(key)
+        return found
+
+
 class DynamicComplexityRouter:
     """Routes queries to appropriate models based on complexity assessment.
 
@@ -425,16 +761,13 @@ class DynamicComplexityRouter:
         self.cache = ComplexityCache()
 
         # Add performance monitor
-        logs_dir = Path("logs")
-        logs_dir.mkdir(exist_ok=True)
-        self.monitor = PerformanceMonitor(log_file=str(logs_dir / "model_performance.json"))
+        self.monitor = PerformanceMonitor(log_file=str(Path("logs") / "model_performance.jsonl"))
 
-        # Add threshold calibrator
+        # Add threshold calibrator (O(1) on the monitor's aggregates, so it runs per request)
         self.calibrator = ThresholdCalibrator(initial_threshold=threshold)
 
-        # Periodically calibrate threshold (less frequently than recording)
-        self._last_calibration = datetime.now()
-        self._calibration_interval = timedelta(days=1)  # Calibrate daily
+        # Output caps learned from answer lengths per query class
+        self.output_calibrator = OutputLengthCalibrator()
 
         # Domain-specific complexity modifiers
         self.domain_modifiers = {
@@ -472,25 +805,39 @@ class DynamicComplexityRouter:
             ],
         }
 
-    def _detect_domain(self, query: str) -> str:
+        # Every pattern of every dimension compiled once into a single automaton
+        patterns = {("patterns", i): pattern for i, pattern in enumerate(self.COMPLEX_PATTERNS)}
+        patterns.update(
+            {("sql_complexity", i): pattern for i, pattern in enumerate(self.SQL_COMPLEXITY_MARKERS)}
+        )
+        for domain, domain_patterns in self.domain_patterns.items():
+            patterns.update({(domain, i): pattern for i, pattern in enumerate(domain_patterns)})
+        self.automaton = PatternAutomaton(patterns)
+
+    def _match_counts(self, query: str) -> Dict[str, int]:
+        """Count matched patterns per dimension/domain in one pass over the query."""
+        counts = defaultdict(int)
+        for group, _ in self.automaton.matches(query):
+            counts[group] += 1
+        return counts
+
+    def _detect_domain(self, query: str, match_counts: Optional[Dict[str, int]] = None) -> str:
         """Detect the domain of the query.
 
         Args:
             query: User's natural language query
+            match_counts: Precomputed result of _match_counts for the query
 
         Returns:
             str: Detected domain or None
         """
+        if match_counts is None:
+            match_counts = self._match_counts(query)
         domain_scores = {}
 
         # Calculate score for each domain
         for domain, patterns in self.domain_patterns.items():
-            matches = 0
-            for pattern in patterns:
-                if re.search(pattern, query, re.IGNORECASE):
-                    matches += 1
-
-            domain_scores[domain] = matches / len(patterns) if len(patterns) > 0 else 0
+            domain_scores[domain] = match_counts[domain] / len(patterns) if len(patterns) > 0 else 0
 
         # Find the domain with the highest score above threshold
         best_domain = None
@@ -519,6 +866,14 @@ class DynamicComplexityRouter:
         if cached_result:
             return cached_result
 
+        result = self._score_query(query)
+        self.cache.set(query, result)
+        return result
+
+    def _score_query(self, query: str) -> Tuple[float, Dict[str, float]]:
+        """Score a query without consulting the cache (see analyze_complexity)."""
+        match_counts = self._match_counts(query)
+
         # Initialize dimension scores
         dimensions = {"length": 0.0, "patterns": 0.0, "sql_complexity": 0.0, "cognitive_load": 0.0}
 
@@ -527,21 +882,15 @@ class DynamicComplexityRouter:
         dimensions["length"] = min(token_count / 50, 1.0)  # Normalize to 0-1
 
         # 2. Pattern-based complexity
-        pattern_matches = 0
-        for pattern in self.COMPLEX_PATTERNS:
-            if re.search(pattern, query.lower()):
-                pattern_matches += 1
-        dimensions["patterns"] = min(pattern_matches / len(self.COMPLEX_PATTERNS), 1.0)
+        dimensions["patterns"] = min(match_counts["patterns"] / len(self.COMPLEX_PATTERNS), 1.0)
 
         # 3. SQL complexity estimation (for queries that include SQL snippets)
-        sql_markers = 0
-        for marker in self.SQL_COMPLEXITY_MARKERS:
-            if re.search(marker, query, re.IGNORECASE):
-                sql_markers += 1
-        dimensions["sql_complexity"] = min(sql_markers / len(self.SQL_COMPLEXITY_MARKERS), 1.0)
+        dimensions["sql_complexity"] = min(
+            match_counts["sql_complexity"] / len(self.SQL_COMPLEXITY_MARKERS), 1.0
+        )
 
         # 4. Cognitive load estimation (based on sentence complexity)
-        sentences = re.split(r"[.!?]", query)
+        sentences = _SENTENCE_BOUNDARY.split(query)
         avg_words_per_sentence = sum(len(s.split()) for s in sentences if s.strip()) / max(
             len(sentences), 1
         )
@@ -552,16 +901,12 @@ class DynamicComplexityRouter:
         overall_score = sum(score * weights[dim] for dim, score in dimensions.items())
 
         # Apply domain-specific modifiers
-        domain = self._detect_domain(query)
+        domain = self._detect_domain(query, match_counts)
         if domain and domain in self.domain_modifiers:
             modifier = self.domain_modifiers[domain]
             overall_score = min(max(overall_score + modifier, 0.0), 1.0)  # Keep in range [0, 1]
 
-        # Cache the result
-        result = (overall_score, dimensions)
-        self.cache.set(query, result)
-
-        return result
+        return (overall_score, dimensions)
 
     def should_use_complex_model(self, query: str) -> bool:
         """Determine if the query should use the complex model.
@@ -584,16 +929,13 @@ class DynamicComplexityRouter:
         Returns:
             BaseChatModel: The appropriate language model
         """
-        from manuai.models import create_llm
+        from manuai.models import get_llm
 
         # Analyze complexity
         complexity_score, _ = self.analyze_complexity(query)
 
-        # Check if threshold calibration is due
-        now = datetime.now()
-        if now - self._last_calibration >= self._calibration_interval:
-            self.threshold = self.calibrator.suggest_threshold(self.monitor)
-            self._last_calibration = now
+        # Calibrate the threshold on the latest aggregates
+        self.threshold = self.calibrator.suggest_threshold(self.monitor)
 
         # Determine which model to use
         use_complex_model = complexity_score >= self.threshold
@@ -602,11 +944,57 @@ class DynamicComplexityRouter:
         # Record the selection decision
         self.monitor.record_selection(query, complexity_score, selected_model)
 
-        # Create and return the appropriate model
+        # Shared clients: built once, connections and loaded models are reused
         if use_complex_model:
-            return create_llm(Config.COMPLEX_MODEL)
+            return get_llm(Config.COMPLEX_MODEL)
+        else:
+            return get_llm(Config.MODEL)
+
+    def query_class(self, query: str) -> str:
+        """Class of a query used for learning output lengths, e.g. ``"simple_lookup:simple"``.
+
+        Args:
+            query: User's natural language query
+
+        Returns:
+            str: Detected domain (or "general") and complexity bucket
+        """
+        from manuai.performance_config import get_performance_config
+
+        # Fixed configured thresholds, not the calibrated routing threshold: the class of a
+        # query must not change as the calibrator moves, or learned caps would scatter across buckets
+        llm_config = get_performance_config().llm
+        complexity_score, _ = self.analyze_complexity(query)
+        if complexity_score < llm_config.simple_query_threshold:
+            bucket = "simple"
+        elif complexity_score < llm_config.complex_query_threshold:
+            bucket = "moderate"
         else:
-            return create_llm(Config.MODEL)
+            bucket = "complex"
+        return f"{self._detect_domain(query) or 'general'}:{bucket}"
+
+    def suggest_output_cap(self, query: str, default: int) -> int:
+        """Output token cap for a query, learned from earlier answers of its class."""
+        return self.output_calibrator.suggest_cap(self.monitor, self.query_class(query), default)
+
+    def record_response(self, query: str, output_tokens: int, truncated: bool) -> None:
+        """Feed the length of an answer back into the output caps of its class."""
+        self.monitor.record_response(query, self.query_class(query), output_tokens, truncated)
+
+
+# Shared complexity router (patterns are compiled and the performance log is loaded once)
+_complexity_router = None
+_complexity_router_lock = threading.Lock()
+
+
+def get_complexity_router() -> DynamicComplexityRouter:
+    """Get the process-wide complexity router."""
+    global _complexity_router
+    if _complexity_router is None:
+        with _complexity_router_lock:
+            if _complexity_router is None:
+                _complexity_router = DynamicComplexityRouter()
+    return _complexity_router
 
 
 class TokenOptimizationPipeline:
@@ -705,8 +1093,7 @@ class TokenOptimizationPipeline:
             refined = re.sub(r"\b" + qualifier + r"\b", "", refined, flags=re.IGNORECASE)
 
         # Detect domain for domain-specific optimizations
-        router = DynamicComplexityRouter()
-        domain = router._detect_domain(refined)
+        domain = get_complexity_router()._detect_domain(refined)
 
         # Apply domain-specific optimizations if applicable
         if domain:
@@ -768,74 +1155,21 @@ class TokenOptimizationPipeline:
         return query
 
     def prune_conversation_context(
-        self, messages: List[Any], max_messages: int = 8, max_tokens_estimate: int = 4096
+        self, messages: List[Any], model: Optional[str] = None, max_tokens: Optional[int] = None
     ) -> List[Any]:
-        """Prune conversation context to optimize token usage.
+        """Prune conversation context to the model's prompt token budget.
 
         Args:
             messages: List of conversation messages
-            max_messages: Maximum number of messages to retain
-            max_tokens_estimate: Approximate maximum tokens to retain
+            model: Model name, used to look up its budget
+            max_tokens: Prompt token budget (overrides the model's)
 
         Returns:
             List: Pruned message list
         """
-        # Always keep system message at the beginning
-        system_messages = [msg for msg in messages if getattr(msg, "type", "") == "system"]
-        non_system_messages = [msg for msg in messages if getattr(msg, "type", "") != "system"]
+        from manuai.context_window import get_context_manager
 
-        # If we have fewer messages than max, return all
-        if len(non_system_messages) <= max_messages:
-            return messages
-
-        # Calculate message relevance scores for semantic pruning
-        last_message = non_system_messages[-1] if non_system_messages else None
-
-        # Keep the most recent message and score others for retention
-        if last_message:
-            # Simplified relevance scoring (more sophisticated would use embeddings)
-            last_message_content = getattr(last_message, "content", "")
-
-            # Score each message by their relevance to the last message
-            message_scores = []
-            for i, msg in enumerate(non_system_messages[:-1]):  # All but the last message
-                msg_content = getattr(msg, "content", "")
-
-                # Calculate text overlap-based relevance
-                # (In a production system, use embeddings for better semantic similarity)
-                words_last = set(last_message_content.lower().split())
-                words_this = set(msg_content.lower().split())
-
-                if not words_this or not words_last:
-                    relevance = 0.0
-                else:
-                    overlap = len(words_this.intersection(words_last))
-                    relevance = overlap / max(len(words_this), len(words_last))
-
-                # Recency bonus - more recent messages get a bonus
-                recency_bonus = (i + 1) / len(non_system_messages)
-
-                # Final score combines relevance and recency
-                final_score = (0.7 * relevance) + (0.3 * recency_bonus)
-                message_scores.append((i, final_score))
-
-            # Sort by score (highest first)
-            message_scores.sort(key=lambda x: x[1], reverse=True)
-
-            # Select top-scoring messages up to max_messages - 1 (save room for the last message)
-            selected_indices = [idx for idx, _ in message_scores[: max_messages - 1]]
-            selected_indices.sort()  # Keep original order
-
-            # Construct final pruned list
-            pruned_non_system = [non_system_messages[i] for i in selected_indices]
-            pruned_non_system.append(non_system_messages[-1])  # Always keep the most recent message
-
-            # Combine system messages with pruned non-system messages
-            return system_messages + pruned_non_system
-
-        # Fallback to the original pruning method
-        recent_messages = non_system_messages[-max_messages:]
-        return system_messages + recent_messages
+        return get_context_manager().fit(messages, model=model, budget=max_tokens)
 
     def optimize_model_params(self, query_complexity: float, provider: str) -> Dict[str, Any]:
         """Optimize model parameters based on query complexity and provider.
@@ -877,7 +1211,7 @@ def optimize_query_execution(
             - Optimized model parameters
     """
     # Initialize optimization components
-    router = DynamicComplexityRouter()
+    router = get_complexity_router()
     token_optimizer = TokenOptimizationPipeline()
 
     # 1. Refine the query to reduce tokens
@@ -890,15 +1224,31 @@ def optimize_query_execution(
     model = router.get_appropriate_model(optimized_query)
 
     # 4. Prune conversation history
-    pruned_history = token_optimizer.prune_conversation_context(conversation_history)
+    pruned_history = token_optimizer.prune_conversation_context(
+        conversation_history, model=getattr(model, "model", None)
+    )
 
-    # 5. Optimize model parameters
+    # 5. Optimize model parameters, capping output at what this class of query needs
     provider = "ollama"  # Always use Ollama
     optimized_params = token_optimizer.optimize_model_params(complexity_score, provider)
+    optimized_params["num_predict"] = router.suggest_output_cap(
+        optimized_query, optimized_params["num_predict"]
+    )
 
     return optimized_query, model, pruned_history, optimized_params
 
 
+def record_response_length(query: str, output_tokens: int, truncated: bool) -> None:
+    """Record how many tokens the answer to a query needed.
+
+    Args:
+        query: The query as passed to the model (the output of optimize_query_execution)
+        output_tokens: Tokens generated for the longest model turn
+        truncated: Whether a turn hit its output cap
+    """
+    get_complexity_router().record_response(query, output_tokens, truncated)
+
+
 # Add a function to record user feedback
 def record_query_feedback(query: str, rating: int, comments: Optional[str] = None) -> None:
     """Record user feedback on response quality for a query.
@@ -908,8 +1258,5 @@ def record_query_feedback(query: str, rating: int, comments: Optional[str] = Non
         rating: User rating (1-5)
         comments: Optional user comments
     """
-    # Create performance monitor and record feedback
-    logs_dir = Path("logs")
-    logs_dir.mkdir(exist_ok=True)
-    monitor = PerformanceMonitor(log_file=str(logs_dir / "model_performance.json"))
-    monitor.record_feedback(query, rating, comments)
+    # Record through the shared router's monitor so both write the same history
+    get_complexity_router().monitor.record_feedback(query, rating, comments)
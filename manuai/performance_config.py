@@ -21,17 +21,58 @@ class DatabaseOptimizationConfig:
     
     # Query Cache Settings
     query_cache_size: int = 1000
-    query_cache_ttl: int = 300  # 5 minutes
+    # Cached results are invalidated by PRAGMA data_version; a TTL (seconds) is optional
+    query_cache_ttl: Optional[int] = None
+    query_cache_max_bytes: int = 64 * 1024 * 1024  # estimated in-memory footprint
+    # Results above the threshold spill to an on-disk store (relative to APP_HOME)
+    query_cache_spill_threshold_bytes: int = 1024 * 1024
+    query_cache_spill_path: Optional[str] = "logs/query_cache.db"
+    query_cache_spill_max_bytes: int = 512 * 1024 * 1024
     
-    # Schema Cache Settings
-    schema_cache_ttl: int = 3600  # 1 hour
+    # Schema Catalog Settings
+    # Schemas are re-read when PRAGMA schema_version changes and persisted here (relative to APP_HOME)
+    schema_catalog_path: Optional[str] = "logs/schema_catalog.db"
     
+    # Table Statistics Settings
+    # Row counts come from sqlite_stat1 / MAX(rowid); exact COUNT(*)s run in the background
+    table_stats_exact_counts: bool = True
+    table_stats_workers: int = 1
+
+    # Index Advisor Settings
+    # Candidate indexes are built and timed on a scratch copy of the database
+    workload_log_size: int = 500  # distinct query fingerprints logged
+    index_advisor_runs: int = 3  # timed runs per query; the best one counts
+    index_advisor_query_timeout: float = 5.0
+    index_advisor_max_queries: int = 50
+    index_advisor_max_candidates: int = 20
+    index_advisor_min_speedup: float = 1.2
+
+    # SQL Rewriting Settings (execute_sql)
+    # Every rewrite is recorded in sql_rewrite_log_path for auditing
+    sql_rewrite_inject_limit: bool = True  # LIMIT statement_max_rows + 1 on unbounded SELECTs
+    sql_rewrite_push_down_limits: bool = True
+    sql_rewrite_narrow_select_star: bool = True
+    sql_rewrite_log_path: Optional[str] = "logs/sql_rewrites.jsonl"
+
     # SQLite Optimization Settings
     journal_mode: str = "WAL"
     synchronous: str = "NORMAL"
     cache_size: int = 10000
     temp_store: str = "MEMORY"
     
+    # Read-only Connection Settings (used by the agent tools)
+    mmap_size: int = 268435456  # 256 MB
+    # File name patterns of static snapshot databases opened with immutable=1.
+    # Only list files that are never written while the app runs.
+    immutable_databases: tuple = ()
+    
+    # Statement Budgets (enforced on tool queries through SQLite's progress handler)
+    statement_timeout: Optional[float] = None  # seconds; defaults to llm.tool_call_timeout
+    statement_max_rows: int = 500
+    statement_max_vm_steps: Optional[int] = 200_000_000
+    statement_max_result_bytes: Optional[int] = 16 * 1024  # row text handed to the model
+    progress_check_interval: int = 1000  # VM instructions between budget checks
+    
     # Performance Monitoring
     enable_performance_logging: bool = True
     log_slow_queries: bool = True
@@ -49,11 +90,27 @@ class LLMOptimizationConfig:
     # Response Generation
     max_iterations: int = 10
     tool_call_timeout: float = 30.0
-    
+
+    # Model Clients
+    model_keep_alive: str = "30m"  # how long Ollama keeps a model loaded after a request
+    model_max_connections: int = 10  # pooled keep-alive HTTP connections per client
+    model_connection_expiry: float = 300.0  # seconds an idle pooled connection is kept
+    model_request_timeout: float = 300.0  # seconds for Ollama API requests made directly (model warm-up)
+    warm_up_models: bool = True  # pre-load Config.MODEL and Config.COMPLEX_MODEL at startup
+
+    # Prompt Context
+    prompt_token_budget: int = 8192  # hard cap on prompt tokens sent with each model call
+    model_prompt_budgets: Optional[Dict[str, int]] = None  # per-model overrides, e.g. {"mistral:7b": 6144}
+    elided_tool_result_chars: int = 300  # characters of an old tool result kept when it is elided
+    prompt_trim_target: float = 0.75  # cuts go down to this share of the budget, keeping the prefix stable
+
     # Caching
     enable_response_caching: bool = True
     response_cache_size: int = 500
-    response_cache_ttl: int = 900  # 15 minutes
+    response_cache_ttl: int = 900  # 15 minutes; answers are also dropped when the database changes
+    response_cache_similarity: float = 0.8  # word similarity for near-duplicate questions (1.0: exact words only)
+    enable_plan_cache: bool = True  # replay recorded tool calls for repeated questions
+    plan_cache_size: int = 500
     
     # Performance Monitoring
     track_model_performance: bool = True
@@ -75,6 +132,12 @@ class SystemOptimizationConfig:
     # Monitoring
     enable_metrics_collection: bool = True
     metrics_retention_days: int = 7
+    metrics_max_fingerprints: int = 500  # query fingerprints with their own latency histogram
+    # Model performance event log (logs/model_performance.jsonl)
+    metrics_flush_interval: float = 1.0  # seconds between background flushes
+    metrics_flush_batch_size: int = 100
+    metrics_fsync: str = "interval"  # "always", "interval" or "never"
+    metrics_compaction_interval: int = 3600  # seconds; drops events past retention
     
     # Auto-optimization
     enable_auto_optimization: bool = True
@@ -19,7 +19,9 @@ import streamlit as st
 
 from manuai.config import Config
 from manuai.database_optimizer import get_optimizer, performance_stats
+from manuai.index_advisor import IndexAdvisor, get_workload_log
 from manuai.smart_optimizer import get_query_optimizer
+from manuai.table_statistics import get_table_statistics
 
 
 class PerformanceDashboard:
@@ -71,9 +73,47 @@ class PerformanceDashboard:
                 help="Total cache requests made"
             )
         
+        # Tail latency
+        latency = stats['latency']
+        for column, label in zip(st.columns(4), ['p50', 'p95', 'p99', 'max']):
+            with column:
+                st.metric(
+                    label=f"Query Latency {label}",
+                    value=f"{latency[label]:.3f}s",
+                    delta=None,
+                    help=f"{label} execution time of uncached queries"
+                )
+        
         # Performance chart
         if stats['queries_executed'] > 0:
             self._render_performance_chart(stats)
+            self._render_latency_breakdowns(stats)
+    
+    def _render_latency_breakdowns(self, stats: Dict[str, Any]):
+        """Render latency percentiles per database, tool and query fingerprint."""
+        breakdowns = {
+            'By Database': ('Database', stats['database_latency']),
+            'By Tool': ('Tool', stats['tool_latency']),
+            'Top Query Fingerprints': ('Query', stats['fingerprint_latency']),
+            'Time to First Token': ('Model', stats['model_calls']['time_to_first_token']),
+        }
+        for title, (key_label, breakdown) in breakdowns.items():
+            if not breakdown:
+                continue
+            with st.expander(f"⏱️ Latency {title}"):
+                latency_df = pd.DataFrame([
+                    {
+                        key_label: name,
+                        'Count': summary['count'],
+                        'p50 (s)': round(summary['p50'], 4),
+                        'p95 (s)': round(summary['p95'], 4),
+                        'p99 (s)': round(summary['p99'], 4),
+                        'Max (s)': round(summary['max'], 4),
+                        'Total (s)': round(summary['total'], 4),
+                    }
+                    for name, summary in breakdown.items()
+                ])
+                st.dataframe(latency_df, use_container_width=True, hide_index=True)
     
     def _render_performance_chart(self, stats: Dict[str, Any]):
         """Render performance visualization chart."""
@@ -114,11 +154,11 @@ class PerformanceDashboard:
                 'action': 'Review query patterns and enable caching where appropriate.'
             })
         
-        if stats['avg_query_time'] > 1.0:
+        if stats['latency']['p95'] > 1.0:
             suggestions.append({
                 'type': 'warning',
                 'title': 'Slow Query Performance',
-                'description': f'Average query time is {stats["avg_query_time"]:.3f}s which is above optimal.',
+                'description': f'p95 query time is {stats["latency"]["p95"]:.3f}s which is above optimal.',
                 'action': 'Consider adding indexes or optimizing query structure.'
             })
         
@@ -149,6 +189,41 @@ class PerformanceDashboard:
             else:
                 st.info(f"ℹ️ **{suggestion['title']}**\n\n{suggestion['description']}\n\n*Action:* {suggestion['action']}")
     
+    def render_index_advisor(self):
+        """Render index recommendations for the logged query workload."""
+        st.subheader("📇 Index Advisor")
+
+        workload = get_workload_log()
+        databases = workload.databases()
+        if not databases:
+            st.info("No queries logged yet. Recommendations are based on the queries the agent and BI dashboard run.")
+            return
+
+        db_path = st.selectbox("Database", databases, format_func=os.path.basename)
+        queries = workload.queries(db_path)
+        st.caption(
+            f"{len(queries)} distinct queries, {sum(q.executions for q in queries):,} executions, "
+            f"{sum(q.total_seconds for q in queries):.2f}s total"
+        )
+        if st.button("Recommend Indexes"):
+            with st.spinner("Timing candidate indexes on a scratch copy of the database..."):
+                recommendations = IndexAdvisor.from_config(db_path).recommend(queries)
+            if recommendations:
+                st.dataframe(pd.DataFrame([
+                    {
+                        "Table": r.table,
+                        "Columns": ", ".join(r.columns),
+                        "Time Saved": f"{r.time_saved * 1000:.0f}ms",
+                        "Speedup": f"{r.speedup:.1f}x",
+                        "Queries": r.queries,
+                        "Build Time": f"{r.build_seconds * 1000:.0f}ms",
+                    }
+                    for r in recommendations
+                ]), use_container_width=True, hide_index=True)
+                st.code(";\n".join(r.statement for r in recommendations) + ";", language='sql')
+            else:
+                st.success("No index measurably speeds up the logged workload.")
+
     def render_database_health(self):
         """Render database health metrics."""
         st.subheader("🏥 Database Health")
@@ -158,12 +233,12 @@ class PerformanceDashboard:
             tables = self.optimizer.get_all_tables_cached()
             
             if tables:
+                # Estimates until the background exact counts are in
+                row_counts = get_table_statistics().row_counts(tables)
                 table_info = []
                 for table in tables:
                     try:
-                        # Get row count
-                        count_result = self.optimizer.execute_cached_query(f"SELECT COUNT(*) FROM {table}")
-                        row_count = count_result[0][0] if count_result else 0
+                        row_count = row_counts[table]
                         
                         # Get schema info
                         schema = self.optimizer.get_table_schema_cached(table)
@@ -171,14 +246,16 @@ class PerformanceDashboard:
                         
                         table_info.append({
                             'Table': table,
-                            'Rows': row_count,
+                            'Rows': row_count.count if row_count.count is not None else 'Unknown',
+                            'Exact': '✅' if row_count.exact else f'≈ {row_count.source}',
                             'Columns': column_count,
-                            'Status': '✅ Healthy' if row_count > 0 else '⚠️ Empty'
+                            'Status': '✅ Healthy' if row_count.count else '⚠️ Empty' if row_count.count == 0 else '❔ Unknown'
                         })
                     except Exception as e:
                         table_info.append({
                             'Table': table,
                             'Rows': 'Error',
+                            'Exact': 'Error',
                             'Columns': 'Error',
                             'Status': f'❌ Error: {str(e)[:30]}...'
                         })
@@ -242,7 +319,7 @@ class PerformanceDashboard:
         )
         
         if query.strip():
-            col1, col2 = st.columns(2)
+            col1, col2, col3 = st.columns(3)
             
             with col1:
                 if st.button("Analyze Query"):
@@ -268,6 +345,16 @@ class PerformanceDashboard:
                     else:
                         st.error("Could not retrieve execution plan.")
 
+            with col3:
+                if st.button("Suggest Indexes"):
+                    with st.spinner("Timing candidate indexes on a scratch copy of the database..."):
+                        statements = self.query_optimizer.suggest_indexes(query)
+                    if statements:
+                        st.subheader("Suggested Indexes:")
+                        st.code(";\n".join(statements) + ";", language='sql')
+                    else:
+                        st.success("No index measurably speeds up this query.")
+
 
 def render_business_intelligence_dashboard():
     """Render business intelligence dashboard."""
@@ -397,6 +484,7 @@ def render_performance_dashboard():
     
     with tabs[1]:
         dashboard.render_optimization_suggestions()
+        dashboard.render_index_advisor()
     
     with tabs[2]:
         dashboard.render_database_health()
@@ -0,0 +1,182 @@
+"""
+Tool plan cache for ManuAI.
+
+This module provides:
+1. Recording of the tool calls that answered a question successfully
+2. Lookup of a recorded plan by question, database and schema version
+3. Result digests, so a replay whose results did not change reuses the answer
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from langchain_core.messages import BaseMessage, ToolMessage
+
+from manuai.answer_cache import is_follow_up, question_day, question_signature
+from manuai.database_optimizer import database_identity, get_pool
+from manuai.performance_config import get_performance_config
+
+# Tools whose results an answer is built from; exploration (list/describe/sample) is only
+# replayed when a plan has nothing else
+DATA_TOOLS = frozenset({"execute_sql", "get_db_stats", "analyze_business_question_tool"})
+
+
+def result_digest(content: Any) -> str:
+    """Digest of a tool result, to tell whether a replay returned the same data."""
+    return hashlib.sha1(str(content).encode()).hexdigest()
+
+
+def is_tool_error(message: ToolMessage) -> bool:
+    """Whether a tool result reports an error (tools return "Error ..." strings)."""
+    return str(message.content).startswith("Error")
+
+
+class ToolPlan(NamedTuple):
+    """Tool calls that answered a question, grouped by model turn."""
+
+    steps: List[List[Dict[str, Any]]]  # tool calls (name, args, id) of each turn
+    digests: List[str]  # result digest of every call, in order
+    answer: str  # final answer given for those results
+
+
+class PlanCache:
+    """Cache of tool plans keyed by question, database and schema version.
+
+    Only successful calls are recorded, and only the turns that fetched data
+    (``DATA_TOOLS``) when there are any: schema exploration and failed SQL
+    attempts are what the model needed to find the query, not to answer it.
+
+    Plans stay valid across data changes, since the SQL is re-executed on
+    replay, and are keyed by ``PRAGMA schema_version`` so they are dropped
+    with the schema they were written for. Questions are matched by their
+    stemmed content words in order (see ``manuai.answer_cache``).
+    """
+
+    def __init__(self, max_size: int = 500):
+        """Initialize the plan cache.
+
+        Args:
+            max_size: Maximum number of cached plans
+        """
+        self.cache: OrderedDict = OrderedDict()
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "recorded": 0, "unchanged_replays": 0}
+
+    def _generate_key(self, question: str, db_identity: str, schema_version: int) -> tuple:
+        # Word order matters: "from chicago to denver" must not replay "from denver to chicago"
+        signature = question_signature(question)
+        return (db_identity, schema_version, signature.terms, question_day(signature.text))
+
+    def get(
+        self, question: str, history: List[BaseMessage], db_identity: str, schema_version: int
+    ) -> Optional[ToolPlan]:
+        """Get the recorded plan for a question, or None.
+
+        Args:
+            question: User's natural language question
+            history: Conversation before the question
+            db_identity: Identity of the database the question is asked about
+            schema_version: Current schema version of that database
+
+        Returns:
+            Optional[ToolPlan]: Recorded plan or None
+        """
+        if is_follow_up(question, history):
+            return None
+        key = self._generate_key(question, db_identity, schema_version)
+        with self.lock:
+            plan = self.cache.get(key)
+            if plan is None:
+                self._stats["misses"] += 1
+                return None
+            self.cache.move_to_end(key)
+            self._stats["hits"] += 1
+            return plan
+
+    def record(
+        self,
+        question: str,
+        history: List[BaseMessage],
+        db_identity: str,
+        schema_version: int,
+        trace: List[Tuple[List[Dict[str, Any]], List[ToolMessage]]],
+        answer: str,
+    ) -> None:
+        """Record the tool calls that answered a question.
+
+        Args:
+            question: User's natural language question
+            history: Conversation before the question
+            db_identity: Identity of the database the question was asked about
+            schema_version: Schema version of that database
+            trace: (tool calls, tool results) of every tool turn, in order
+            answer: Final answer given to the user
+        """
+        if not answer.strip() or is_follow_up(question, history):
+            return
+        steps, digests = [], []
+        data_only = any(call["name"] in DATA_TOOLS for calls, _ in trace for call in calls)
+        for calls, results in trace:
+            kept = [
+                (call, result)
+                for call, result in zip(calls, results)
+                if not is_tool_error(result) and (call["name"] in DATA_TOOLS or not data_only)
+            ]
+            if kept:
+                steps.append([{"name": call["name"], "args": call["args"], "id": call["id"]} for call, _ in kept])
+                digests.extend(result_digest(result.content) for _, result in kept)
+        if not steps:
+            return
+
+        key = self._generate_key(question, db_identity, schema_version)
+        with self.lock:
+            self.cache[key] = ToolPlan(steps, digests, answer)
+            self.cache.move_to_end(key)
+            self._stats["recorded"] += 1
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+
+    def record_unchanged_replay(self):
+        """Count a replay whose results matched the recorded ones."""
+        with self.lock:
+            self._stats["unchanged_replays"] += 1
+
+    def clear(self):
+        """Drop every recorded plan."""
+        with self.lock:
+            self.cache.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get plan cache statistics."""
+        with self.lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "entries": len(self.cache),
+                "max_size": self.max_size,
+                **self._stats,
+                "hit_ratio": f"{self._stats['hits'] / lookups * 100 if lookups else 0:.1f}%",
+            }
+
+
+def schema_state(db_path: Optional[str] = None) -> Tuple[str, int]:
+    """Identity and current schema version of a database, as used for plan cache keys."""
+    pool = get_pool(db_path, readonly=True)
+    return database_identity(pool.db_path), pool.schema_version()
+
+
+# Global plan cache
+_plan_cache = None
+_plan_cache_lock = threading.Lock()
+
+
+def get_plan_cache() -> PlanCache:
+    """Get global plan cache."""
+    global _plan_cache
+    if _plan_cache is None:
+        with _plan_cache_lock:
+            if _plan_cache is None:
+                _plan_cache = PlanCache(get_performance_config().llm.plan_cache_size)
+    return _plan_cache
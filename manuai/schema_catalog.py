@@ -0,0 +1,346 @@
+"""
+Schema catalog for ManuAI.
+
+This module provides:
+1. A versioned snapshot of a database's tables, columns, indexes and foreign
+   keys, read once per ``PRAGMA schema_version``
+2. An on-disk store of those snapshots keyed by database file identity, so a
+   restart does not repeat hundreds of PRAGMA round trips
+3. Row estimates from ``sqlite_stat1``, reloaded whenever the data changes
+
+The tools, the schema index, SmartQueryOptimizer, the BI engine and the
+dashboards all read the schema through ``get_schema_catalog``.
+"""
+
+import marshal
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from manuai.config import Config
+from manuai.database_optimizer import (DatabasePool, database_identity,
+                                       get_pool, pooled_cursor)
+from manuai.performance_config import get_performance_config
+
+_WITHOUT_ROWID_PATTERN = re.compile(r"\)\s*WITHOUT\s+ROWID\s*;?\s*$", re.IGNORECASE)
+
+# Bump when the payload layout changes; older payloads are rebuilt
+CATALOG_FORMAT = 1
+
+
+class ColumnInfo(NamedTuple):
+    """A column as listed by PRAGMA table_info."""
+
+    name: str
+    type: str
+    primary_key: int  # position in the primary key, 0 if not part of it
+    not_null: bool = False
+    default: Optional[str] = None
+
+
+class ForeignKey(NamedTuple):
+    """A foreign key as listed by PRAGMA foreign_key_list."""
+
+    column: str
+    table: str  # referenced table
+    ref_column: Optional[str]
+
+
+class IndexInfo(NamedTuple):
+    """An index as listed by PRAGMA index_list and PRAGMA index_info."""
+
+    name: str
+    columns: Tuple[str, ...]
+    unique: bool
+    partial: bool
+
+
+class TableSchema(NamedTuple):
+    """Columns, foreign keys and indexes of one table."""
+
+    name: str
+    columns: List[ColumnInfo]
+    foreign_keys: List[ForeignKey]
+    indexes: List[IndexInfo]
+    without_rowid: bool
+
+
+class SchemaCatalog:
+    """Schema of one database at one ``PRAGMA schema_version``.
+
+    Table lookups are case-insensitive, like SQLite's. ``row_estimates``
+    holds the row count ``sqlite_stat1`` records for each analyzed table; it
+    is left empty for databases that were never analyzed.
+    """
+
+    def __init__(self, identity: str, schema_version: int, tables: Dict[str, TableSchema]):
+        """Initialize the schema catalog.
+
+        Args:
+            identity: Identity of the database file (see ``database_identity``)
+            schema_version: PRAGMA schema_version the schema was read at
+            tables: Schema of every table, in sqlite_master order
+        """
+        self.identity = identity
+        self.schema_version = schema_version
+        self.tables = tables
+        self.table_names = list(tables)
+        self.row_estimates: Dict[str, int] = {}
+        self._by_lower_name = {name.lower(): name for name in tables}
+        self._estimates_data_version: Optional[int] = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def build(cls, db_path: Optional[str] = None) -> "SchemaCatalog":
+        """Read the schema of a database."""
+        pool = get_pool(db_path, readonly=True)
+        tables: Dict[str, TableSchema] = {}
+        with pooled_cursor(pool.db_path, readonly=True) as cursor:
+            schema_version = cursor.execute("PRAGMA schema_version").fetchone()[0]
+            cursor.execute(
+                "SELECT name, sql FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+            )
+            for name, sql in cursor.fetchall():
+                quoted = quote_identifier(name)
+                cursor.execute(f"PRAGMA table_info({quoted})")
+                columns = [ColumnInfo(row[1], row[2] or "", row[5], bool(row[3]), row[4]) for row in cursor.fetchall()]
+                cursor.execute(f"PRAGMA foreign_key_list({quoted})")
+                foreign_keys = [ForeignKey(row[3], row[2], row[4]) for row in cursor.fetchall()]
+                indexes = []
+                for row in cursor.execute(f"PRAGMA index_list({quoted})").fetchall():
+                    index_columns = cursor.execute(f"PRAGMA index_info({quote_identifier(row[1])})").fetchall()
+                    indexes.append(IndexInfo(row[1], tuple(c[2] or "" for c in index_columns), bool(row[2]), bool(row[4])))
+                without_rowid = bool(sql and _WITHOUT_ROWID_PATTERN.search(sql))
+                tables[name] = TableSchema(name, columns, foreign_keys, indexes, without_rowid)
+        return cls(database_identity(pool.db_path), schema_version, tables)
+
+    def resolve(self, table: str) -> Optional[str]:
+        """Exact name of a table, matched case-insensitively (None if there is no such table)."""
+        return table if table in self.tables else self._by_lower_name.get(table.strip().strip('"`[]').lower())
+
+    def table(self, table: str) -> Optional[TableSchema]:
+        """Schema of a table, or None if there is no such table."""
+        name = self.resolve(table)
+        return self.tables[name] if name is not None else None
+
+    def has_table(self, table: str) -> bool:
+        """Whether the database has a table of that name."""
+        return self.resolve(table) is not None
+
+    def row_estimate(self, table: str) -> Optional[int]:
+        """Row count recorded by ANALYZE for a table, or None if it was not analyzed."""
+        name = self.resolve(table)
+        return self.row_estimates.get(name) if name is not None else None
+
+    def refresh_row_estimates(self, pool: DatabasePool):
+        """Reload ``sqlite_stat1`` row estimates if the data changed since they were read.
+
+        ANALYZE only bumps ``schema_version`` the first time it creates
+        ``sqlite_stat1``, so estimates follow ``data_version`` instead.
+        """
+        data_version = pool.data_version()
+        with self.lock:
+            if data_version == self._estimates_data_version:
+                return
+            estimates: Dict[str, int] = {}
+            with pooled_cursor(pool.db_path, readonly=True) as cursor:
+                cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='sqlite_stat1'")
+                if cursor.fetchone():
+                    # The first stat field is the row count of the index; a partial
+                    # index covers fewer rows than its table, so take the largest
+                    cursor.execute("SELECT tbl, stat FROM sqlite_stat1")
+                    for table, stat in cursor.fetchall():
+                        count = stat.split()[0] if stat else ""
+                        if count.isdigit():
+                            estimates[table] = max(estimates.get(table, 0), int(count))
+            self.row_estimates = estimates
+            self._estimates_data_version = data_version
+
+    def to_payload(self) -> bytes:
+        """Serialize the schema (without row estimates) for the catalog store."""
+        return marshal.dumps((
+            CATALOG_FORMAT,
+            [
+                (
+                    table.name,
+                    [tuple(column) for column in table.columns],
+                    [tuple(key) for key in table.foreign_keys],
+                    [tuple(index) for index in table.indexes],
+                    table.without_rowid,
+                )
+                for table in self.tables.values()
+            ],
+        ))
+
+    @classmethod
+    def from_payload(cls, identity: str, schema_version: int, payload: bytes) -> Optional["SchemaCatalog"]:
+        """Deserialize a schema written by ``to_payload`` (None if it is unreadable or outdated)."""
+        try:
+            catalog_format, tables = marshal.loads(payload)
+            if catalog_format != CATALOG_FORMAT:
+                return None
+            return cls(identity, schema_version, {
+                name: TableSchema(
+                    name,
+                    [ColumnInfo(*column) for column in columns],
+                    [ForeignKey(*key) for key in foreign_keys],
+                    [IndexInfo(index[0], tuple(index[1]), index[2], index[3]) for index in indexes],
+                    without_rowid,
+                )
+                for name, columns, foreign_keys, indexes, without_rowid in tables
+            })
+        except (EOFError, ValueError, TypeError):
+            return None
+
+
+def quote_identifier(name: str) -> str:
+    """Quote a table or index name for use in SQL."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+class SchemaCatalogStore:
+    """On-disk SQLite store of schema catalogs, one per database file.
+
+    Only the latest schema version of each database is kept.
+    """
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        self.lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS catalogs ("
+                "identity TEXT PRIMARY KEY, schema_version INTEGER, built REAL, payload BLOB)"
+            )
+        return self._conn
+
+    def get(self, identity: str, schema_version: int) -> Optional[SchemaCatalog]:
+        with self.lock:
+            row = self._connection().execute(
+                "SELECT payload FROM catalogs WHERE identity = ? AND schema_version = ?",
+                (identity, schema_version),
+            ).fetchone()
+        if row is None:
+            return None
+        return SchemaCatalog.from_payload(identity, schema_version, row[0])
+
+    def set(self, catalog: SchemaCatalog):
+        payload = catalog.to_payload()
+        with self.lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO catalogs VALUES (?, ?, ?, ?)",
+                (catalog.identity, catalog.schema_version, time.time(), payload),
+            )
+            conn.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            count, size = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM catalogs"
+            ).fetchone()
+            return {"path": self.path, "entries": count, "bytes": size}
+
+    def clear(self):
+        with self.lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM catalogs")
+            conn.commit()
+
+
+class SchemaCatalogRegistry:
+    """Process-wide schema catalogs, loaded lazily per database.
+
+    A lookup checks ``PRAGMA schema_version`` and returns the catalog in
+    memory if it is current, else the one in the store, else reads the schema
+    and stores it.
+    """
+
+    def __init__(self, store: Optional[SchemaCatalogStore] = None, max_catalogs: int = 8):
+        self.store = store
+        self.max_catalogs = max_catalogs
+        self.catalogs: OrderedDict = OrderedDict()  # identity -> SchemaCatalog
+        self.lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "store_hits": 0, "builds": 0}
+
+    def get(self, db_path: Optional[str] = None) -> SchemaCatalog:
+        pool = get_pool(db_path, readonly=True)
+        identity = database_identity(pool.db_path)
+        schema_version = pool.schema_version()
+        with self.lock:
+            catalog = self.catalogs.get(identity)
+            if catalog is not None and catalog.schema_version == schema_version:
+                self._stats["memory_hits"] += 1
+                self.catalogs.move_to_end(identity)
+            else:
+                catalog = None
+        if catalog is not None:
+            catalog.refresh_row_estimates(pool)
+            return catalog
+
+        # Load or build without the lock, so lookups of other databases are not blocked
+        catalog = self.store.get(identity, schema_version) if self.store is not None else None
+        if catalog is not None:
+            source = "store_hits"
+        else:
+            catalog = SchemaCatalog.build(pool.db_path)
+            source = "builds"
+            if self.store is not None:
+                self.store.set(catalog)
+
+        with self.lock:
+            self._stats[source] += 1
+            current = self.catalogs.get(identity)
+            if current is not None and current.schema_version == catalog.schema_version:
+                # Another thread published the same version first; share its catalog
+                catalog = current
+            self.catalogs[identity] = catalog
+            self.catalogs.move_to_end(identity)
+            while len(self.catalogs) > self.max_catalogs:
+                self.catalogs.popitem(last=False)
+        catalog.refresh_row_estimates(pool)
+        return catalog
+
+    def clear(self):
+        """Drop the catalogs held in memory; the store is kept."""
+        with self.lock:
+            self.catalogs.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            stats = {**self._stats, "catalogs": len(self.catalogs)}
+        if self.store is not None:
+            stats["store"] = self.store.get_stats()
+        return stats
+
+
+# Global schema catalog registry
+_catalog_registry = None
+_catalog_registry_lock = threading.Lock()
+
+
+def get_catalog_registry() -> SchemaCatalogRegistry:
+    """Get global schema catalog registry."""
+    global _catalog_registry
+    if _catalog_registry is None:
+        with _catalog_registry_lock:
+            if _catalog_registry is None:
+                catalog_path = get_performance_config().database.schema_catalog_path
+                store = SchemaCatalogStore(Config.Path.APP_HOME / catalog_path) if catalog_path else None
+                _catalog_registry = SchemaCatalogRegistry(store)
+    return _catalog_registry
+
+
+def get_schema_catalog(db_path: Optional[str] = None) -> SchemaCatalog:
+    """Get the schema catalog of a database (default database if omitted)."""
+    return get_catalog_registry().get(db_path)
@@ -0,0 +1,222 @@
+"""
+Schema retrieval for ManuAI.
+
+This module provides:
+1. A per-database index of the tables, columns and foreign keys of the
+   schema catalog (see ``manuai.schema_catalog``)
+2. BM25 ranking of tables against a question over table and column names
+3. Foreign-key propagation, so tables joined to strong matches rank higher
+4. Compact one-line table descriptions (columns, keys, references and
+   approximate row counts) for the model
+
+The index is built once per database and only rebuilt when PRAGMA
+schema_version changes.
+"""
+
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from manuai.answer_cache import FILLER_WORDS, stem_word
+from manuai.schema_catalog import (ColumnInfo, ForeignKey, SchemaCatalog,
+                                   get_schema_catalog)
+from manuai.table_statistics import RowCount
+
+_IDENTIFIER_PATTERN = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+# Table name words count this many times as much as column name words
+TABLE_NAME_WEIGHT = 3
+
+# Abbreviations common in schema names; tables are also indexed under the spelled-out words
+ABBREVIATIONS = {
+    "bom": "bill of material",
+    "po": "purchase order",
+    "so": "sales order",
+    "qc": "quality control",
+    "qty": "quantity",
+    "kpi": "key performance indicator",
+    "mrp": "material requirement planning",
+    "mps": "master production schedule",
+    "nc": "non conformance",
+    "wo": "work order",
+    "emp": "employee",
+    "cust": "customer",
+    "inv": "inventory",
+    "amt": "amount",
+}
+
+
+def identifier_terms(text: str) -> List[str]:
+    """Split identifiers and text into stemmed lowercase words (snake_case and camelCase aware)."""
+    return [
+        stem_word(word)
+        for word in (match.lower() for match in _IDENTIFIER_PATTERN.findall(text))
+        if word not in FILLER_WORDS
+    ]
+
+
+def _expand(terms: List[str]) -> List[str]:
+    expanded = list(terms)
+    for term in terms:
+        if term in ABBREVIATIONS:
+            expanded.extend(identifier_terms(ABBREVIATIONS[term]))
+    return expanded
+
+
+class SchemaIndex:
+    """BM25 index over the table and column names of one database.
+
+    Each table is a document made of its name (weighted ``TABLE_NAME_WEIGHT``)
+    and its column names. A table's final score adds ``fk_weight`` times the
+    best BM25 scores of the tables it is joined to by a foreign key, in either
+    direction, so link tables such as ``sales_order_items`` surface along with
+    ``sales_orders`` and ``products``.
+    """
+
+    def __init__(
+        self,
+        tables: Dict[str, List[ColumnInfo]],
+        foreign_keys: Dict[str, List[ForeignKey]],
+        k1: float = 1.2,
+        b: float = 0.75,
+        fk_weight: float = 0.3,
+    ):
+        """Initialize the schema index.
+
+        Args:
+            tables: Columns of every table
+            foreign_keys: Foreign keys of every table
+            k1: BM25 term frequency saturation
+            b: BM25 document length normalization
+            fk_weight: Share of a joined table's score added to a table's score
+        """
+        self.tables = tables
+        self.foreign_keys = foreign_keys
+        self._by_lower_name = {table.lower(): table for table in tables}
+        self.k1 = k1
+        self.b = b
+        self.fk_weight = fk_weight
+
+        self.documents: Dict[str, Counter] = {}
+        for table, columns in tables.items():
+            terms = _expand(identifier_terms(table)) * TABLE_NAME_WEIGHT
+            for column in columns:
+                terms.extend(_expand(identifier_terms(column.name)))
+            self.documents[table] = Counter(terms)
+        self.lengths = {table: sum(terms.values()) for table, terms in self.documents.items()}
+        self.average_length = sum(self.lengths.values()) / max(len(self.lengths), 1)
+
+        # Inverted index with document frequencies
+        self.postings: Dict[str, List[str]] = {}
+        for table, terms in self.documents.items():
+            for term in terms:
+                self.postings.setdefault(term, []).append(table)
+
+        # Foreign keys as an undirected graph, and the columns referencing each table
+        self.neighbors: Dict[str, set] = {table: set() for table in tables}
+        self.referenced_by: Dict[str, List[str]] = {table: [] for table in tables}
+        for table, keys in foreign_keys.items():
+            for key in keys:
+                if key.table in self.neighbors and key.table != table:
+                    self.neighbors[table].add(key.table)
+                    self.neighbors[key.table].add(table)
+                    self.referenced_by[key.table].append(f"{table}.{key.column}")
+
+    @classmethod
+    def from_catalog(cls, catalog: SchemaCatalog) -> "SchemaIndex":
+        """Index the schema catalog of a database."""
+        return cls(
+            {name: table.columns for name, table in catalog.tables.items()},
+            {name: table.foreign_keys for name, table in catalog.tables.items()},
+        )
+
+    def resolve(self, table: str) -> Optional[str]:
+        """Exact name of a table, matched case-insensitively (None if there is no such table)."""
+        return table if table in self.tables else self._by_lower_name.get(table.strip().strip('"`[]').lower())
+
+    def _bm25(self, terms: List[str]) -> Dict[str, float]:
+        scores: Dict[str, float] = {}
+        n_tables = len(self.documents)
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_tables - len(postings) + 0.5) / (len(postings) + 0.5))
+            for table in postings:
+                frequency = self.documents[table][term]
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[table] / self.average_length)
+                scores[table] = scores.get(table, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return scores
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[str, float]]:
+        """Rank tables for a question.
+
+        Args:
+            query: Question or keywords
+            top_k: Number of tables to return
+
+        Returns:
+            List of (table, score), best first
+        """
+        scores = self._bm25(identifier_terms(query))
+        if not scores:
+            return []
+
+        ranked = dict(scores)
+        for table in set(scores) | {n for table in scores for n in self.neighbors[table]}:
+            joined = sorted((scores.get(n, 0.0) for n in self.neighbors[table]), reverse=True)[:2]
+            ranked[table] = scores.get(table, 0.0) + self.fk_weight * sum(joined)
+        return sorted(ranked.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+
+    def describe(self, table: str, max_columns: int = 40, row_count: Optional[RowCount] = None) -> str:
+        """One-line DDL-style description of a table.
+
+        For example ``sales_orders(id INTEGER PK, customer_id INTEGER NOT NULL
+        -> customers.id, ...) ~1,200 rows; referenced by shipments.sales_order_id``.
+        """
+        references = {key.column: key for key in self.foreign_keys.get(table, [])}
+        parts = []
+        for column in self.tables[table][:max_columns]:
+            part = f"{column.name} {column.type}".strip()
+            if column.primary_key:
+                part += " PK"
+            elif column.not_null:
+                part += " NOT NULL"
+            key = references.get(column.name)
+            if key is not None:
+                part += f" -> {key.table}.{key.ref_column or 'rowid'}"
+            parts.append(part)
+        if len(self.tables[table]) > max_columns:
+            parts.append(f"... {len(self.tables[table]) - max_columns} more")
+
+        description = f"{table}({', '.join(parts)})"
+        if row_count is not None and row_count.count is not None:
+            description += f" {row_count} rows"
+        referenced_by = self.referenced_by.get(table) or []
+        if referenced_by:
+            description += f"; referenced by {', '.join(referenced_by[:10])}"
+            if len(referenced_by) > 10:
+                description += f" and {len(referenced_by) - 10} more"
+        return description
+
+
+# Schema indexes keyed by database identity and schema version
+MAX_SCHEMA_INDEXES = 8
+_schema_indexes: OrderedDict = OrderedDict()
+_schema_indexes_lock = threading.Lock()
+
+
+def get_schema_index(db_path: Optional[str] = None) -> SchemaIndex:
+    """Get the schema index of a database, rebuilt when its schema changes."""
+    catalog = get_schema_catalog(db_path)
+    key = (catalog.identity, catalog.schema_version)
+    with _schema_indexes_lock:
+        index = _schema_indexes.get(key)
+        if index is None:
+            index = _schema_indexes[key] = SchemaIndex.from_catalog(catalog)
+            if len(_schema_indexes) > MAX_SCHEMA_INDEXES:
+                _schema_indexes.popitem(last=False)
+        _schema_indexes.move_to_end(key)
+        return index
@@ -6,10 +6,22 @@ and database-specific optimizations for better performance.
 """
 
 import re
+import sqlite3
+import threading
+from collections import OrderedDict
 from dataclasses import dataclass
 from typing import Dict, List, Optional, Tuple
 
 from manuai.database_optimizer import get_optimizer
+from manuai.index_advisor import IndexAdvisor
+from manuai.logging import log
+from manuai.performance_config import get_performance_config
+from manuai.schema_catalog import get_schema_catalog
+from manuai.sql_rewriter import SQLRewriter
+from manuai.table_statistics import get_table_statistics
+
+# Queries whose index suggestions are kept per database and schema version
+MAX_INDEX_SUGGESTIONS = 100
 
 
 @dataclass
@@ -28,6 +40,8 @@ class SmartQueryOptimizer:
     def __init__(self):
         self.optimizer = get_optimizer()
         self.common_patterns = self._load_optimization_patterns()
+        self._index_suggestions: OrderedDict = OrderedDict()  # (identity, schema_version, query) -> statements
+        self._index_lock = threading.Lock()
     
     def _load_optimization_patterns(self) -> Dict[str, Dict]:
         """Load common query optimization patterns."""
@@ -35,7 +49,7 @@ class SmartQueryOptimizer:
             "missing_limit": {
                 "pattern": r"SELECT\s+.*?\s+FROM\s+\w+(?:\s+WHERE\s+.+)?(?:\s+ORDER\s+BY\s+.+)?$",
                 "suggestion": "Consider adding LIMIT clause for large result sets",
-                "fix": lambda q: f"{q} LIMIT 100" if "LIMIT" not in q.upper() else q
+                "fix": lambda q: SQLRewriter(push_down_limits=False, narrow_select_star=False).rewrite(q, row_limit=100).sql
             },
             "inefficient_like": {
                 "pattern": r"WHERE\s+\w+\s+LIKE\s+['\"]%.*?%['\"]",
@@ -92,9 +106,7 @@ class SmartQueryOptimizer:
         # Check if tables exist and get their stats
         for table in tables:
             try:
-                # Get table info
-                schema = self.optimizer.get_table_schema_cached(table)
-                if schema:
+                if get_schema_catalog().has_table(table):
                     # Check for large tables without LIMIT
                     row_count = self._estimate_table_size(table)
                     if row_count > 1000 and "LIMIT" not in query.upper():
@@ -111,30 +123,37 @@ class SmartQueryOptimizer:
         return optimizations
     
     def _estimate_table_size(self, table_name: str) -> int:
-        """Estimate the size of a table."""
+        """Estimate the size of a table from the table statistics service."""
         try:
-            result = self.optimizer.execute_cached_query(f"SELECT COUNT(*) FROM {table_name}")
-            return result[0][0] if result else 0
+            return get_table_statistics().row_count(table_name).count or 0
         except Exception:
             return 0
     
-    def suggest_indexes(self, query: str) -> List[str]:
-        """Suggest indexes that might improve query performance."""
-        suggestions = []
-        
-        # Look for WHERE clauses
-        where_pattern = r"WHERE\s+(\w+)\s*[=<>!]"
-        for match in re.finditer(where_pattern, query, re.IGNORECASE):
-            column = match.group(1)
-            suggestions.append(f"CREATE INDEX IF NOT EXISTS idx_{column} ON table_name({column})")
-        
-        # Look for ORDER BY clauses
-        order_pattern = r"ORDER\s+BY\s+(\w+)"
-        for match in re.finditer(order_pattern, query, re.IGNORECASE):
-            column = match.group(1)
-            suggestions.append(f"CREATE INDEX IF NOT EXISTS idx_{column}_order ON table_name({column})")
-        
-        return suggestions
+    def suggest_indexes(self, query: str, db_path: Optional[str] = None) -> List[str]:
+        """Suggest indexes that measurably speed up a query.
+
+        Candidates are timed on a scratch copy of the database (see
+        ``IndexAdvisor``); only those that pay off are returned. Results are
+        kept per database and ``schema_version``, so the copy is made once per
+        query until the schema changes.
+        """
+        try:
+            catalog = get_schema_catalog(db_path)
+            key = (catalog.identity, catalog.schema_version, " ".join(query.split()))
+            with self._index_lock:
+                if key in self._index_suggestions:
+                    self._index_suggestions.move_to_end(key)
+                    return list(self._index_suggestions[key])
+            recommendations = IndexAdvisor.from_config(db_path).recommend([query])
+        except (sqlite3.Error, OSError) as e:
+            log(f"[red]Index advisor failed: {str(e)}[/red]")
+            return []
+        statements = [recommendation.statement for recommendation in recommendations]
+        with self._index_lock:
+            self._index_suggestions[key] = statements
+            while len(self._index_suggestions) > MAX_INDEX_SUGGESTIONS:
+                self._index_suggestions.popitem(last=False)
+        return list(statements)
     
     def get_query_execution_plan(self, query: str) -> Optional[str]:
         """Get the execution plan for a query."""
@@ -159,10 +178,10 @@ class SmartQueryOptimizer:
         optimized_query = user_query
         suggestions = []
         
-        # Pattern 1: "Show me all X" -> Add LIMIT
+        # Pattern 1: "Show me all X" -> execute_sql adds the LIMIT to the SQL itself
         if re.search(r"show\s+me\s+all\s+", user_query, re.IGNORECASE):
-            suggestions.append("Consider limiting results for better performance")
-            optimized_query = f"{user_query} (suggest adding LIMIT)"
+            max_rows = get_performance_config().database.statement_max_rows
+            suggestions.append(f"Large results are limited to {max_rows} rows; ask for a summary to see everything")
         
         # Pattern 2: "Find customers named X" -> Use indexed search
         if re.search(r"find\s+\w+\s+named\s+", user_query, re.IGNORECASE):
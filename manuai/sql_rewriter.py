@@ -0,0 +1,549 @@
+"""
+SQL rewriting for ManuAI.
+
+This module provides:
+1. A LIMIT on unbounded SELECTs (or a tighter one), so SQLite stops after the
+   rows the statement budget would keep anyway
+2. Pushdown of an outer ``ORDER BY ... LIMIT`` into the subquery it reads from
+3. Narrowing of ``SELECT *`` in subqueries and CTEs to the columns the rest
+   of the statement references
+4. An audit log of every rewrite (``logs/sql_rewrites.jsonl``)
+
+``execute_sql`` passes model-generated SQL through ``get_sql_rewriter``
+before it reaches SQLite. Rewrites never change the rows the tool returns;
+statements the tokenizer-level parser does not understand are left alone.
+"""
+
+import re
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from manuai.config import Config
+from manuai.event_log import EventLog
+from manuai.performance_config import get_performance_config
+from manuai.schema_catalog import SchemaCatalog, quote_identifier
+
+_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<space>\s+|--[^\n]*|/\*.*?\*/)
+    | (?P<string>'(?:[^']|'')*')
+    | (?P<quoted>"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])
+    | (?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+)
+    | (?P<word>[A-Za-z_][\w$]*)
+    | (?P<param>[?:@$]\w*)
+    | (?P<op>\|\||<=|>=|==|!=|<>|<<|>>|.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+_SIMPLE_IDENTIFIER_PATTERN = re.compile(r"^[A-Za-z_]\w*$")
+
+COMPOUND_OPERATORS = {"UNION", "INTERSECT", "EXCEPT"}
+AGGREGATE_FUNCTIONS = {"COUNT", "SUM", "AVG", "MIN", "MAX", "TOTAL", "GROUP_CONCAT", "STRING_AGG"}
+# Keywords that end the FROM clause of a select core
+CLAUSE_KEYWORDS = {"WHERE", "GROUP", "HAVING", "WINDOW", "ORDER", "LIMIT"}
+
+
+class Token(NamedTuple):
+    """A SQL token; ``(`` and ``)`` carry the parenthesis depth outside them."""
+
+    kind: str  # "word", "quoted", "string", "number", "param" or "op"
+    text: str
+    start: int
+    end: int
+    depth: int
+
+    def is_word(self, *words: str) -> bool:
+        return self.kind == "word" and self.text.upper() in words
+
+    @property
+    def identifier(self) -> Optional[str]:
+        """Lowercase identifier of a word or quoted token."""
+        if self.kind == "word":
+            return self.text.lower()
+        if self.kind == "quoted":
+            return self.text[1:-1].lower()
+        return None
+
+
+def tokenize(sql: str) -> List[Token]:
+    """Split SQL into tokens, dropping whitespace and comments."""
+    tokens = []
+    depth = 0
+    for match in _TOKEN_PATTERN.finditer(sql):
+        kind = match.lastgroup
+        if kind == "space":
+            continue
+        if match.group() == ")":
+            depth = max(depth - 1, 0)
+        tokens.append(Token(kind, match.group(), match.start(), match.end(), depth))
+        if match.group() == "(":
+            depth += 1
+    return tokens
+
+
+def _closing(tokens: List[Token], open_index: int) -> int:
+    """Index of the parenthesis closing the one at ``open_index``."""
+    for i in range(open_index + 1, len(tokens)):
+        if tokens[i].text == ")" and tokens[i].depth == tokens[open_index].depth:
+            return i
+    raise ValueError("unbalanced parentheses")
+
+
+def _split(tokens: List[Token], lo: int, hi: int, depth: int) -> List[Tuple[int, int]]:
+    """Split ``tokens[lo:hi]`` at the commas of one parenthesis depth."""
+    items = []
+    start = lo
+    for i in range(lo, hi):
+        if tokens[i].text == "," and tokens[i].depth == depth:
+            items.append((start, i))
+            start = i + 1
+    items.append((start, hi))
+    return items
+
+
+class SelectCore(NamedTuple):
+    """Clause positions of one SELECT of a (possibly compound) statement."""
+
+    lo: int  # the SELECT keyword
+    hi: int
+    distinct: bool
+    columns: List[Tuple[int, int]]  # result column token ranges
+    from_clause: Optional[Tuple[int, int]]
+    clauses: Dict[str, int]  # WHERE, GROUP, HAVING, WINDOW -> index
+
+
+class Select(NamedTuple):
+    """A SELECT statement or subquery, split into its compound arms."""
+
+    cores: List[SelectCore]
+    operators: List[str]  # "UNION ALL", "UNION", "INTERSECT", "EXCEPT"
+    order: Optional[int]  # index of ORDER of the trailing ORDER BY
+    limit: Optional[int]  # index of LIMIT
+    hi: int
+
+
+def parse_select(tokens: List[Token], lo: int, hi: int) -> Optional[Select]:
+    """Parse ``tokens[lo:hi]`` as a SELECT (None for VALUES or anything unexpected)."""
+    if lo >= hi:
+        return None
+    depth = tokens[lo].depth
+    top = [i for i in range(lo, hi) if tokens[i].depth == depth]
+    arms = []
+    operators = []
+    arm_start = lo
+    order = limit = None
+    for position, i in enumerate(top):
+        token = tokens[i]
+        if token.is_word(*COMPOUND_OPERATORS) and i >= arm_start:
+            all_rows = position + 1 < len(top) and tokens[top[position + 1]].is_word("ALL")
+            arms.append((arm_start, i))
+            operators.append(f"{token.text.upper()} ALL" if all_rows else token.text.upper())
+            arm_start = i + 2 if all_rows else i + 1
+            order = limit = None
+        elif token.is_word("ORDER") and position + 1 < len(top) and tokens[top[position + 1]].is_word("BY"):
+            order = i
+        elif token.is_word("LIMIT"):
+            limit = i
+    body_end = min(index for index in (order, limit, hi) if index is not None)
+    arms.append((arm_start, body_end))
+
+    cores = []
+    for arm_lo, arm_hi in arms:
+        if not tokens[arm_lo].is_word("SELECT"):
+            return None
+        columns_lo = arm_lo + 1
+        distinct = tokens[columns_lo].is_word("DISTINCT")
+        if distinct or tokens[columns_lo].is_word("ALL"):
+            columns_lo += 1
+        from_index = None
+        clauses: Dict[str, int] = {}
+        for i in range(columns_lo, arm_hi):
+            token = tokens[i]
+            if token.depth != depth or token.kind != "word":
+                continue
+            keyword = token.text.upper()
+            if keyword == "FROM" and from_index is None:
+                from_index = i
+            elif keyword in CLAUSE_KEYWORDS and keyword not in clauses:
+                clauses[keyword] = i
+        columns_hi = from_index if from_index is not None else min([arm_hi, *clauses.values()])
+        from_clause = None
+        if from_index is not None:
+            from_clause = (from_index + 1, min([arm_hi, *(i for i in clauses.values() if i > from_index)]))
+        cores.append(SelectCore(arm_lo, arm_hi, distinct, _split(tokens, columns_lo, columns_hi, depth), from_clause, clauses))
+    return Select(cores, operators, order, limit, hi)
+
+
+def _star_column(tokens: List[Token], column: Tuple[int, int]) -> bool:
+    """Whether a result column is ``*`` or ``alias.*``."""
+    return tokens[column[1] - 1].text == "*" and column[1] - column[0] in (1, 3)
+
+
+def _output_name(tokens: List[Token], column: Tuple[int, int]) -> Optional[str]:
+    """Lowercase name of a result column: its alias, or the column it reads."""
+    lo, hi = column
+    if hi - lo >= 2 and tokens[hi - 1].identifier and tokens[hi - 2].is_word("AS"):
+        return tokens[hi - 1].identifier
+    if hi - lo == 1 or (hi - lo == 3 and tokens[lo + 1].text == "."):
+        return tokens[hi - 1].identifier
+    return None
+
+
+def _single_table(tokens: List[Token], core: SelectCore, catalog: Optional[SchemaCatalog]) -> Optional[str]:
+    """The table a select core reads, if it reads exactly one table."""
+    if core.from_clause is None or catalog is None:
+        return None
+    lo, hi = core.from_clause
+    names = tokens[lo:hi]
+    if not names or names[0].identifier is None:
+        return None
+    if len(names) == 1 or (len(names) == 2 and names[1].identifier) or (
+        len(names) == 3 and names[1].is_word("AS") and names[2].identifier
+    ):
+        return catalog.resolve(names[0].text)
+    return None
+
+
+def _aggregate_only(tokens: List[Token], core: SelectCore) -> bool:
+    """Whether a select core returns a single row: only aggregates and no GROUP BY."""
+    if "GROUP" in core.clauses:
+        return False
+    for lo, hi in core.columns:
+        if not (hi - lo >= 3 and tokens[lo].is_word(*AGGREGATE_FUNCTIONS) and tokens[lo + 1].text == "("):
+            return False
+        if any(token.is_word("OVER") for token in tokens[lo:hi]):
+            return False
+    return True
+
+
+def _render(name: str) -> str:
+    return name if _SIMPLE_IDENTIFIER_PATTERN.match(name) else quote_identifier(name)
+
+
+def _apply(sql: str, edits: List[Tuple[int, int, str]]) -> str:
+    for start, end, text in sorted(edits, reverse=True):
+        sql = sql[:start] + text + sql[end:]
+    return sql
+
+
+class SQLRewrite(NamedTuple):
+    """Result of rewriting one statement."""
+
+    original: str
+    sql: str
+    rewrites: List[str]  # one description per rewrite applied, empty if unchanged
+
+
+class SQLRewriter:
+    """Rewrites model-generated SELECTs so SQLite does less work for the same answer.
+
+    Rewrites run on a token stream (strings, quoted identifiers, comments and
+    parenthesis depth are respected), in three passes:
+
+    - ``SELECT *`` in a subquery or CTE that reads a single table is narrowed
+      to the table columns the rest of the statement mentions. Skipped when
+      the rest of the statement selects ``*`` itself or uses NATURAL joins.
+    - An outer ``ORDER BY ... LIMIT`` over a single subquery is copied into
+      that subquery, so a DISTINCT or GROUP BY subquery (which SQLite does
+      not flatten) can stop early or walk an index on the ordering column.
+      Only when the outer query is a plain projection and the ordering
+      columns are subquery columns.
+    - A statement without a LIMIT gets ``row_limit``; a larger literal LIMIT
+      is lowered to it. Single-row aggregates are left alone.
+    """
+
+    def __init__(
+        self,
+        inject_limit: bool = True,
+        push_down_limits: bool = True,
+        narrow_select_star: bool = True,
+        audit_log: Optional[EventLog] = None,
+    ):
+        """Initialize the SQL rewriter.
+
+        Args:
+            inject_limit: Add or tighten the LIMIT of unbounded statements
+            push_down_limits: Push ORDER BY ... LIMIT into subqueries
+            narrow_select_star: Replace SELECT * in subqueries and CTEs by the referenced columns
+            audit_log: Event log every rewrite is recorded in
+        """
+        self.inject_limit = inject_limit
+        self.push_down_limits = push_down_limits
+        self.narrow_select_star = narrow_select_star
+        self.audit_log = audit_log
+        self.lock = threading.Lock()
+        self._stats = {"statements": 0, "rewritten": 0, "reverted": 0}
+
+    def rewrite(
+        self, sql: str, catalog: Optional[SchemaCatalog] = None, row_limit: Optional[int] = None
+    ) -> SQLRewrite:
+        """Rewrite a statement.
+
+        Args:
+            sql: SQL statement
+            catalog: Schema of the database (needed to narrow SELECT *)
+            row_limit: LIMIT to add to unbounded statements (none added if omitted)
+
+        Returns:
+            SQLRewrite: The statement to run and the rewrites applied
+        """
+        rewrites: List[str] = []
+        rewritten = sql
+        passes = []
+        if self.narrow_select_star and catalog is not None:
+            passes.append(lambda text: self._narrow_select_star(text, catalog, rewrites))
+        if self.push_down_limits:
+            passes.append(lambda text: self._push_down_limit(text, catalog, rewrites))
+        if self.inject_limit and row_limit is not None:
+            passes.append(lambda text: self._limit(text, row_limit, rewrites))
+        for rewrite_pass in passes:
+            try:
+                rewritten = rewrite_pass(rewritten)
+            except (ValueError, IndexError):
+                # SQL this parser does not understand is passed through untouched
+                continue
+        with self.lock:
+            self._stats["statements"] += 1
+            if rewrites:
+                self._stats["rewritten"] += 1
+        return SQLRewrite(sql, rewritten if rewrites else sql, rewrites)
+
+    def _statement(self, sql: str) -> Tuple[List[Token], int, int]:
+        """Tokens of a single SELECT/WITH statement and the token range of its main SELECT."""
+        tokens = tokenize(sql)
+        while tokens and tokens[-1].text == ";":
+            tokens.pop()
+        if not tokens or any(token.text == ";" for token in tokens):
+            raise ValueError("not a single statement")
+        if tokens[0].is_word("SELECT"):
+            return tokens, 0, len(tokens)
+        if not tokens[0].is_word("WITH"):
+            raise ValueError("not a SELECT")
+        return tokens, self._common_table_expressions(tokens)[1], len(tokens)
+
+    def _common_table_expressions(self, tokens: List[Token]) -> Tuple[List[Tuple[Optional[str], int, int, bool]], int]:
+        """CTEs of a WITH statement as (name, body open, body close, has column list), and the main SELECT index."""
+        i = 1
+        recursive = tokens[i].is_word("RECURSIVE")
+        if recursive:
+            i += 1
+        ctes = []
+        while True:
+            name = tokens[i].identifier
+            i += 1
+            column_list = tokens[i].text == "("
+            if column_list:
+                i = _closing(tokens, i) + 1
+            if not tokens[i].is_word("AS"):
+                raise ValueError("unexpected CTE syntax")
+            i += 1
+            while tokens[i].is_word("NOT", "MATERIALIZED"):
+                i += 1
+            close = _closing(tokens, i)
+            # A recursive CTE refers to itself; it is never narrowed
+            ctes.append((None if recursive else name, i, close, column_list))
+            i = close + 1
+            if tokens[i].text != ",":
+                return ctes, i
+            i += 1
+
+    def _narrow_select_star(self, sql: str, catalog: SchemaCatalog, rewrites: List[str]) -> str:
+        tokens, main_lo, _ = self._statement(sql)
+        subqueries = []  # (open, close) of subqueries and CTE bodies that may be narrowed
+        if main_lo:
+            subqueries.extend((open_index, close) for name, open_index, close, column_list in
+                              self._common_table_expressions(tokens)[0] if name and not column_list)
+        for i, token in enumerate(tokens):
+            if token.text == "(" and i and tokens[i - 1].is_word("FROM", "JOIN") and tokens[i + 1].is_word("SELECT"):
+                subqueries.append((i, _closing(tokens, i)))
+
+        edits = []
+        for open_index, close in subqueries:
+            inner = parse_select(tokens, open_index + 1, close)
+            if inner is None or len(inner.cores) != 1:
+                continue
+            core = inner.cores[0]
+            if core.distinct or len(core.columns) != 1 or core.columns[0][1] - core.columns[0][0] != 1:
+                continue
+            star = tokens[core.columns[0][0]]
+            table = _single_table(tokens, core, catalog) if star.text == "*" else None
+            if table is None:
+                continue
+
+            # A * outside the subquery (other than COUNT(*) or a product) may select every column
+            outside = [i for i in range(len(tokens)) if i < open_index or i > close]
+            if any(
+                tokens[i].text == "*" and (tokens[i - 1].is_word("SELECT", "DISTINCT", "ALL") or tokens[i - 1].text in (",", "."))
+                or tokens[i].is_word("NATURAL")
+                for i in outside
+            ):
+                continue
+            downstream = [tokens[i] for i in outside]
+            mentioned = {token.identifier for token in downstream if token.identifier}
+            columns = catalog.tables[table].columns
+            referenced = [column.name for column in columns if column.name.lower() in mentioned]
+            if not referenced or len(referenced) == len(columns):
+                continue
+            edits.append((star.start, star.end, ", ".join(_render(name) for name in referenced)))
+            rewrites.append(f"narrowed SELECT * from {table} to {len(referenced)} of {len(columns)} columns")
+        return _apply(sql, edits)
+
+    def _push_down_limit(self, sql: str, catalog: Optional[SchemaCatalog], rewrites: List[str]) -> str:
+        tokens, main_lo, main_hi = self._statement(sql)
+        outer = parse_select(tokens, main_lo, main_hi)
+        if outer is None or len(outer.cores) != 1 or outer.order is None or outer.limit is None:
+            return sql
+        core = outer.cores[0]
+        if core.distinct or core.clauses or core.from_clause is None:
+            return sql
+        for lo, hi in core.columns:
+            for i in range(lo, hi):
+                if tokens[i].is_word("OVER") or (tokens[i].is_word(*AGGREGATE_FUNCTIONS) and tokens[i + 1].text == "("):
+                    return sql
+
+        # FROM ( subquery ) [AS] [alias] and nothing else
+        from_lo, from_hi = core.from_clause
+        if tokens[from_lo].text != "(":
+            return sql
+        close = _closing(tokens, from_lo)
+        alias_tokens = [token for token in tokens[close + 1:from_hi] if not token.is_word("AS")]
+        if len(alias_tokens) > 1 or (alias_tokens and alias_tokens[0].identifier is None):
+            return sql
+        alias = alias_tokens[0].identifier if alias_tokens else None
+
+        # LIMIT n [OFFSET m] / LIMIT m, n with literal numbers
+        limit_tokens = tokens[outer.limit + 1:main_hi]
+        if len(limit_tokens) == 3 and (limit_tokens[1].is_word("OFFSET") or limit_tokens[1].text == ","):
+            limit_tokens = limit_tokens[::2]
+        if len(limit_tokens) not in (1, 2) or not all(token.text.isdigit() for token in limit_tokens):
+            return sql
+        row_limit = sum(int(token.text) for token in limit_tokens)
+
+        # ORDER BY terms must be subquery columns, not outer expressions
+        outer_aliases = {}
+        for column in core.columns:
+            name = _output_name(tokens, column)
+            if name is not None:
+                outer_aliases[name] = column[1] - column[0] in (1, 3) and tokens[column[1] - 1].identifier == name
+        terms = []
+        for lo, hi in _split(tokens, outer.order + 2, outer.limit, tokens[main_lo].depth):
+            name_index = lo
+            if hi - lo >= 3 and tokens[lo + 1].text == ".":
+                if tokens[lo].identifier != alias:
+                    return sql
+                name_index = lo + 2
+            name = tokens[name_index].identifier
+            if name is None or outer_aliases.get(name) is False:
+                return sql
+            suffix = tokens[name_index + 1:hi]
+            if any(token.kind != "word" for token in suffix):
+                return sql
+            terms.append((name, tokens[name_index].text, " ".join(token.text for token in suffix)))
+
+        # Only subqueries SQLite cannot flatten: it already orders plain subqueries and
+        # UNION ALL arms by the outer ORDER BY itself
+        inner = parse_select(tokens, from_lo + 1, close)
+        if inner is None or inner.limit is not None or len(inner.cores) != 1:
+            return sql
+        inner_core = inner.cores[0]
+        if not (inner_core.distinct or "GROUP" in inner_core.clauses or any(
+            token.is_word("OVER") or (token.is_word(*AGGREGATE_FUNCTIONS) and tokens[i + 1].text == "(")
+            for lo, hi in inner_core.columns for i, token in enumerate(tokens[lo:hi], lo)
+        )):
+            return sql
+        outputs = {_output_name(tokens, column) for column in inner_core.columns}
+        table = _single_table(tokens, inner_core, catalog)
+        star = any(_star_column(tokens, column) for column in inner_core.columns)
+        for name, _, _ in terms:
+            if name not in outputs and not (
+                star and table is not None and any(c.name.lower() == name for c in catalog.tables[table].columns)
+            ):
+                return sql
+        clause = "ORDER BY " + ", ".join(f"{text} {suffix}".strip() for _, text, suffix in terms) + f" LIMIT {row_limit}"
+        if inner.order is not None:
+            edit = (tokens[inner.order].start, tokens[close - 1].end, clause)
+        else:
+            edit = (tokens[close - 1].end, tokens[close - 1].end, f" {clause}")
+        rewrites.append(f"pushed ORDER BY ... LIMIT {row_limit} into the subquery")
+        return _apply(sql, [edit])
+
+    def _limit(self, sql: str, row_limit: int, rewrites: List[str]) -> str:
+        tokens, main_lo, main_hi = self._statement(sql)
+        select = parse_select(tokens, main_lo, main_hi)
+        if select is None:
+            return sql
+        if len(select.cores) == 1 and (select.cores[0].from_clause is None or _aggregate_only(tokens, select.cores[0])):
+            return sql
+        if select.limit is None:
+            rewrites.append(f"added LIMIT {row_limit}")
+            return _apply(sql, [(tokens[main_hi - 1].end, tokens[main_hi - 1].end, f" LIMIT {row_limit}")])
+
+        count = tokens[select.limit + 1]
+        if select.limit + 2 < main_hi and tokens[select.limit + 2].text == ",":
+            count = tokens[select.limit + 3]
+        if count.kind == "number" and count.text.isdigit() and int(count.text) > row_limit:
+            rewrites.append(f"tightened LIMIT {count.text} to {row_limit}")
+            return _apply(sql, [(count.start, count.end, str(row_limit))])
+        return sql
+
+    def audit(self, rewrite: SQLRewrite, db_path: Optional[str] = None, reverted: Optional[str] = None):
+        """Record a rewrite in the audit log.
+
+        Args:
+            rewrite: The rewrite
+            db_path: Database the statement ran on
+            reverted: Error of the rewritten statement, when the original was run instead
+        """
+        if reverted is not None:
+            with self.lock:
+                self._stats["reverted"] += 1
+        if self.audit_log is None:
+            return
+        event = {
+            "timestamp": datetime.now().isoformat(),
+            "database": db_path,
+            "original": rewrite.original,
+            "rewritten": rewrite.sql,
+            "rewrites": rewrite.rewrites,
+        }
+        if reverted is not None:
+            event["reverted"] = reverted
+        self.audit_log.append(event)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get SQL rewriter counters."""
+        with self.lock:
+            return dict(self._stats)
+
+
+# Global SQL rewriter
+_sql_rewriter = None
+_sql_rewriter_lock = threading.Lock()
+
+
+def get_sql_rewriter() -> SQLRewriter:
+    """Get global SQL rewriter."""
+    global _sql_rewriter
+    if _sql_rewriter is None:
+        with _sql_rewriter_lock:
+            if _sql_rewriter is None:
+                config = get_performance_config()
+                db_config = config.database
+                audit_log = None
+                if db_config.sql_rewrite_log_path:
+                    audit_log = EventLog(
+                        str(Config.Path.APP_HOME / db_config.sql_rewrite_log_path),
+                        flush_interval=config.system.metrics_flush_interval,
+                        batch_size=config.system.metrics_flush_batch_size,
+                        fsync=config.system.metrics_fsync,
+                        retention_days=config.system.metrics_retention_days,
+                        compaction_interval=config.system.metrics_compaction_interval,
+                    )
+                _sql_rewriter = SQLRewriter(
+                    inject_limit=db_config.sql_rewrite_inject_limit,
+                    push_down_limits=db_config.sql_rewrite_push_down_limits,
+                    narrow_select_star=db_config.sql_rewrite_narrow_select_star,
+                    audit_log=audit_log,
+                )
+    return _sql_rewriter
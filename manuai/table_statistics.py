@@ -0,0 +1,241 @@
+"""
+Table statistics for ManuAI.
+
+This module provides:
+1. Row counts answered from ``sqlite_stat1`` (after ANALYZE) or ``MAX(rowid)``
+   instead of a ``COUNT(*)`` scan per table
+2. Exact counts computed lazily on a background thread
+3. Caching of exact counts per database and ``PRAGMA data_version``
+"""
+
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from manuai.database_optimizer import (DatabasePool, database_identity,
+                                       get_pool, pooled_cursor)
+from manuai.logging import log
+from manuai.performance_config import get_performance_config
+from manuai.schema_catalog import (SchemaCatalog, get_schema_catalog,
+                                   quote_identifier)
+
+
+# Tables per compound MAX(rowid) query (SQLite allows 500 terms per compound SELECT)
+MAX_ROWID_BATCH = 200
+
+
+class RowCount(NamedTuple):
+    """Row count of a table and where it came from."""
+
+    count: Optional[int]  # None when the table is unknown or cannot be counted
+    exact: bool
+    source: str  # "count", "sqlite_stat1", "max_rowid" or "unknown"
+
+    def __str__(self) -> str:
+        if self.count is None:
+            return "?"
+        return f"{self.count:,}" if self.exact else f"~{self.count:,}"
+
+
+class TableStatistics:
+    """Row counts of the tables of every database the app opens.
+
+    A lookup returns the exact count if one was computed at the current
+    ``PRAGMA data_version``, otherwise the ANALYZE estimate from
+    ``sqlite_stat1`` or, for tables that were never analyzed, ``MAX(rowid)``
+    (exact until rows are deleted; it reads one b-tree page). With
+    ``exact_counts`` a lookup that had to estimate also queues a
+    ``COUNT(*)`` on a background worker, so the next lookup at the same
+    data version is exact.
+    """
+
+    def __init__(self, exact_counts: bool = True, workers: int = 1):
+        """Initialize the table statistics service.
+
+        Args:
+            exact_counts: Compute exact counts in the background
+            workers: Background threads running COUNT(*) queries
+        """
+        self.exact_counts = exact_counts
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._exact: Dict[Tuple[str, str], Tuple[int, int]] = {}  # (identity, table) -> (data_version, count)
+        self._max_rowid: Dict[Tuple[str, str], Tuple[int, Optional[int]]] = {}
+        self._pending = set()
+        self._futures = set()
+        self.lock = threading.Lock()
+        self._stats = {"exact_hits": 0, "estimates": 0, "counts_queued": 0, "counts_completed": 0, "count_errors": 0}
+
+    def row_count(self, table: str, db_path: Optional[str] = None, count_in_background: bool = True) -> RowCount:
+        """Row count of one table (see ``row_counts``)."""
+        return self.row_counts([table], db_path, count_in_background)[table]
+
+    def row_counts(
+        self,
+        tables: Optional[Iterable[str]] = None,
+        db_path: Optional[str] = None,
+        count_in_background: bool = True,
+    ) -> Dict[str, RowCount]:
+        """Row counts of several tables of a database.
+
+        Args:
+            tables: Table names (every table if omitted)
+            db_path: Database path (default database if omitted)
+            count_in_background: Queue exact counts for tables that were estimated
+                (short-lived scripts pass False so they do not wait for them at exit)
+
+        Returns:
+            Dict[str, RowCount]: Row count of each requested table
+        """
+        pool = get_pool(db_path, readonly=True)
+        catalog = get_schema_catalog(pool.db_path)
+        identity = database_identity(pool.db_path)
+        data_version = pool.data_version()
+        counts: Dict[str, RowCount] = {}
+        to_estimate: Dict[str, str] = {}  # requested name -> table
+        with self.lock:
+            for table in catalog.table_names if tables is None else tables:
+                name = catalog.resolve(table)
+                exact = self._exact.get((identity, name)) if name is not None else None
+                if name is None:
+                    counts[table] = RowCount(None, False, "unknown")
+                elif exact is not None and exact[0] == data_version:
+                    counts[table] = RowCount(exact[1], True, "count")
+                    self._stats["exact_hits"] += 1
+                else:
+                    to_estimate[table] = name
+            self._stats["estimates"] += len(to_estimate)
+        if to_estimate:
+            estimates = self._estimate(pool, catalog, identity, data_version, set(to_estimate.values()))
+            counts.update((table, estimates[name]) for table, name in to_estimate.items())
+            if self.exact_counts and count_in_background:
+                self._queue_counts(pool, identity, list(dict.fromkeys(to_estimate.values())))
+        return counts
+
+    def _estimate(
+        self, pool: DatabasePool, catalog: SchemaCatalog, identity: str, data_version: int, tables: Set[str]
+    ) -> Dict[str, RowCount]:
+        estimates = {}
+        missing = []
+        with self.lock:
+            for table in tables:
+                estimate = catalog.row_estimate(table)
+                cached = self._max_rowid.get((identity, table))
+                if estimate is not None:
+                    estimates[table] = RowCount(estimate, False, "sqlite_stat1")
+                elif catalog.tables[table].without_rowid:
+                    estimates[table] = RowCount(None, False, "unknown")
+                elif cached is not None and cached[0] == data_version:
+                    estimates[table] = RowCount(cached[1], False, "max_rowid")
+                else:
+                    missing.append(table)
+        if not missing:
+            return estimates
+
+        # MAX(rowid) reads the last page of each table b-tree; tables are batched into
+        # compound SELECTs so hundreds of tables cost a few statements, not hundreds
+        max_rowids = {}
+        with pooled_cursor(pool.db_path, readonly=True) as cursor:
+            for start in range(0, len(missing), MAX_ROWID_BATCH):
+                batch = missing[start:start + MAX_ROWID_BATCH]
+                try:
+                    cursor.execute(" UNION ALL ".join(
+                        f"SELECT {i}, MAX(rowid) FROM {quote_identifier(table)}" for i, table in enumerate(batch)
+                    ))
+                    max_rowids.update((batch[i], max_rowid or 0) for i, max_rowid in cursor.fetchall())
+                except sqlite3.Error:
+                    for table in batch:
+                        try:
+                            cursor.execute(f"SELECT MAX(rowid) FROM {quote_identifier(table)}")
+                            max_rowids[table] = cursor.fetchone()[0] or 0
+                        except sqlite3.Error:
+                            estimates[table] = RowCount(None, False, "unknown")
+        with self.lock:
+            for table, max_rowid in max_rowids.items():
+                self._max_rowid[(identity, table)] = (data_version, max_rowid)
+                estimates[table] = RowCount(max_rowid, False, "max_rowid")
+        return estimates
+
+    def _queue_counts(self, pool: DatabasePool, identity: str, tables: Iterable[str]):
+        with self.lock:
+            tables = [table for table in tables if (identity, table) not in self._pending]
+            if not tables:
+                return
+            self._pending.update((identity, table) for table in tables)
+            self._stats["counts_queued"] += len(tables)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="table-stats")
+            executor = self._executor
+        # One job per lookup, so queueing hundreds of tables stays off the caller's time
+        future = executor.submit(self._count_tables, pool.db_path, identity, tables)
+        with self.lock:
+            self._futures.add(future)
+        future.add_done_callback(self._forget)
+
+    def _forget(self, future):
+        with self.lock:
+            self._futures.discard(future)
+
+    def _count_tables(self, db_path: str, identity: str, tables: List[str]):
+        pool = get_pool(db_path, readonly=True)
+        for table in tables:
+            try:
+                # Read the version first: a write during the count leaves the result stale, not wrong
+                data_version = pool.data_version()
+                with pooled_cursor(db_path, readonly=True) as cursor:
+                    cursor.execute(f"SELECT COUNT(*) FROM {quote_identifier(table)}")
+                    count = cursor.fetchone()[0]
+                with self.lock:
+                    self._exact[(identity, table)] = (data_version, count)
+                    self._stats["counts_completed"] += 1
+            except Exception as e:
+                with self.lock:
+                    self._stats["count_errors"] += 1
+                log(f"[yellow]Could not count rows of {table}: {str(e)}[/yellow]")
+            finally:
+                with self.lock:
+                    self._pending.discard((identity, table))
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for queued exact counts to finish; returns False on timeout."""
+        with self.lock:
+            futures = list(self._futures)
+        return not wait(futures, timeout).not_done
+
+    def clear(self):
+        """Drop every cached count."""
+        with self.lock:
+            self._exact.clear()
+            self._max_rowid.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get table statistics service counters."""
+        with self.lock:
+            return {**self._stats, "exact_counts_cached": len(self._exact), "pending": len(self._pending)}
+
+    def shutdown(self):
+        """Stop the background workers."""
+        with self.lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Global table statistics service
+_table_statistics = None
+_table_statistics_lock = threading.Lock()
+
+
+def get_table_statistics() -> TableStatistics:
+    """Get global table statistics service."""
+    global _table_statistics
+    if _table_statistics is None:
+        with _table_statistics_lock:
+            if _table_statistics is None:
+                db_config = get_performance_config().database
+                _table_statistics = TableStatistics(
+                    exact_counts=db_config.table_stats_exact_counts,
+                    workers=db_config.table_stats_workers,
+                )
+    return _table_statistics
@@ -1,6 +1,12 @@
+import csv
+import io
 import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from contextlib import contextmanager
-from typing import Any, List
+from contextvars import ContextVar
+from typing import Any, List, Optional
 
 from langchain.tools import tool
 from langchain_core.messages import ToolMessage
@@ -8,13 +14,31 @@ from langchain_core.messages.tool import ToolCall
 from langchain_core.tools import BaseTool
 
 from manuai.config import Config
-from manuai.database_optimizer import (cached_query, get_optimizer,
+from manuai.database_optimizer import (BoundedResult, QueryBudget,
+                                       bounded_query, get_optimizer,
+                                       pooled_cursor, run_bounded_query,
                                        with_optimized_cursor)
 from manuai.logging import log, log_panel
+from manuai.metrics import measure_tool
+from manuai.performance_config import get_performance_config
+from manuai.schema_catalog import get_schema_catalog
+from manuai.schema_index import get_schema_index
+from manuai.sql_rewriter import get_sql_rewriter
+from manuai.table_statistics import get_table_statistics
 
 # Global variable to store the current database path for multi-database support
 _current_database_path = None
 
+# Shared, bounded executor for running the tool calls of one model turn concurrently
+MAX_TOOL_WORKERS = 8
+_tool_executor = ThreadPoolExecutor(max_workers=MAX_TOOL_WORKERS, thread_name_prefix="manuai-tool")
+
+# Seconds a tool call may wait for a free worker on top of its own timeout
+TOOL_QUEUE_ALLOWANCE = 5.0
+
+# Statement budget of the tool call running in this context (set by call_tool)
+_current_budget: ContextVar[Optional[QueryBudget]] = ContextVar("current_budget", default=None)
+
 
 def set_current_database(db_path: str):
     """Set the current database path for tools to use."""
@@ -28,35 +52,181 @@ def get_current_database() -> str:
 
 
 def get_available_tools() -> List[BaseTool]:
-    return [list_tables, sample_table, describe_table, execute_sql, get_db_stats, analyze_business_question_tool]
-
-
-def call_tool(tool_call: ToolCall) -> Any:
+    return [
+        search_schema,
+        list_tables,
+        sample_table,
+        describe_table,
+        describe_tables,
+        execute_sql,
+        get_db_stats,
+        analyze_business_question_tool,
+    ]
+
+
+def get_query_budget() -> QueryBudget:
+    """Budget for SQL run by the current tool call (a fresh default one outside call_tool)."""
+    return _current_budget.get() or QueryBudget.from_config()
+
+
+def call_tool(tool_call: ToolCall, budget: Optional[QueryBudget] = None) -> Any:
+    if budget is not None:
+        # The call's time starts when a worker picks it up, not when it was queued
+        budget.start()
     tools_by_name = {tool.name: tool for tool in get_available_tools()}
     tool = tools_by_name[tool_call["name"]]
-    response = tool.invoke(tool_call["args"])
+    token = _current_budget.set(budget)
+    try:
+        with measure_tool(tool_call["name"]):
+            response = tool.invoke(tool_call["args"])
+    finally:
+        _current_budget.reset(token)
     return ToolMessage(content=response, tool_call_id=tool_call["id"])
 
 
+def call_tools(tool_calls: List[ToolCall], timeout: Optional[float] = None) -> List[ToolMessage]:
+    """Run all tool calls from one model turn concurrently.
+
+    Tools are independent and I/O-bound, so the turn takes as long as the slowest
+    call instead of the sum of all calls. Results are returned in the original
+    tool call order and every call gets its own timeout, counted from when a
+    worker starts running it (calls queued behind other sessions are not
+    charged for the wait). A call that is still queued after its timeout plus
+    TOOL_QUEUE_ALLOWANCE is cancelled and reported as timed out, so busy
+    workers cannot block the turn. SQL run by a call is bounded by the same
+    deadline and interrupted when the call times out, so a runaway query does
+    not keep a worker busy.
+
+    Args:
+        tool_calls: Tool calls emitted by the model in a single turn
+        timeout: Per-call timeout in seconds (defaults to LLMOptimizationConfig.tool_call_timeout)
+
+    Returns:
+        List of ToolMessages, one per tool call, in the order of tool_calls
+    """
+    if timeout is None:
+        timeout = get_performance_config().llm.tool_call_timeout
+
+    budgets = [QueryBudget.from_config(timeout) for _ in tool_calls]
+    queue_deadline = time.perf_counter() + timeout + TOOL_QUEUE_ALLOWANCE
+    futures = [
+        _tool_executor.submit(call_tool, tool_call, budget)
+        for tool_call, budget in zip(tool_calls, budgets)
+    ]
+
+    responses = []
+    for tool_call, budget, future in zip(tool_calls, budgets, futures):
+        try:
+            # Wait for a worker first (bounded); the budget's deadline is set when the call starts
+            started = budget.started.wait(max(queue_deadline - time.perf_counter(), 0.0))
+            if not started and future.cancel():
+                raise FutureTimeoutError
+            responses.append(future.result(timeout=budget.remaining()))
+        except FutureTimeoutError:
+            future.cancel()
+            budget.cancel()
+            log(f"[red]Tool {tool_call['name']} timed out after {timeout:.1f}s[/red]")
+            responses.append(
+                ToolMessage(
+                    content=f"Error: tool {tool_call['name']} timed out after {timeout:.1f}s",
+                    tool_call_id=tool_call["id"],
+                )
+            )
+        except Exception as e:
+            log(f"[red]Error calling tool {tool_call['name']}: {str(e)}[/red]")
+            responses.append(
+                ToolMessage(
+                    content=f"Error calling tool {tool_call['name']}: {str(e)}",
+                    tool_call_id=tool_call["id"],
+                )
+            )
+    return responses
+
+
 @contextmanager
 def with_sql_cursor(readonly=True, db_path=None):
     """Use optimized database cursor with connection pooling."""
     if db_path is None:
         db_path = get_current_database()
     
-    # Always use direct SQLite connection for multi-database support
-    conn = sqlite3.connect(db_path)
-    try:
-        # Enable optimizations
-        conn.execute("PRAGMA journal_mode=WAL")
-        conn.execute("PRAGMA synchronous=NORMAL")
-        conn.execute("PRAGMA cache_size=10000")
-        conn.execute("PRAGMA temp_store=MEMORY")
-        
-        cursor = conn.cursor()
+    # Shared per-database pool: PRAGMAs are applied once per connection and the
+    # page cache survives between tool invocations
+    with pooled_cursor(db_path, readonly=readonly) as cursor:
         yield cursor
-    finally:
-        conn.close()
+
+
+# Longest cell value handed to the model before it is shortened
+MAX_CELL_CHARS = 200
+
+
+def _format_cell(value: Any) -> Any:
+    if value is None:
+        return "NULL"
+    if isinstance(value, bytes):
+        return f"<blob {len(value)} bytes>"
+    if isinstance(value, str) and len(value) > MAX_CELL_CHARS:
+        return value[:MAX_CELL_CHARS] + "…"
+    return value
+
+
+def format_bounded_result(result: BoundedResult) -> str:
+    """Render a result as CSV with a header line, followed by a summary line.
+
+    Rows were already cut to the statement budget while they were fetched, so
+    the output stays small however large the underlying result is.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if result.columns:
+        writer.writerow(result.columns)
+    for row in result.rows:
+        writer.writerow([_format_cell(value) for value in row])
+
+    if result.aborted:
+        summary = (
+            f"({len(result.rows)} rows; query aborted after {result.elapsed * 1000:.0f} ms: "
+            f"{result.aborted}. Add filters, a LIMIT or aggregate instead of returning raw rows)"
+        )
+    elif result.truncated:
+        summary = (
+            f"({len(result.rows)} rows shown, truncated: more rows available. "
+            f"Add a LIMIT or aggregate to see the rest)"
+        )
+    else:
+        summary = f"({len(result.rows)} rows)"
+    return buffer.getvalue() + summary
+
+
+@tool(parse_docstring=True)
+def search_schema(reasoning: str, query: str, top_k: int = 5) -> str:
+    """Finds the tables most relevant to a question, with their columns and foreign keys.
+
+    Use this before list_tables: it returns only the matching tables instead of every table.
+
+    Args:
+        reasoning: Explanation of what data you are looking for
+        query: The user's question or keywords describing the data (e.g. "sales orders by customer")
+        top_k: Number of tables to return (recommended: 3-8)
+
+    Returns:
+        One line per table: name(column TYPE [PK] [-> referenced_table.column], ...)
+    """
+    log_panel(
+        title="Search Schema Tool",
+        content=f"Query: {query}\nTop: {top_k}\nReasoning: {reasoning}",
+    )
+    try:
+        index = get_schema_index(get_current_database())
+        matches = index.search(query, top_k=max(1, min(int(top_k), 20)))
+        if not matches:
+            return f"No tables match {query!r}. Use list_tables to see all {len(index.tables)} tables."
+        row_counts = get_table_statistics().row_counts([table for table, _ in matches], get_current_database())
+        lines = [index.describe(table, row_count=row_counts[table]) for table, _ in matches]
+        lines.append(f"({len(matches)} of {len(index.tables)} tables)")
+        return "\n".join(lines)
+    except Exception as e:
+        log(f"[red]Error searching schema: {str(e)}[/red]")
+        return f"Error searching schema: {str(e)}"
 
 
 @tool(parse_docstring=True)
@@ -74,10 +244,7 @@ def list_tables(reasoning: str) -> str:
         content=f"Reasoning: {reasoning}",
     )
     try:
-        with with_sql_cursor() as cursor:
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
-            tables = [row[0] for row in cursor.fetchall()]
-        return str(tables)
+        return str(get_schema_catalog(get_current_database()).table_names)
     except Exception as e:
         log(f"[red]Error listing tables: {str(e)}[/red]")
         return f"Error listing tables: {str(e)}"
@@ -93,7 +260,7 @@ def sample_table(reasoning: str, table_name: str, row_sample_size: int) -> str:
         row_sample_size: Number of rows to retrieve (recommended: 3-5 rows for readability)
 
     Returns:
-        String with one row per line, showing all columns for each row as tuples
+        CSV with a header line and one row per line, followed by the row count
     """
     log_panel(
         title="Sample Table Tool",
@@ -102,14 +269,30 @@ def sample_table(reasoning: str, table_name: str, row_sample_size: int) -> str:
     try:
         query = f"SELECT * FROM {table_name} LIMIT {row_sample_size}"
         with with_sql_cursor() as cursor:
-            cursor.execute(query)
-            rows = cursor.fetchall()
-        return "\n".join([str(row) for row in rows])
+            result = run_bounded_query(cursor, query, budget=get_query_budget())
+        return format_bounded_result(result)
     except Exception as e:
         log(f"[red]Error sampling table: {str(e)}[/red]")
         return f"Error sampling table: {str(e)}"
 
 
+def describe_from_snapshot(table_names: List[str]) -> str:
+    """Describe tables from the schema snapshot of the current database, one line per table."""
+    index = get_schema_index(get_current_database())
+    known = [table for table in (index.resolve(name) for name in table_names) if table is not None]
+    row_counts = get_table_statistics().row_counts(known, get_current_database()) if known else {}
+    lines = []
+    for name in table_names:
+        table = index.resolve(name)
+        if table is not None:
+            lines.append(index.describe(table, row_count=row_counts[table]))
+            continue
+        suggestions = [match for match, _ in index.search(name, top_k=3)]
+        hint = f" (did you mean: {', '.join(suggestions)}?)" if suggestions else ""
+        lines.append(f"{name}: no such table{hint}")
+    return "\n".join(lines)
+
+
 @tool(parse_docstring=True)
 def describe_table(reasoning: str, table_name: str) -> str:
     """Returns detailed schema information about a table (columns, types, constraints).
@@ -119,22 +302,43 @@ def describe_table(reasoning: str, table_name: str) -> str:
         table_name: Exact name of the table to describe (case-sensitive, no quotes needed)
 
     Returns:
-        String containing table schema information
+        name(column TYPE [PK|NOT NULL] [-> referenced_table.column], ...) ~row count; referenced by
     """
     log_panel(
         title="Describe Table Tool",
         content=f"Table: {table_name}\nReasoning: {reasoning}",
     )
     try:
-        with with_sql_cursor() as cursor:
-            cursor.execute(f"PRAGMA table_info({table_name})")
-            rows = cursor.fetchall()
-        return "\n".join([str(row) for row in rows])
+        return describe_from_snapshot([table_name])
     except Exception as e:
         log(f"[red]Error describing table: {str(e)}[/red]")
         return f"Error describing table: {str(e)}"
 
 
+@tool(parse_docstring=True)
+def describe_tables(reasoning: str, table_names: List[str]) -> str:
+    """Returns the schema of several tables in one call: columns, types, keys, references and row counts.
+
+    Prefer this over several describe_table calls when you need more than one table.
+
+    Args:
+        reasoning: Detailed explanation of why you need to understand these tables' structure
+        table_names: Names of the tables to describe
+
+    Returns:
+        One line per table: name(column TYPE [PK|NOT NULL] [-> referenced_table.column], ...) ~row count; referenced by
+    """
+    log_panel(
+        title="Describe Tables Tool",
+        content=f"Tables: {', '.join(table_names)}\nReasoning: {reasoning}",
+    )
+    try:
+        return describe_from_snapshot(table_names)
+    except Exception as e:
+        log(f"[red]Error describing tables: {str(e)}[/red]")
+        return f"Error describing tables: {str(e)}"
+
+
 @tool(parse_docstring=True)
 def execute_sql(reasoning: str, sql_query: str) -> str:
     """Executes SQL query and returns the result with caching for better performance.
@@ -144,17 +348,36 @@ def execute_sql(reasoning: str, sql_query: str) -> str:
         sql_query: Complete, properly formatted SQL query
 
     Returns:
-        String with query results, one row per line as tuples
+        CSV with a header line and one row per line, followed by the row count and a
+        note when the result was truncated or the query aborted
     """
     log_panel(
         title="Execute SQL Tool",
         content=f"Query: {sql_query}\nReasoning: {reasoning}",
     )
     try:
-        with with_sql_cursor() as cursor:
-            cursor.execute(sql_query)
-            rows = cursor.fetchall()
-        return "\n".join([str(row) for row in rows])
+        db_path = get_current_database()
+        budget = get_query_budget()
+        # One row past the budget still tells a complete result from a truncated one
+        rewriter = get_sql_rewriter()
+        rewrite = rewriter.rewrite(
+            sql_query,
+            get_schema_catalog(db_path),
+            row_limit=budget.max_rows + 1 if budget.max_rows is not None else None,
+        )
+        if rewrite.rewrites:
+            log_panel(title="SQL Rewrite", content=f"Query: {rewrite.sql}\nRewrites: {'; '.join(rewrite.rewrites)}")
+            rewriter.audit(rewrite, db_path)
+        try:
+            # Cached per database file; entries are dropped as soon as the data changes
+            result = bounded_query(rewrite.sql, db_path=db_path, budget=budget)
+        except sqlite3.Error as e:
+            if not rewrite.rewrites:
+                raise
+            # A rewrite must never turn a working query into a failing one
+            rewriter.audit(rewrite, db_path, reverted=str(e))
+            result = bounded_query(sql_query, db_path=db_path, budget=budget)
+        return format_bounded_result(result)
     except Exception as e:
         log(f"[red]Error running query: {str(e)}[/red]")
         return f"Error running query: {str(e)}"
@@ -186,6 +409,24 @@ def get_db_stats(reasoning: str) -> str:
         result.append(f"- Average Query Time: {stats['avg_query_time']:.3f}s")
         result.append(f"- Cache Hits: {stats['cache_hits']}")
         result.append(f"- Cache Misses: {stats['cache_misses']}")
+
+        latency = stats["latency"]
+        result.append(
+            f"- Query Latency: p50 {latency['p50']:.3f}s, p95 {latency['p95']:.3f}s, "
+            f"p99 {latency['p99']:.3f}s, max {latency['max']:.3f}s"
+        )
+        for title, key in (
+            ("By Database", "database_latency"),
+            ("By Tool", "tool_latency"),
+            ("Slowest Query Fingerprints (by total time)", "fingerprint_latency"),
+        ):
+            if stats[key]:
+                result.append(f"{title}:")
+                for name, summary in stats[key].items():
+                    result.append(
+                        f"- {name}: {summary['count']} calls, p50 {summary['p50']:.3f}s, "
+                        f"p95 {summary['p95']:.3f}s, p99 {summary['p99']:.3f}s, max {summary['max']:.3f}s"
+                    )
         
         return "\n".join(result)
     except Exception as e:
@@ -6,6 +6,8 @@ Use this tool to apply performance optimizations to your ManuAI setup.
 """
 
 import argparse
+import ast
+import json
 import sys
 from pathlib import Path
 
@@ -28,15 +30,23 @@ def show_current_config():
     print("\n📊 Database Settings:")
     print(f"  Max Connections: {config.database.max_connections}")
     print(f"  Query Cache Size: {config.database.query_cache_size}")
-    print(f"  Cache TTL: {config.database.query_cache_ttl}s")
+    ttl = config.database.query_cache_ttl
+    print(f"  Cache TTL: {f'{ttl}s' if ttl else 'none (invalidated by data_version)'}")
     print(f"  SQLite Cache Size: {config.database.cache_size}")
     print(f"  Journal Mode: {config.database.journal_mode}")
+    print(f"  Read-only mmap Size: {config.database.mmap_size}")
+    print(f"  Immutable Databases: {', '.join(config.database.immutable_databases) or 'none'}")
+    statement_timeout = config.database.statement_timeout or config.llm.tool_call_timeout
+    print(f"  Statement Budget: {statement_timeout}s, {config.database.statement_max_rows} rows, "
+          f"{config.database.statement_max_vm_steps or 'unlimited'} VM steps")
     
     print("\n🤖 LLM Settings:")
     print(f"  Simple Query Threshold: {config.llm.simple_query_threshold}")
     print(f"  Max Iterations: {config.llm.max_iterations}")
     print(f"  Response Caching: {config.llm.enable_response_caching}")
     print(f"  Response Cache Size: {config.llm.response_cache_size}")
+    print(f"  Model Keep-Alive: {config.llm.model_keep_alive} "
+          f"(warm-up at startup: {config.llm.warm_up_models})")
     
     print("\n⚡ System Settings:")
     print(f"  Max Concurrent Requests: {config.system.max_concurrent_requests}")
@@ -56,9 +66,29 @@ def show_performance_stats():
         print(f"  Cache Hit Rate: {stats['cache_hit_rate']}")
         print(f"  Total Queries: {stats['queries_executed']}")
         print(f"  Avg Query Time: {stats['avg_query_time']:.3f}s")
+        latency = stats["latency"]
+        print(
+            f"  Query Latency: p50 {latency['p50']:.3f}s / p95 {latency['p95']:.3f}s / "
+            f"p99 {latency['p99']:.3f}s / max {latency['max']:.3f}s"
+        )
         print(f"  Cache Requests: {stats['total_cache_requests']}")
         print(f"  Cache Hits: {stats['cache_hits']}")
         print(f"  Cache Misses: {stats['cache_misses']}")
+        print(f"  Aborted Queries: {stats['queries_aborted']}, Truncated Results: {stats['results_truncated']}")
+
+        query_cache = stats["query_cache"]
+        print(f"  Result Cache Memory: {query_cache['memory_bytes']:,} bytes ({query_cache['memory_utilization']})")
+        print(f"  Result Cache Hit Ratio: {query_cache['hit_ratio']} (disk hits: {query_cache['disk_hits']})")
+        if "disk" in query_cache:
+            print(f"  Spilled Results: {query_cache['disk']['entries']} ({query_cache['disk']['bytes']:,} bytes)")
+
+        model_calls = stats["model_calls"]
+        print(
+            f"  Model Calls: {model_calls['calls']}, prompt prefix reuse {model_calls['prefix_reuse']} "
+            f"of {model_calls['prompt_tokens']:,} prompt tokens"
+        )
+        for model, ttft in model_calls["time_to_first_token"].items():
+            print(f"  Time to First Token ({model}): p50 {ttft['p50']:.3f}s / p95 {ttft['p95']:.3f}s")
         
     except Exception as e:
         print(f"Could not retrieve performance stats: {e}")
@@ -150,6 +180,1408 @@ def benchmark_database():
         print(f"Benchmark failed: {e}")
 
 
+def _benchmark_database_path() -> str:
+    """Pick the first database that exists on disk for the benchmarks."""
+    from manuai.config import Config
+
+    for path in (
+        Config.Path.DATABASE_PATH,
+        Config.Path.ARCOPS_500_DB,
+        Config.Path.ARCOPS_200_DB,
+        Config.Path.FAKE_DB,
+        Config.Path.MEMORY_DB,
+    ):
+        if Path(path).exists():
+            return str(path)
+    raise FileNotFoundError("No database found. Generate one with the scripts in bin/ first.")
+
+
+def _scripted_chat_model(turns, token_delay: float = 0.0):
+    """Build a stub chat model that replays scripted turns and counts generations.
+
+    Each turn is either a string (final answer, streamed word by word) or a list
+    of tool calls (name, args) emitted as a single tool-call chunk. ``turns`` may
+    also be a function that picks the turn from the messages sent.
+    """
+    import time
+    from typing import Any
+
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import AIMessage, AIMessageChunk
+    from langchain_core.outputs import (ChatGeneration, ChatGenerationChunk,
+                                        ChatResult)
+
+    class ScriptedChatModel(BaseChatModel):
+        script: Any
+        token_delay: float = 0.0
+        generations: int = 0
+
+        @property
+        def _llm_type(self) -> str:
+            return "scripted"
+
+        def bind_tools(self, tools, **kwargs):
+            return self
+
+        def _next_turn(self, messages):
+            if callable(self.script):
+                turn = self.script(messages)
+            else:
+                turn = self.script[self.generations % len(self.script)]
+            self.generations += 1
+            return turn
+
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+            turn = self._next_turn(messages)
+            if isinstance(turn, str):
+                time.sleep(self.token_delay * len(turn.split()))
+                message = AIMessage(content=turn)
+            else:
+                message = AIMessage(
+                    content="",
+                    tool_calls=[
+                        {"name": name, "args": args, "id": f"call_{i}"}
+                        for i, (name, args) in enumerate(turn)
+                    ],
+                )
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+            turn = self._next_turn(messages)
+            if isinstance(turn, str):
+                for word in turn.split(" "):
+                    time.sleep(self.token_delay)
+                    yield ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+                return
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content="",
+                    tool_call_chunks=[
+                        {"name": name, "args": json.dumps(args), "id": f"call_{i}", "index": i}
+                        for i, (name, args) in enumerate(turn)
+                    ],
+                )
+            )
+
+    return ScriptedChatModel(script=turns if callable(turns) else list(turns), token_delay=token_delay)
+
+
+def benchmark_agent():
+    """Benchmark the agent loop against a stub chat model."""
+    print("\n🏃 Running Agent Loop Benchmark")
+    print("=" * 50)
+
+    try:
+        import time
+
+        from manuai.agent import ask_stream, create_history
+        from manuai.tools import set_current_database
+
+        set_current_database(_benchmark_database_path())
+        answer = " ".join(["word"] * 200)
+        turns = [[("list_tables", {"reasoning": "benchmark"})], answer]
+
+        llm = _scripted_chat_model(turns, token_delay=0.002)
+        start = time.time()
+        first_token = None
+        for chunk in ask_stream("show me the tables in the database", create_history(), llm):
+            if first_token is None and chunk != "🔄 STREAMING_START":
+                first_token = time.time() - start
+        elapsed = time.time() - start
+
+        print(f"  Model turns: {len(turns)}")
+        print(f"  Model generations: {llm.generations}")
+        print(f"  Generations per turn: {llm.generations / len(turns):.1f}")
+        print(f"  Time to first answer token: {first_token:.3f}s")
+        print(f"  Total time: {elapsed:.3f}s")
+
+        # One turn with several independent tool calls: sequential vs concurrent
+        from manuai.tools import call_tool, call_tools, list_tables
+
+        tables = ast.literal_eval(list_tables.invoke({"reasoning": "benchmark"}))[:5]
+        tool_calls = [
+            {"name": "describe_table", "args": {"reasoning": "benchmark", "table_name": t}, "id": f"call_{i}"}
+            for i, t in enumerate(tables)
+        ]
+        start = time.time()
+        for tool_call in tool_calls:
+            call_tool(tool_call)
+        sequential = time.time() - start
+        start = time.time()
+        call_tools(tool_calls)
+        concurrent = time.time() - start
+
+        print(f"\n  Tool calls in one turn: {len(tool_calls)}")
+        print(f"  Sequential tool latency: {sequential:.3f}s")
+        print(f"  Concurrent tool latency: {concurrent:.3f}s")
+
+    except Exception as e:
+        print(f"Agent benchmark failed: {e}")
+
+
+def _scratch_database_copy() -> str:
+    """Copy the benchmark database to a temp dir so benchmarks never touch data/."""
+    import shutil
+    import tempfile
+
+    source = _benchmark_database_path()
+    target = Path(tempfile.mkdtemp(prefix="manuai-bench-")) / Path(source).name
+    shutil.copyfile(source, target)
+    return str(target)
+
+
+def benchmark_pool(threads: int = 48, checkouts_per_thread: int = 50, max_connections: int = 4):
+    """Stress the connection pool with many threads competing for few connections."""
+    print("\n🏃 Running Connection Pool Stress Benchmark")
+    print("=" * 50)
+
+    try:
+        import threading
+        import time
+
+        from manuai.database_optimizer import DatabasePool
+
+        pool = DatabasePool(_scratch_database_copy(), max_connections=max_connections, timeout=30.0)
+        errors = []
+
+        def worker():
+            for _ in range(checkouts_per_thread):
+                try:
+                    conn = pool.get_connection()
+                    try:
+                        conn.execute("SELECT count(*) FROM sqlite_master").fetchone()
+                    finally:
+                        pool.return_connection(conn)
+                except Exception as e:
+                    errors.append(e)
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        start = time.time()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.time() - start
+
+        stats = pool.get_stats()
+        total = threads * checkouts_per_thread
+        print(f"  Threads: {threads} | Connections: {max_connections} | Checkouts: {total}")
+        print(f"  Total time: {elapsed:.3f}s ({total / elapsed:,.0f} checkouts/s)")
+        print(f"  Errors: {len(errors)} | Timeouts: {stats['timeouts']} | Waits: {stats['waits']}")
+        print(f"  Connections created: {stats['connections_created']}")
+        print(f"  Wait time avg/max: {stats['wait_time']['avg_ms']}ms / {stats['wait_time']['max_ms']}ms")
+        for bucket, count in stats["wait_time"]["buckets"].items():
+            if count:
+                print(f"    {bucket:>10}: {count}")
+        pool.close_all()
+
+    except Exception as e:
+        print(f"Pool benchmark failed: {e}")
+
+
+def benchmark_readonly(repetitions: int = 5):
+    """Compare per-call read-write connections with the pooled read-only mmap profile."""
+    print("\n🏃 Running Read-Only Connection Benchmark")
+    print("=" * 50)
+
+    try:
+        import shutil
+        import sqlite3
+        import tempfile
+        import time
+
+        from manuai.config import Config
+        from manuai.database_optimizer import DatabasePool
+
+        databases = [
+            path for path in (Config.Path.ARCOPS_200_DB, Config.Path.ARCOPS_500_DB) if Path(path).exists()
+        ]
+        if not databases:
+            print("  No ArcOps databases found. Generate them with the scripts in bin/ first.")
+            return
+
+        for source in databases:
+            db_path = Path(tempfile.mkdtemp(prefix="manuai-bench-")) / Path(source).name
+            shutil.copyfile(source, db_path)
+
+            with sqlite3.connect(db_path) as conn:
+                tables = [
+                    row[0]
+                    for row in conn.execute(
+                        "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+                    )
+                ]
+            queries = [f"SELECT * FROM {table}" for table in tables]
+
+            # Previous path: fresh read-write connection and PRAGMAs for every query
+            start = time.time()
+            for _ in range(repetitions):
+                for query in queries:
+                    conn = sqlite3.connect(db_path)
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute("PRAGMA synchronous=NORMAL")
+                    conn.execute("PRAGMA cache_size=10000")
+                    conn.execute("PRAGMA temp_store=MEMORY")
+                    conn.execute(query).fetchall()
+                    conn.close()
+            per_call = time.time() - start
+
+            # Pooled read-only mmap profile
+            pool = DatabasePool(str(db_path), readonly=True)
+            start = time.time()
+            for _ in range(repetitions):
+                for query in queries:
+                    conn = pool.get_connection()
+                    conn.execute(query).fetchall()
+                    pool.return_connection(conn)
+            readonly = time.time() - start
+            pool.close_all()
+
+            total = len(queries) * repetitions
+            print(f"  {Path(source).name} ({len(tables)} tables, {total} full scans)")
+            print(f"    Per-call read-write: {per_call:.3f}s ({per_call / total * 1000:.3f}ms/query)")
+            print(f"    Pooled read-only mmap: {readonly:.3f}s ({readonly / total * 1000:.3f}ms/query)")
+            print(f"    Speedup: {per_call / readonly:.1f}x")
+
+    except Exception as e:
+        print(f"Read-only benchmark failed: {e}")
+
+
+def benchmark_results(rows: int = 100_000):
+    """Compare fetchall + tuple reprs with the budgeted CSV result formatter."""
+    print("\n🏃 Running Tool Result Formatting Benchmark")
+    print("=" * 50)
+
+    try:
+        import sqlite3
+        import time
+        import tracemalloc
+
+        from manuai.database_optimizer import QueryBudget, run_bounded_query
+        from manuai.tools import format_bounded_result
+
+        conn = sqlite3.connect(":memory:")
+        query = (
+            f"WITH RECURSIVE seq(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM seq LIMIT {rows}) "
+            "SELECT n AS id, 'customer ' || n AS name, n * 1.25 AS amount, "
+            "date('2024-01-01', '+' || (n % 365) || ' days') AS order_date FROM seq"
+        )
+
+        # Previous path: materialize everything, then one tuple repr per line
+        tracemalloc.start()
+        start = time.time()
+        cursor = conn.execute(query)
+        legacy = "\n".join([str(row) for row in cursor.fetchall()])
+        legacy_time = time.time() - start
+        legacy_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        # Budgeted path: fetchmany until the row/byte budget, CSV with a header
+        tracemalloc.start()
+        start = time.time()
+        result = run_bounded_query(conn.cursor(), query, budget=QueryBudget.from_config())
+        bounded = format_bounded_result(result)
+        bounded_time = time.time() - start
+        bounded_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        conn.close()
+
+        print(f"  Result set: {rows:,} rows")
+        print(f"  fetchall + tuple reprs: {legacy_time:.3f}s, peak {legacy_peak / 1024 / 1024:.1f} MB, "
+              f"{len(legacy):,} chars (~{len(legacy) // 4:,} tokens)")
+        print(f"  Budgeted CSV:           {bounded_time:.3f}s, peak {bounded_peak / 1024 / 1024:.1f} MB, "
+              f"{len(bounded):,} chars (~{len(bounded) // 4:,} tokens), {len(result.rows)} rows shown")
+        print(f"  Reduction: {legacy_peak / bounded_peak:.0f}x memory, {len(legacy) / len(bounded):.0f}x prompt size")
+
+    except Exception as e:
+        print(f"Result formatting benchmark failed: {e}")
+
+
+def benchmark_router(turns: int = 200):
+    """Compare per-turn router construction and re.search scoring with the shared automaton."""
+    print("\n🏃 Running Complexity Router Benchmark")
+    print("=" * 50)
+
+    try:
+        import re
+        import time
+
+        from manuai.optimizations import get_complexity_router
+
+        queries = [
+            "What tables do we have in the database?",
+            "Show me the top 5 customers by revenue",
+            "Analyze the monthly sales trend and compare growth rate by product category",
+            "Give me a weekly KPI dashboard report with a breakdown by region",
+            "SELECT c.name, SUM(o.total) FROM customers c JOIN orders o ON o.customer_id = c.id "
+            "JOIN items i ON i.order_id = o.id GROUP BY c.name HAVING SUM(o.total) > 100",
+        ]
+        router = get_complexity_router()
+        legacy_log = Path("logs") / "model_performance.json"
+
+        def legacy_turn(query):
+            # Previous behaviour: three routers per turn, each parsing the whole performance
+            # log, and ~40 uncompiled re.search calls per analysis
+            for _ in range(3):
+                Path("logs").mkdir(exist_ok=True)
+                if legacy_log.exists():
+                    json.loads(legacy_log.read_text())
+            for patterns, flags, text in (
+                (router.COMPLEX_PATTERNS, 0, query.lower()),
+                (router.SQL_COMPLEXITY_MARKERS, re.IGNORECASE, query),
+                *[(domain_patterns, re.IGNORECASE, query) for domain_patterns in router.domain_patterns.values()] * 2,
+            ):
+                for pattern in patterns:
+                    re.search(pattern, text, flags)
+
+        def shared_turn(query):
+            # refine_query and optimize_query_execution both use the shared router
+            shared = get_complexity_router()
+            shared._score_query(query)
+            shared._detect_domain(query)
+
+        for label, turn in (("Per-turn routers + re.search", legacy_turn), ("Shared router + automaton", shared_turn)):
+            start = time.perf_counter()
+            for i in range(turns):
+                turn(queries[i % len(queries)])
+            elapsed = (time.perf_counter() - start) / turns
+            print(f"  {label}: {elapsed * 1_000_000:,.1f}µs per turn")
+
+    except Exception as e:
+        print(f"Router benchmark failed: {e}")
+
+
+def _stub_ollama_server(load_delay: float = 0.5, token_delay: float = 0.001, tokens: int = 20, answer=None):
+    """Start a local HTTP server that mimics Ollama's streaming /api/chat endpoint.
+
+    The first request for a model pays ``load_delay`` (the model load); an
+    empty ``messages`` list only loads the model, like Ollama does. ``answer``
+    maps a request body to the tokens to stream and the done_reason (defaults to
+    ``tokens`` filler tokens). Returns the server, its base URL and a dict
+    counting TCP connections, requests and generated tokens.
+    """
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    stats = {"connections": 0, "requests": 0, "tokens": 0}
+    loaded = set()
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            with lock:
+                stats["connections"] += 1
+
+        def log_message(self, *args):
+            pass
+
+        def _chunk(self, payload: dict):
+            data = (json.dumps(payload) + "\n").encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            model = body.get("model", "")
+            with lock:
+                stats["requests"] += 1
+                cold = model not in loaded
+                loaded.add(model)
+            if cold:
+                time.sleep(load_delay)
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            created_at = "2025-01-01T00:00:00Z"
+            output, done_reason = [], "load"
+            if body.get("messages"):
+                output, done_reason = answer(body) if answer else ([f"token{i} " for i in range(tokens)], "stop")
+            for token in output:
+                time.sleep(token_delay)
+                self._chunk({"model": model, "created_at": created_at, "done": False,
+                             "message": {"role": "assistant", "content": token}})
+            with lock:
+                stats["tokens"] += len(output)
+            self._chunk({"model": model, "created_at": created_at, "done": True, "done_reason": done_reason,
+                         "prompt_eval_count": len(json.dumps(body.get("messages", []))) // 4,
+                         "eval_count": len(output), "message": {"role": "assistant", "content": ""}})
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", stats
+
+
+def benchmark_models(queries: int = 50):
+    """Compare first-token latency of a client per query with shared, warmed-up clients."""
+    print("\n🏃 Running Model Client Benchmark")
+    print("=" * 50)
+
+    try:
+        import os
+        import time
+
+        from langchain_core.messages import HumanMessage
+
+        from manuai.config import Config
+        from manuai.models import ModelRegistry, create_llm
+
+        def first_token_latency(get_model, warm_up=None):
+            server, base_url, stats = _stub_ollama_server()
+            previous_url = os.environ.get("OLLAMA_BASE_URL")
+            os.environ["OLLAMA_BASE_URL"] = base_url
+            try:
+                if warm_up:
+                    warm_up()
+                latencies = []
+                for i in range(queries):
+                    start = time.perf_counter()
+                    llm = get_model(Config.COMPLEX_MODEL if i % 2 else Config.MODEL)
+                    first_token = None
+                    for _ in llm.stream([HumanMessage(content="How many orders were placed?")]):
+                        if first_token is None:
+                            first_token = time.perf_counter() - start
+                    latencies.append(first_token)
+                return sorted(latencies), stats
+            finally:
+                server.shutdown()
+                server.server_close()
+                if previous_url is None:
+                    os.environ.pop("OLLAMA_BASE_URL", None)
+                else:
+                    os.environ["OLLAMA_BASE_URL"] = previous_url
+
+        before, before_stats = first_token_latency(create_llm)
+        registry = ModelRegistry()
+        after, after_stats = first_token_latency(registry.get, lambda: registry.warm_up(background=False))
+        registry.clear()
+
+        for label, latencies, stats in (
+            ("create_llm per query", before, before_stats),
+            ("Shared registry + warm-up", after, after_stats),
+        ):
+            print(f"  {label}:")
+            print(f"    First token p50: {latencies[len(latencies) // 2] * 1000:.1f}ms, "
+                  f"max: {latencies[-1] * 1000:.1f}ms")
+            print(f"    TCP connections: {stats['connections']} for {stats['requests']} requests")
+
+    except Exception as e:
+        print(f"Model client benchmark failed: {e}")
+
+
+def benchmark_generation(queries: int = 60, training_queries: int = 40):
+    """Compare unbounded generation with optimized params and learned output caps on a stub server."""
+    print("\n🏃 Running Generation Parameters Benchmark")
+    print("=" * 50)
+
+    try:
+        import os
+        import random
+        import tempfile
+        import time
+        import zlib
+
+        import manuai.optimizations as optimizations
+        from manuai.agent import ask_stream, create_history
+        from manuai.config import Config
+        from manuai.logging import console
+        from manuai.optimizations import (DynamicComplexityRouter,
+                                          PerformanceMonitor,
+                                          optimize_query_execution)
+
+        def make_query(i):
+            if i % 4 == 3:
+                return f"Analyze the monthly sales trend by region for {2000 + i} and compare growth with a breakdown"
+            return f"Show the number of orders placed by customer {i}"
+
+        def answer(body):
+            # Deterministic answer per query: lookups need 40-120 tokens, analyses 300-600.
+            # One lookup in five rambles on after the answer until 1024 tokens.
+            messages = body["messages"]
+            query = next(m["content"] for m in messages if m["role"] == "user")
+            rng = random.Random(zlib.crc32(query.encode()))
+            analysis = "Analyze" in query
+            needed = rng.randint(300, 600) if analysis else rng.randint(40, 120)
+            total = 1024 if not analysis and rng.random() < 0.2 else needed
+            produced = sum(len(m["content"].split()) for m in messages if m["role"] == "assistant")
+            cap = (body.get("options") or {}).get("num_predict") or -1
+            end = total if cap < 0 else min(total, produced + cap)
+            tokens = ["DONE " if i == needed - 1 else f"w{i} " for i in range(produced, end)]
+            return tokens, "stop" if end == total else "length"
+
+        def run(apply_params, query_ids):
+            lookups, analyses, incomplete = [], [], 0
+            for i in query_ids:
+                query, model, history, model_params = optimize_query_execution(make_query(i), create_history())
+                start = time.perf_counter()
+                text = "".join(
+                    chunk for chunk in ask_stream(
+                        query, history, model, model_params=model_params if apply_params else None
+                    )
+                    if chunk != "🔄 STREAMING_START"
+                )
+                (analyses if "Analyze" in query else lookups).append(time.perf_counter() - start)
+                incomplete += "DONE" not in text
+            return lookups, analyses, incomplete
+
+        server, base_url, stats = _stub_ollama_server(load_delay=0.0, token_delay=0.0005, answer=answer)
+        previous_url = os.environ.get("OLLAMA_BASE_URL")
+        os.environ["OLLAMA_BASE_URL"] = base_url
+        previous_router, previous_quiet = optimizations._complexity_router, console.quiet
+        llm_config = get_performance_config().llm
+        previous_caching = llm_config.enable_response_caching
+        try:
+            # Every run repeats the same queries; they must reach the model
+            llm_config.enable_response_caching = False
+            with tempfile.TemporaryDirectory() as temp_dir:
+                # Route through a router whose response log lives in the temp dir
+                router = DynamicComplexityRouter()
+                router.monitor = PerformanceMonitor(log_file=os.path.join(temp_dir, "model_performance.jsonl"))
+                optimizations._complexity_router = router
+                console.quiet = True
+
+                measured = range(training_queries, training_queries + queries)
+                results = [("Unbounded (params unused)", run(False, measured))]
+                run(True, range(training_queries))  # learn caps per query class
+                results.append(("Optimized params + learned caps", run(True, measured)))
+
+                for label, (lookups, analyses, incomplete) in results:
+                    print(f"  {label}:")
+                    print(f"    Short lookup mean: {sum(lookups) / len(lookups) * 1000:.0f}ms, "
+                          f"max: {max(lookups) * 1000:.0f}ms")
+                    print(f"    Analysis mean: {sum(analyses) / len(analyses) * 1000:.0f}ms")
+                    print(f"    Truncated answers: {incomplete}")
+                print("  Learned caps:")
+                for query_class, summary in router.monitor.get_response_length_summary().items():
+                    cap = router.output_calibrator.suggest_cap(router.monitor, query_class, default=0)
+                    print(f"    {query_class}: {summary['count']} answers, p90 {summary['p90']:.0f} tokens, "
+                          f"cap {cap or 'default'}, {summary['truncated']} continued")
+                router.monitor.event_log.close()
+        finally:
+            llm_config.enable_response_caching = previous_caching
+            optimizations._complexity_router = previous_router
+            console.quiet = previous_quiet
+            server.shutdown()
+            server.server_close()
+            if previous_url is None:
+                os.environ.pop("OLLAMA_BASE_URL", None)
+            else:
+                os.environ["OLLAMA_BASE_URL"] = previous_url
+
+    except Exception as e:
+        print(f"Generation parameters benchmark failed: {e}")
+
+
+def benchmark_context(rounds: int = 10, rows: int = 2000):
+    """Measure prompt tokens and fitting cost over an agent loop with large tool results."""
+    print("\n🏃 Running Context Budget Benchmark")
+    print("=" * 50)
+
+    try:
+        import time
+
+        from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+        from manuai.agent import create_history
+        from manuai.context_window import ContextWindowManager, TokenCounter
+
+        result = "id,name,total\n" + "\n".join(f"{i},customer {i},{i * 3.5}" for i in range(rows))
+        result += f"\n({rows} rows)"
+        history = create_history()
+        for turn in range(3):
+            history += [HumanMessage(content=f"Question {turn}"), AIMessage(content="An earlier answer. " * 40)]
+
+        manager = ContextWindowManager()
+        budget = manager.budget_for()
+        messages = history + [HumanMessage(content="Which customers spent the most?")]
+        unbounded, bounded, fit_times, uncached_times = [], [], [], []
+        for i in range(rounds):
+            messages.append(
+                AIMessage(content="", tool_calls=[{"name": "execute_sql", "args": {"sql_query": "SELECT ..."}, "id": f"call_{i}"}])
+            )
+            messages.append(ToolMessage(content=result, tool_call_id=f"call_{i}"))
+
+            start = time.perf_counter()
+            prompt = manager.fit(messages, keep_from=len(history))
+            fit_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            ContextWindowManager(TokenCounter()).fit(messages, keep_from=len(history))
+            uncached_times.append(time.perf_counter() - start)
+
+            unbounded.append(manager.counter.count_messages(messages))
+            bounded.append(manager.counter.count_messages(prompt))
+
+        print(f"  Prompt token budget: {budget} ({'BPE' if manager.counter.exact else 'estimated'} counts)")
+        print(f"  Prompt tokens after {rounds} tool rounds: {unbounded[-1]:,} unbounded, {bounded[-1]:,} fitted")
+        print(f"  Largest fitted prompt: {max(bounded):,} tokens")
+        print(f"  Fit time per turn: {sum(fit_times) / rounds * 1000:.2f}ms with cached counts, "
+              f"{sum(uncached_times) / rounds * 1000:.2f}ms recounting every message")
+
+    except Exception as e:
+        print(f"Context budget benchmark failed: {e}")
+
+
+def benchmark_prefix(turns: int = 20, rounds: int = 3, rows: int = 300):
+    """Measure how much of each prompt repeats the previous one over a long conversation."""
+    print("\n🏃 Running Prompt Prefix Benchmark")
+    print("=" * 50)
+
+    try:
+        from langchain_core.messages import AIMessage, ToolMessage
+
+        from manuai.agent import build_turn_message, create_history
+        from manuai.context_window import ContextWindowManager, TokenCounter, _same_message
+
+        result = "id,name,total\n" + "\n".join(f"{i},customer {i},{i * 3.5}" for i in range(rows))
+        counter = TokenCounter()
+        config = get_performance_config().llm
+        trim_target = config.prompt_trim_target
+
+        def run(sticky: bool) -> tuple:
+            manager = ContextWindowManager(counter)
+            history = create_history()
+            previous, reused, total = [], 0, 0
+            turn_reused, turn_total = 0, 0  # first call of each later turn
+            for turn in range(turns):
+                keep_from = len(history)
+                messages = history + [build_turn_message(f"Question {turn}", "database", "data request")]
+                for i in range(rounds + 1):
+                    if not sticky:
+                        manager._plans.clear()
+                    prompt = manager.fit(messages, keep_from=keep_from)
+                    call_reused = 0
+                    for before, message in zip(previous, prompt):
+                        if before is not message and not _same_message(before, message):
+                            break
+                        call_reused += counter.count_message(message)
+                    reused += call_reused
+                    total += counter.count_messages(prompt)
+                    if i == 0 and turn:
+                        turn_reused += call_reused
+                        turn_total += counter.count_messages(prompt)
+                    previous = prompt
+                    if i < rounds:
+                        call_id = f"call_{turn}_{i}"
+                        messages.append(AIMessage(content="", tool_calls=[{"name": "execute_sql", "args": {"sql_query": "SELECT ..."}, "id": call_id}]))
+                        messages.append(ToolMessage(content=result, tool_call_id=call_id))
+                # The turn is kept as the model saw it, as the app does, so the next turn extends this prompt
+                history = messages + [AIMessage(content="An answer. " * 300)]
+            return reused, total, turn_reused, turn_total
+
+        config.prompt_trim_target = 1.0
+        try:
+            baseline_reused, baseline_total, _, _ = run(sticky=False)
+        finally:
+            config.prompt_trim_target = trim_target
+        reused, total, turn_reused, turn_total = run(sticky=True)
+
+        print(f"  Model calls: {turns * (rounds + 1)} over {turns} turns, budget {config.prompt_token_budget} tokens")
+        print(f"  Prefix reuse, fitted from scratch every call: {baseline_reused / baseline_total * 100:.1f}% "
+              f"({baseline_total - baseline_reused:,} tokens to evaluate)")
+        print(f"  Prefix reuse, sticky cuts: {reused / total * 100:.1f}% "
+              f"({total - reused:,} tokens to evaluate)")
+        print(f"  Prefix reuse on the first call of a new turn: {turn_reused / max(turn_total, 1) * 100:.1f}%")
+
+    except Exception as e:
+        print(f"Prompt prefix benchmark failed: {e}")
+
+
+def benchmark_answers(questions: int = 200):
+    """Replay a workload of repeated and rephrased questions with and without the answer cache."""
+    print("\n🏃 Running Answer Cache Benchmark")
+    print("=" * 50)
+
+    try:
+        import random
+        import time
+
+        from manuai.agent import ask_stream, create_history
+        from manuai.answer_cache import AnswerCache, database_state, get_answer_cache
+        from manuai.logging import console
+        from manuai.tools import set_current_database
+
+        set_current_database(_benchmark_database_path())
+        topics = ["customers by revenue", "products by units sold", "suppliers by late deliveries",
+                  "regions by order count", "employees by sales"]
+        phrasings = ["top {n} {topic}", "Show me the top {n} {topic}", "What are the top {n} {topic}?",
+                     "top {n} {topic} please"]
+        rng = random.Random(7)
+        # Popular questions come up again and again, in different words
+        workload = [
+            rng.choice(phrasings).format(n=rng.choice([5, 10]), topic=topics[min(int(rng.expovariate(0.8)), 4)])
+            for _ in range(questions)
+        ]
+        turns = [[("list_tables", {"reasoning": "benchmark"})], " ".join(["word"] * 100)]
+
+        llm_config = get_performance_config().llm
+        previous = (llm_config.enable_response_caching, llm_config.enable_plan_cache, console.quiet)
+
+        def run(caching):
+            llm_config.enable_response_caching = caching
+            llm_config.enable_plan_cache = False
+            get_answer_cache().clear()
+            llm = _scripted_chat_model(turns, token_delay=0.001)
+            start = time.perf_counter()
+            for question in workload:
+                for _ in ask_stream(question, create_history(), llm):
+                    pass
+            return time.perf_counter() - start, llm.generations
+
+        try:
+            console.quiet = True
+            results = [("Without answer cache", run(False)), ("With answer cache", run(True))]
+        finally:
+            llm_config.enable_response_caching, llm_config.enable_plan_cache, console.quiet = previous
+
+        print(f"  Questions: {questions} ({len(set(workload))} distinct phrasings)")
+        for label, (elapsed, generations) in results:
+            print(f"  {label}: {elapsed:.2f}s total, {elapsed / questions * 1000:.1f}ms per question, "
+                  f"{generations} model calls")
+        stats = get_answer_cache().get_stats()
+        print(f"  Cache hits: {stats['exact_hits']} exact, {stats['similar_hits']} rephrased "
+              f"({stats['hit_ratio']}), {stats['entries']} answers cached")
+
+        # Questions that differ in one word must never share an answer
+        distinct_pairs = [
+            ("How many delivered orders do we have?", "How many undelivered orders do we have?"),
+            ("List processed payments", "List unprocessed payments"),
+            ("List available products", "List unavailable products"),
+            ("How many subscribed customers?", "How many unsubscribed customers?"),
+            ("Total sales for product A", "Total sales for product I"),
+        ]
+        cache = AnswerCache()
+        db_identity, version = database_state(_benchmark_database_path())
+        wrong = []
+        for cached, asked in distinct_pairs:
+            cache.set(cached, [], f"answer to {cached}", db_identity, version)
+            if cache.get(asked, [], db_identity, version) is not None:
+                wrong.append(asked)
+        print(f"  Distinct questions answered from the cache: {len(wrong)} of {len(distinct_pairs)}")
+        for asked in wrong:
+            print(f"    ❌ {asked}")
+
+    except Exception as e:
+        print(f"Answer cache benchmark failed: {e}")
+
+
+def benchmark_plans(rounds: int = 10, questions: int = 10):
+    """Replay repeated questions on a changing database with and without the plan cache."""
+    print("\n🏃 Running Plan Cache Benchmark")
+    print("=" * 50)
+
+    try:
+        import shutil
+        import tempfile
+        import time
+
+        from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+        from manuai.agent import ask_stream, create_history
+        from manuai.answer_cache import get_answer_cache
+        from manuai.database_optimizer import get_pool_registry, pooled_cursor
+        from manuai.logging import console
+        from manuai.plan_cache import get_plan_cache
+        from manuai.table_statistics import get_table_statistics
+        from manuai.tools import list_tables, set_current_database
+
+        def script(messages):
+            # list_tables -> describe_table -> execute_sql -> answer, like a model finding its query
+            start = max(i for i, m in enumerate(messages) if isinstance(m, HumanMessage))
+            question = messages[start].content.split("\n")[0]
+            table = question.split()[-1]
+            called = [c["name"] for m in messages[start:] if isinstance(m, AIMessage) for c in m.tool_calls]
+            if not called:
+                return [("list_tables", {"reasoning": "benchmark"})]
+            if called[-1] == "list_tables":
+                return [("describe_table", {"reasoning": "benchmark", "table_name": table})]
+            if called[-1] == "describe_table":
+                return [("execute_sql", {"reasoning": "benchmark", "sql_query": f"SELECT COUNT(*) FROM {table}"})]
+            count = next(m.content for m in reversed(messages) if isinstance(m, ToolMessage))
+            return f"The table {table} has these rows: {count} " + " ".join(["word"] * 50)
+
+        llm_config = get_performance_config().llm
+        previous = (llm_config.enable_response_caching, llm_config.enable_plan_cache, console.quiet)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            console.quiet = True
+            try:
+                db_path = str(Path(temp_dir) / "plans.db")
+                shutil.copy(_benchmark_database_path(), db_path)
+                set_current_database(db_path)
+                stable = ast.literal_eval(list_tables.invoke({"reasoning": "benchmark"}))[:questions // 2]
+                changing = [f"bench_events_{i}" for i in range(questions - len(stable))]
+                with pooled_cursor(db_path, readonly=False) as cursor:
+                    for table in changing:
+                        cursor.execute(f"CREATE TABLE {table} (id INTEGER PRIMARY KEY, note TEXT)")
+                # Half the questions read a table that changes every round, half read static tables
+                workload = [f"How many rows are in {table}" for table in stable + changing]
+
+                def run(answer_cache, plan_cache):
+                    llm_config.enable_response_caching = answer_cache
+                    llm_config.enable_plan_cache = plan_cache
+                    get_answer_cache().clear()
+                    get_plan_cache().clear()
+                    llm = _scripted_chat_model(script, token_delay=0.001)
+                    start = time.perf_counter()
+                    for round_number in range(rounds):
+                        with pooled_cursor(db_path, readonly=False) as cursor:
+                            for table in changing:
+                                cursor.execute(f"INSERT INTO {table} (note) VALUES (?)", (f"round {round_number}",))
+                        for question in workload:
+                            for _ in ask_stream(question, create_history(), llm):
+                                pass
+                    return time.perf_counter() - start, llm.generations
+
+                results = [
+                    ("No caches", run(False, False)),
+                    ("Answer cache", run(True, False)),
+                    ("Answer cache + plan cache", run(True, True)),
+                ]
+            finally:
+                llm_config.enable_response_caching, llm_config.enable_plan_cache, console.quiet = previous
+                set_current_database(None)
+                get_table_statistics().wait()  # background row counts still read the database
+                get_pool_registry().close_all()
+
+        asked = rounds * len(workload)
+        print(f"  Questions: {asked} ({len(workload)} per round, the database changes every round)")
+        for label, (elapsed, generations) in results:
+            print(f"  {label}: {elapsed:.2f}s total, {generations / asked:.2f} model calls per question")
+        stats = get_plan_cache().get_stats()
+        print(f"  Plan replays: {stats['hits']} ({stats['unchanged_replays']} with unchanged results)")
+
+    except Exception as e:
+        print(f"Plan cache benchmark failed: {e}")
+
+
+def _pad_benchmark_database(db_path: str, total_tables: int) -> int:
+    """Add generated tables (with foreign keys between them) to a copy of the benchmark database.
+
+    Returns:
+        Number of tables in the database afterwards
+    """
+    import random
+
+    from manuai.database_optimizer import pooled_cursor
+
+    modules = ["hr", "finance", "crm", "logistics", "iot", "energy", "safety", "training", "marketing",
+               "legal", "facility", "fleet", "it", "rnd", "esg", "tax", "payroll"]
+    entities = ["accounts", "requests", "events", "readings", "assets", "tickets", "budgets", "campaigns",
+                "contracts", "vehicles", "sensors", "audits", "courses", "claims", "licenses", "alerts",
+                "invoices", "projects", "permits", "tasks", "reviews", "incidents", "sessions", "quotes", "routes"]
+    column_pool = ["name", "code", "status", "description", "amount", "start_date", "end_date", "owner_id",
+                   "priority", "category", "value", "unit", "region", "score", "notes", "reference",
+                   "approved_by", "approved_date", "quantity", "cost", "rate", "level", "source", "channel"]
+
+    with pooled_cursor(db_path, readonly=False) as cursor:
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
+        existing = cursor.fetchone()[0]
+        rng = random.Random(11)
+        names = [f"{module}_{entity}" for module in modules for entity in entities]
+        rng.shuffle(names)
+        created = []
+        for name in names[:max(total_tables - existing, 0)]:
+            columns = ["id INTEGER PRIMARY KEY"] + [f"{c} TEXT" for c in rng.sample(column_pool, 8)]
+            siblings = [t for t in created if t.split("_")[0] == name.split("_")[0]]
+            if siblings:
+                parent = rng.choice(siblings)
+                columns.append(f"{parent}_id INTEGER REFERENCES {parent}(id)")
+            cursor.execute(f"CREATE TABLE {name} ({', '.join(columns)})")
+            created.append(name)
+    return existing + len(created)
+
+
+def benchmark_schema(total_tables: int = 500, top_k: int = 5):
+    """Compare list_tables exploration with search_schema on a wide database."""
+    print("\n🏃 Running Schema Retrieval Benchmark")
+    print("=" * 50)
+
+    try:
+        import shutil
+        import tempfile
+        import time
+
+        from manuai.context_window import TokenCounter
+        from manuai.database_optimizer import get_pool_registry
+        from manuai.logging import console
+        from manuai.schema_index import get_schema_index
+        from manuai.table_statistics import get_table_statistics
+        from manuai.tools import (describe_table, list_tables, search_schema,
+                                  set_current_database)
+
+        questions = {
+            "Which customers placed the most sales orders?": {"customers", "sales_orders"},
+            "Total value of purchase orders by supplier": {"purchase_orders", "suppliers"},
+            "List employees and their skills": {"employees", "employee_skills", "skills"},
+            "Bill of materials items for each product": {"boms", "bom_items"},
+            "Equipment with overdue maintenance orders": {"equipment", "maintenance_orders"},
+            "Quality inspection results per characteristic": {"quality_inspection_results", "quality_characteristics"},
+            "Labor cost per work order": {"labor_costs", "work_orders"},
+            "Shipments by carrier last month": {"shipments"},
+            "KPI actual value versus target": {"kpi_values", "kpi_definitions"},
+            "Inventory quantity on hand per warehouse location": {"inventory", "locations"},
+        }
+        counter = TokenCounter()
+        previous_quiet = console.quiet
+        with tempfile.TemporaryDirectory() as temp_dir:
+            console.quiet = True
+            try:
+                db_path = str(Path(temp_dir) / "wide.db")
+                shutil.copy(_benchmark_database_path(), db_path)
+                set_current_database(db_path)
+                tables = _pad_benchmark_database(db_path, total_tables)
+
+                listed = list_tables.invoke({"reasoning": "benchmark"})
+                start = time.perf_counter()
+                get_schema_index(db_path)
+                build_time = time.perf_counter() - start
+
+                baseline_tokens, search_tokens, search_times, found = [], [], [], 0
+                for question, expected in questions.items():
+                    # Best case without the index: list every table, then describe the right ones
+                    described = [describe_table.invoke({"reasoning": "benchmark", "table_name": t}) for t in expected]
+                    baseline_tokens.append(counter.count(listed) + sum(counter.count(d) for d in described))
+
+                    start = time.perf_counter()
+                    result = search_schema.invoke({"reasoning": "benchmark", "query": question, "top_k": top_k})
+                    search_times.append(time.perf_counter() - start)
+                    search_tokens.append(counter.count(result))
+                    returned = {line.split("(")[0] for line in result.splitlines()}
+                    found += expected <= returned
+            finally:
+                console.quiet = previous_quiet
+                set_current_database(None)
+                get_table_statistics().wait()  # background row counts still read the database
+                get_pool_registry().close_all()
+
+        print(f"  Tables: {tables}, questions: {len(questions)}")
+        print(f"  Index build: {build_time * 1000:.1f}ms, search: {sum(search_times) / len(search_times) * 1000:.2f}ms per question")
+        print(f"  list_tables + describe_table: {sum(baseline_tokens) / len(questions):,.0f} tool tokens, "
+              f"2 exploration calls per question (when the model guesses the right tables)")
+        print(f"  search_schema (top {top_k}): {sum(search_tokens) / len(questions):,.0f} tool tokens, 1 exploration call")
+        print(f"  All needed tables returned for {found}/{len(questions)} questions")
+
+    except Exception as e:
+        print(f"Schema retrieval benchmark failed: {e}")
+
+
+def benchmark_describe(tables: int = 5, rounds: int = 20):
+    """Compare one describe_table call per table with a single describe_tables call."""
+    print("\n🏃 Running Table Description Benchmark")
+    print("=" * 50)
+
+    try:
+        import time
+
+        from langchain_core.messages import AIMessage, HumanMessage
+
+        from manuai.agent import ask_stream, create_history
+        from manuai.context_window import TokenCounter
+        from manuai.database_optimizer import (get_pool_registry, pooled_cursor,
+                                               run_bounded_query)
+        from manuai.logging import console
+        from manuai.metrics import get_metrics
+        from manuai.schema_index import get_schema_index
+        from manuai.table_statistics import get_table_statistics
+        from manuai.tools import (format_bounded_result, get_query_budget,
+                                  list_tables, set_current_database)
+
+        counter = TokenCounter()
+        llm_config = get_performance_config().llm
+        previous = (llm_config.enable_response_caching, llm_config.enable_plan_cache, console.quiet)
+        db_path = _benchmark_database_path()
+        console.quiet = True
+        try:
+            set_current_database(db_path)
+            names = ast.literal_eval(list_tables.invoke({"reasoning": "benchmark"}))[:tables]
+
+            # Raw PRAGMA output (the previous describe_table) against the snapshot
+            start = time.perf_counter()
+            for _ in range(rounds):
+                raw = []
+                for name in names:
+                    with pooled_cursor(db_path, readonly=True) as cursor:
+                        result = run_bounded_query(cursor, f"PRAGMA table_info({name})", budget=get_query_budget())
+                    raw.append(format_bounded_result(result))
+            raw_time = (time.perf_counter() - start) / rounds
+            get_schema_index(db_path)
+            start = time.perf_counter()
+            for _ in range(rounds):
+                index = get_schema_index(db_path)
+                row_counts = get_table_statistics().row_counts(names, db_path)
+                compact = [index.describe(name, row_count=row_counts[name]) for name in names]
+            compact_time = (time.perf_counter() - start) / rounds
+
+            def script(batched: bool):
+                def turn(messages):
+                    start = max(i for i, m in enumerate(messages) if isinstance(m, HumanMessage))
+                    called = sum(len(m.tool_calls) for m in messages[start:] if isinstance(m, AIMessage))
+                    if batched and not called:
+                        return [("describe_tables", {"reasoning": "benchmark", "table_names": names})]
+                    if not batched and called < len(names):
+                        return [("describe_table", {"reasoning": "benchmark", "table_name": names[called]})]
+                    return "These tables hold the data you asked about."
+                return turn
+
+            def run(batched: bool):
+                llm_config.enable_response_caching = False
+                llm_config.enable_plan_cache = False
+                get_metrics().reset()
+                llm = _scripted_chat_model(script(batched))
+                start = time.perf_counter()
+                for _ in ask_stream(f"Describe the tables {', '.join(names)}", create_history(), llm):
+                    pass
+                elapsed = time.perf_counter() - start
+                return llm.generations, get_metrics().snapshot()["counters"].get("prompt_tokens", 0), elapsed
+
+            one_by_one = run(batched=False)
+            batched = run(batched=True)
+        finally:
+            llm_config.enable_response_caching, llm_config.enable_plan_cache, console.quiet = previous
+            set_current_database(None)
+            get_table_statistics().wait()  # background row counts still read the database
+            get_pool_registry().close_all()
+
+        print(f"  Tables: {', '.join(names)}")
+        print(f"  PRAGMA table_info CSV: {sum(counter.count(r) for r in raw):,} tokens, {raw_time * 1000:.2f}ms")
+        print(f"  Schema snapshot: {sum(counter.count(c) for c in compact):,} tokens, {compact_time * 1000:.3f}ms "
+              f"(with foreign keys, references and row counts)")
+        for label, (calls, prompt_tokens, elapsed) in (
+            (f"{len(names)} x describe_table", one_by_one),
+            ("1 x describe_tables", batched),
+        ):
+            print(f"  {label}: {calls} model calls, {prompt_tokens:,} prompt tokens, {elapsed * 1000:.1f}ms")
+
+    except Exception as e:
+        print(f"Table description benchmark failed: {e}")
+
+
+def benchmark_catalog(total_tables: int = 500, lookups: int = 1000):
+    """Measure schema catalog cold builds, restarts and lookups on a wide database."""
+    print("\n🏃 Running Schema Catalog Benchmark")
+    print("=" * 50)
+
+    try:
+        import shutil
+        import tempfile
+        import time
+
+        from manuai.database_optimizer import get_pool_registry, pooled_cursor
+        from manuai.schema_catalog import (SchemaCatalogRegistry,
+                                           SchemaCatalogStore)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            try:
+                db_path = str(Path(temp_dir) / "wide.db")
+                shutil.copy(_benchmark_database_path(), db_path)
+                tables = _pad_benchmark_database(db_path, total_tables)
+
+                # What a cold start cost before: one PRAGMA table_info per table
+                start = time.perf_counter()
+                with pooled_cursor(db_path, readonly=True) as cursor:
+                    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
+                    for (name,) in cursor.fetchall():
+                        cursor.execute(f"PRAGMA table_info('{name}')")
+                        cursor.fetchall()
+                pragma_time = time.perf_counter() - start
+
+                store = SchemaCatalogStore(Path(temp_dir) / "schema_catalog.db")
+                start = time.perf_counter()
+                catalog = SchemaCatalogRegistry(store).get(db_path)
+                build_time = time.perf_counter() - start
+
+                # A new process finds the catalog in the store
+                registry = SchemaCatalogRegistry(store)
+                start = time.perf_counter()
+                registry.get(db_path)
+                restart_time = time.perf_counter() - start
+
+                names = catalog.table_names
+                start = time.perf_counter()
+                for i in range(lookups):
+                    registry.get(db_path).table(names[i % len(names)])
+                lookup_time = (time.perf_counter() - start) / lookups
+
+                with pooled_cursor(db_path, readonly=False) as cursor:
+                    cursor.execute("CREATE TABLE bench_catalog_new (id INTEGER PRIMARY KEY, note TEXT)")
+                rebuilt = registry.get(db_path)
+                stats = registry.get_stats()
+            finally:
+                get_pool_registry().close_all()
+
+        indexes = sum(len(table.indexes) for table in catalog.tables.values())
+        foreign_keys = sum(len(table.foreign_keys) for table in catalog.tables.values())
+        print(f"  Tables: {tables} ({indexes} indexes, {foreign_keys} foreign keys)")
+        print(f"  PRAGMA table_info for every table: {pragma_time * 1000:.1f}ms (columns only)")
+        print(f"  Catalog cold build: {build_time * 1000:.1f}ms (columns, indexes, foreign keys)")
+        print(f"  Catalog load after a restart: {restart_time * 1000:.1f}ms, {stats['store']['bytes']:,} bytes stored")
+        print(f"  Catalog lookup: {lookup_time * 1000000:.1f}µs (checks PRAGMA schema_version)")
+        print(f"  After CREATE TABLE: rebuilt at schema version {rebuilt.schema_version} "
+              f"(was {catalog.schema_version}), {len(rebuilt.tables)} tables")
+
+    except Exception as e:
+        print(f"Schema catalog benchmark failed: {e}")
+
+
+def benchmark_table_stats(
+    total_tables: int = 500, rows_per_table: int = 2000, large_tables: int = 10, large_rows: int = 200_000, renders: int = 5
+):
+    """Compare a COUNT(*) per table with the table statistics service on a wide database."""
+    print("\n🏃 Running Table Statistics Benchmark")
+    print("=" * 50)
+
+    try:
+        import shutil
+        import tempfile
+        import time
+
+        from manuai.database_optimizer import get_pool_registry, pooled_cursor
+        from manuai.schema_catalog import get_schema_catalog
+        from manuai.table_statistics import TableStatistics
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            try:
+                db_path = str(Path(temp_dir) / "wide.db")
+                shutil.copy(_benchmark_database_path(), db_path)
+                original = set(get_schema_catalog(db_path).table_names)
+                tables = _pad_benchmark_database(db_path, total_tables)
+                catalog = get_schema_catalog(db_path)
+                padded = [name for name in catalog.table_names if name not in original]
+                # Mostly small tables and a few large ones, like a real plant database
+                with pooled_cursor(db_path, readonly=False) as cursor:
+                    for i, name in enumerate(padded):
+                        rows = large_rows if i < large_tables else rows_per_table
+                        cursor.executemany(
+                            f"INSERT INTO {name} ({catalog.tables[name].columns[1].name}) VALUES (?)",
+                            ((f"row {n:08d} " + "x" * 40,) for n in range(rows)),
+                        )
+
+                def render_with_count():
+                    # What the sidebar and health dashboard ran on every rerun
+                    with pooled_cursor(db_path, readonly=True) as cursor:
+                        return {name: cursor.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0] for name in catalog.table_names}
+
+                def timed(render):
+                    start = time.perf_counter()
+                    for _ in range(renders):
+                        result = render()
+                    return (time.perf_counter() - start) / renders, result
+
+                count_time, exact = timed(render_with_count)
+                statistics = TableStatistics(exact_counts=True)
+                start = time.perf_counter()
+                first = statistics.row_counts(db_path=db_path)
+                first_time = time.perf_counter() - start
+                start = time.perf_counter()
+                statistics.wait()
+                background_time = time.perf_counter() - start
+                warm_time, warm = timed(lambda: statistics.row_counts(db_path=db_path))
+
+                with pooled_cursor(db_path, readonly=False) as cursor:
+                    cursor.execute(f"INSERT INTO {padded[0]} (id) VALUES (NULL)")
+                start = time.perf_counter()
+                after_write = statistics.row_counts(db_path=db_path)
+                after_write_time = time.perf_counter() - start
+                statistics.wait()
+                statistics.shutdown()
+            finally:
+                get_pool_registry().close_all()
+
+        estimated_exact = sum(first[name].count == exact[name] for name in exact)
+        sources = {}
+        for count in first.values():
+            sources[count.source] = sources.get(count.source, 0) + 1
+        print(f"  Tables: {tables}, rows: {sum(exact.values()):,}")
+        print(f"  COUNT(*) per table: {count_time * 1000:.1f}ms per render")
+        print(f"  First render (estimates): {first_time * 1000:.1f}ms, "
+              f"{', '.join(f'{n} from {source}' for source, n in sorted(sources.items()))}; "
+              f"{estimated_exact}/{len(exact)} equal to the exact count")
+        print(f"  Background exact counts: {background_time * 1000:.1f}ms, off the render path")
+        print(f"  Later renders (exact, cached per data_version): {warm_time * 1000:.2f}ms, "
+              f"{sum(count.exact for count in warm.values())}/{len(warm)} exact")
+        print(f"  Render after a write (estimates again): {after_write_time * 1000:.1f}ms, "
+              f"{sum(count.exact for count in after_write.values())} exact")
+
+    except Exception as e:
+        print(f"Table statistics benchmark failed: {e}")
+
+
+def benchmark_indexes(orders: int = 200_000, customers: int = 5_000, executions: int = 20):
+    """Run the index advisor on a logged workload and check its recommendations on the database."""
+    print("\n🏃 Running Index Advisor Benchmark")
+    print("=" * 50)
+
+    try:
+        import random
+        import tempfile
+        import time
+
+        from manuai.database_optimizer import (get_optimizer,
+                                               get_pool_registry,
+                                               pooled_cursor)
+        from manuai.index_advisor import IndexAdvisor, get_workload_log
+
+        workload = [
+            "SELECT COUNT(*), SUM(total) FROM orders WHERE customer_id = {n}",
+            "SELECT o.id, o.total FROM orders o JOIN customers c ON o.customer_id = c.id "
+            "WHERE c.region = 'region {r}' AND o.status = 'open'",
+            "SELECT id, total FROM orders WHERE status = 'shipped' AND created_at >= '2025-{m:02d}-01' "
+            "ORDER BY created_at LIMIT 20",
+            "SELECT tier, COUNT(*) FROM customers GROUP BY tier",
+        ]
+        rng = random.Random(7)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            try:
+                db_path = str(Path(temp_dir) / "plant.db")
+                with pooled_cursor(db_path, readonly=False) as cursor:
+                    cursor.execute("CREATE TABLE customers (id INTEGER PRIMARY KEY, region TEXT, tier TEXT)")
+                    cursor.execute(
+                        "CREATE TABLE orders (id INTEGER PRIMARY KEY, customer_id INTEGER, "
+                        "status TEXT, created_at TEXT, total REAL)"
+                    )
+                    cursor.executemany("INSERT INTO customers VALUES (?, ?, ?)", (
+                        (i, f"region {i % 20}", ("gold", "silver", "bronze")[i % 3]) for i in range(customers)
+                    ))
+                    cursor.executemany("INSERT INTO orders VALUES (NULL, ?, ?, ?, ?)", (
+                        (rng.randrange(customers), rng.choice(("open", "shipped", "closed", "cancelled")),
+                         f"2025-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}", rng.random() * 1000)
+                        for _ in range(orders)
+                    ))
+
+                def run_workload():
+                    # Different literals each time: every execution misses the result cache
+                    optimizer = get_optimizer()
+                    start = time.perf_counter()
+                    for i in range(executions):
+                        for query in workload:
+                            optimizer.execute_bounded_query(
+                                query.format(n=rng.randrange(customers), r=i % 20, m=i % 12 + 1), db_path=db_path
+                            )
+                    return time.perf_counter() - start
+
+                get_workload_log().clear()
+                before = run_workload()
+                logged = get_workload_log().queries(db_path)
+
+                advisor = IndexAdvisor(db_path)
+                start = time.perf_counter()
+                candidates = advisor.candidates()
+                recommendations = advisor.recommend()
+                advise_time = time.perf_counter() - start
+
+                with pooled_cursor(db_path, readonly=False) as cursor:
+                    for recommendation in recommendations:
+                        cursor.execute(recommendation.statement)
+                after = run_workload()
+            finally:
+                get_pool_registry().close_all()
+
+        print(f"  Workload: {len(logged)} fingerprints, {sum(q.executions for q in logged)} executions, "
+              f"{before * 1000:.0f}ms")
+        print(f"  Advisor: {len(candidates)} candidates measured on a scratch copy in {advise_time:.2f}s")
+        for recommendation in recommendations:
+            print(f"    {recommendation.statement}")
+            print(f"      saves {recommendation.time_saved * 1000:.0f}ms over {recommendation.queries} "
+                  f"queries ({recommendation.speedup:.1f}x), builds in {recommendation.build_seconds * 1000:.0f}ms")
+        print(f"  Workload with the recommended indexes: {after * 1000:.0f}ms ({before / after:.1f}x faster)")
+
+    except Exception as e:
+        print(f"Index advisor benchmark failed: {e}")
+
+
+def benchmark_rewrites(rows: int = 200_000, runs: int = 3):
+    """Compare model-style SQL with its rewritten form under the execute_sql statement budget."""
+    print("\n🏃 Running SQL Rewrite Benchmark")
+    print("=" * 50)
+
+    try:
+        import random
+        import tempfile
+        import time
+
+        from manuai.database_optimizer import (QueryBudget, get_pool_registry,
+                                               pooled_cursor,
+                                               run_bounded_query)
+        from manuai.performance_config import get_performance_config
+        from manuai.schema_catalog import get_schema_catalog
+        from manuai.sql_rewriter import SQLRewriter
+
+        queries = {
+            "Unbounded ORDER BY": "SELECT id, customer_id, total FROM orders_2025 ORDER BY total DESC",
+            "Latest DISTINCT rows": (
+                "SELECT created_at, customer_id FROM (SELECT DISTINCT created_at, customer_id FROM orders_2024) "
+                "ORDER BY created_at DESC, customer_id LIMIT 20"
+            ),
+            "Top groups": (
+                "SELECT day, orders FROM (SELECT created_at AS day, COUNT(*) AS orders FROM orders_2025 "
+                "GROUP BY created_at) ORDER BY day DESC LIMIT 10"
+            ),
+            "SELECT * subquery": (
+                "SELECT customer_id, total FROM (SELECT * FROM orders_2025 WHERE status = 'open' "
+                "ORDER BY total DESC LIMIT 20000) ORDER BY customer_id"
+            ),
+        }
+        max_rows = get_performance_config().database.statement_max_rows
+        rng = random.Random(11)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            try:
+                db_path = str(Path(temp_dir) / "orders.db")
+                with pooled_cursor(db_path, readonly=False) as cursor:
+                    for table in ("orders_2024", "orders_2025"):
+                        cursor.execute(
+                            f"CREATE TABLE {table} (id INTEGER PRIMARY KEY, customer_id INTEGER, status TEXT, "
+                            "created_at TEXT, total REAL, notes TEXT)"
+                        )
+                        cursor.execute(f"CREATE INDEX idx_{table}_created_at ON {table}(created_at)")
+                        cursor.executemany(f"INSERT INTO {table} VALUES (NULL, ?, ?, ?, ?, ?)", (
+                            (rng.randrange(5000), rng.choice(("open", "shipped", "closed")),
+                             f"{table[-4:]}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d} "
+                             f"{rng.randrange(24):02d}:{rng.randrange(60):02d}",
+                             rng.random() * 1000, "x" * 200)
+                            for n in range(rows)
+                        ))
+
+                rewriter = SQLRewriter()
+                catalog = get_schema_catalog(db_path)
+
+                def timed(query):
+                    best = None
+                    with pooled_cursor(db_path, readonly=True) as cursor:
+                        for _ in range(runs):
+                            result = run_bounded_query(cursor, query, budget=QueryBudget(max_rows=max_rows))
+                            best = result.elapsed if best is None else min(best, result.elapsed)
+                    return best, result.rows
+
+                results = []
+                for name, query in queries.items():
+                    rewrite = rewriter.rewrite(query, catalog, row_limit=max_rows + 1)
+                    original_time, original_rows = timed(query)
+                    rewritten_time, rewritten_rows = timed(rewrite.sql)
+                    results.append((name, rewrite, original_time, rewritten_time, original_rows == rewritten_rows))
+            finally:
+                get_pool_registry().close_all()
+
+        print(f"  Tables: 2 x {rows:,} rows, statement budget {max_rows} rows")
+        for name, rewrite, original_time, rewritten_time, same in results:
+            print(f"  {name}: {original_time * 1000:.1f}ms -> {rewritten_time * 1000:.1f}ms "
+                  f"({original_time / rewritten_time:.1f}x), same rows: {same}")
+            for description in rewrite.rewrites:
+                print(f"    {description}")
+
+    except Exception as e:
+        print(f"SQL rewrite benchmark failed: {e}")
+
+
 def main():
     """Main function."""
     parser = argparse.ArgumentParser(
@@ -164,6 +1596,23 @@ Examples:
   python optimize.py --production           # Apply production optimizations
   python optimize.py --development          # Apply development optimizations
   python optimize.py --benchmark            # Run database benchmark
+  python optimize.py --benchmark-agent      # Benchmark the agent loop with a stub model
+  python optimize.py --benchmark-pool       # Stress the connection pool with many threads
+  python optimize.py --benchmark-readonly   # Compare read-write and read-only mmap connections
+  python optimize.py --benchmark-results    # Compare raw and budgeted tool result formatting
+  python optimize.py --benchmark-router     # Measure complexity routing overhead per chat turn
+  python optimize.py --benchmark-models     # Compare per-query and shared model clients on a stub server
+  python optimize.py --benchmark-generation # Compare unbounded generation with learned output caps
+  python optimize.py --benchmark-context    # Measure prompt tokens over an agent loop with large tool results
+  python optimize.py --benchmark-prefix     # Measure prompt prefix reuse over a long conversation
+  python optimize.py --benchmark-answers    # Replay repeated questions with and without the answer cache
+  python optimize.py --benchmark-plans      # Replay repeated questions on a changing database with the plan cache
+  python optimize.py --benchmark-schema     # Compare list_tables exploration with search_schema on 500 tables
+  python optimize.py --benchmark-describe   # Compare per-table describe_table calls with one describe_tables call
+  python optimize.py --benchmark-catalog    # Measure schema catalog builds, restarts and lookups on 500 tables
+  python optimize.py --benchmark-table-stats # Compare COUNT(*) per table with the table statistics service
+  python optimize.py --benchmark-indexes    # Measure the index advisor's recommendations on a logged workload
+  python optimize.py --benchmark-rewrites   # Compare model-style SQL with its rewritten form
         """
     )
     
@@ -181,6 +1630,40 @@ Examples:
                        help='Apply development optimizations')
     parser.add_argument('--benchmark', action='store_true',
                        help='Run database benchmark')
+    parser.add_argument('--benchmark-agent', action='store_true',
+                       help='Benchmark the agent loop with a stub chat model')
+    parser.add_argument('--benchmark-pool', action='store_true',
+                       help='Stress the connection pool with many threads')
+    parser.add_argument('--benchmark-readonly', action='store_true',
+                       help='Compare per-call read-write and pooled read-only mmap connections')
+    parser.add_argument('--benchmark-results', action='store_true',
+                       help='Compare fetchall tuple output with the budgeted CSV result formatter')
+    parser.add_argument('--benchmark-router', action='store_true',
+                       help='Measure complexity routing overhead per chat turn')
+    parser.add_argument('--benchmark-models', action='store_true',
+                       help='Compare first-token latency of per-query and shared model clients on a stub server')
+    parser.add_argument('--benchmark-generation', action='store_true',
+                       help='Compare unbounded generation with optimized params and learned output caps')
+    parser.add_argument('--benchmark-context', action='store_true',
+                       help='Measure prompt tokens and fitting cost over an agent loop with large tool results')
+    parser.add_argument('--benchmark-prefix', action='store_true',
+                       help='Measure prompt prefix reuse over a long conversation with and without sticky cuts')
+    parser.add_argument('--benchmark-answers', action='store_true',
+                       help='Replay repeated and rephrased questions with and without the answer cache')
+    parser.add_argument('--benchmark-plans', action='store_true',
+                       help='Replay repeated questions on a changing database with and without the plan cache')
+    parser.add_argument('--benchmark-schema', action='store_true',
+                       help='Compare list_tables exploration with search_schema on a 500-table database')
+    parser.add_argument('--benchmark-describe', action='store_true',
+                       help='Compare per-table describe_table round trips with one describe_tables call')
+    parser.add_argument('--benchmark-catalog', action='store_true',
+                       help='Measure schema catalog cold builds, restarts and lookups on a 500-table database')
+    parser.add_argument('--benchmark-table-stats', action='store_true',
+                       help='Compare a COUNT(*) per table with sqlite_stat1 estimates and background exact counts')
+    parser.add_argument('--benchmark-indexes', action='store_true',
+                       help='Run the index advisor on a logged workload and apply its recommendations')
+    parser.add_argument('--benchmark-rewrites', action='store_true',
+                       help='Compare model-style SQL with its LIMIT / pushdown / SELECT * rewrites')
     
     args = parser.parse_args()
     
@@ -212,6 +1695,57 @@ Examples:
     if args.benchmark:
         benchmark_database()
 
+    if args.benchmark_agent:
+        benchmark_agent()
+
+    if args.benchmark_pool:
+        benchmark_pool()
+
+    if args.benchmark_readonly:
+        benchmark_readonly()
+
+    if args.benchmark_results:
+        benchmark_results()
+
+    if args.benchmark_router:
+        benchmark_router()
+
+    if args.benchmark_models:
+        benchmark_models()
+
+    if args.benchmark_generation:
+        benchmark_generation()
+
+    if args.benchmark_context:
+        benchmark_context()
+
+    if args.benchmark_prefix:
+        benchmark_prefix()
+
+    if args.benchmark_answers:
+        benchmark_answers()
+
+    if args.benchmark_plans:
+        benchmark_plans()
+
+    if args.benchmark_schema:
+        benchmark_schema()
+
+    if args.benchmark_describe:
+        benchmark_describe()
+
+    if args.benchmark_catalog:
+        benchmark_catalog()
+
+    if args.benchmark_table_stats:
+        benchmark_table_stats()
+
+    if args.benchmark_indexes:
+        benchmark_indexes()
+
+    if args.benchmark_rewrites:
+        benchmark_rewrites()
+
 
 if __name__ == "__main__":
     main()